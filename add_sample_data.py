@@ -7,6 +7,18 @@ sys.path.insert(0, str(Path(__file__).parent))
 from src.database.db import get_db
 from src.models.deck import Deck
 from src.models.card import Card
+from src.models.duplicates import DuplicateCardError
+
+
+def add_cards(deck, cards, label=lambda front: front):
+    """Add cards to a deck, skipping those it already has."""
+    for front, back, tags in cards:
+        try:
+            Card.create(deck_id=deck.id, front=front, back=back, tags=tags)
+            print(f"  ✓ {label(front)}")
+        except DuplicateCardError:
+            print(f"  • {label(front)} (already there)")
+
 
 def add_sample_data():
     """Add sample decks and cards."""
@@ -48,9 +60,7 @@ def add_sample_data():
         ("Buenas noches", "Good night", "greetings, time"),
     ]
     
-    for front, back, tags in spanish_cards:
-        Card.create(deck_id=spanish.id, front=front, back=back, tags=tags)
-        print(f"  ✓ {front}")
+    add_cards(spanish, spanish_cards)
     
     # Add Python programming cards
     print("\nAdding Python programming cards...")
@@ -87,9 +97,7 @@ def add_sample_data():
          "tools, basics"),
     ]
     
-    for front, back, tags in python_cards:
-        Card.create(deck_id=python_deck.id, front=front, back=back, tags=tags)
-        print(f"  ✓ {front[:50]}...")
+    add_cards(python_deck, python_cards, lambda front: f"{front[:50]}...")
     
     # Add some cards to default deck
     default_deck = [d for d in Deck.get_all() if d.name == "Default"][0]
@@ -100,9 +108,7 @@ def add_sample_data():
         ("What is 2^10?", "1024", "math"),
     ]
     
-    for front, back, tags in general_cards:
-        Card.create(deck_id=default_deck.id, front=front, back=back, tags=tags)
-        print(f"  ✓ {front}")
+    add_cards(default_deck, general_cards)
     
     print("\n" + "="*50)
     print("Sample data added successfully!")
@@ -0,0 +1,247 @@
+"""Review history analytics for TextuAnki.
+
+History is read from the ``review_stats`` daily aggregates (one row per
+day and deck) in chunks into parallel ``array.array`` columns, so no
+per-review or per-row Python objects are built regardless of how many
+study sessions have been recorded.
+"""
+import json
+from array import array
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.database.db import Database, get_db
+
+# Rows fetched from SQLite per chunk
+CHUNK_SIZE = 10000
+
+
+def _column() -> array:
+    return array("q")
+
+
+@dataclass
+class ReviewHistory:
+    """Daily review aggregates stored column-wise."""
+    day: array = field(default_factory=_column)
+    deck_id: array = field(default_factory=_column)
+    reviews: array = field(default_factory=_column)
+    again: array = field(default_factory=_column)
+    hard: array = field(default_factory=_column)
+    good: array = field(default_factory=_column)
+    easy: array = field(default_factory=_column)
+    duration: array = field(default_factory=_column)
+    
+    @classmethod
+    def load(
+        cls,
+        deck_ids: Optional[Iterable[int]] = None,
+        db: Optional[Database] = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> "ReviewHistory":
+        """Stream review aggregates from the database.
+        
+        Args:
+            deck_ids: Only include these decks
+            db: Database to read. Defaults to the global instance.
+            chunk_size: Rows fetched per round trip
+        """
+        history = cls()
+        query = (
+            "SELECT day, deck_id, reviews, again, hard, good, easy, total_duration "
+            "FROM review_stats"
+        )
+        params: Tuple = ()
+        if deck_ids is not None:
+            query += " WHERE deck_id IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(list(deck_ids)),)
+        query += " ORDER BY day"
+        
+        db = db or get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.execute(query, params)
+            columns = (
+                history.deck_id, history.reviews, history.again, history.hard,
+                history.good, history.easy, history.duration
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                history.day.extend(date.fromisoformat(row[0]).toordinal() for row in rows)
+                for index, column in enumerate(columns, start=1):
+                    column.extend(row[index] for row in rows)
+        return history
+    
+    def __len__(self) -> int:
+        return len(self.day)
+    
+    @property
+    def total_reviews(self) -> int:
+        """Number of reviews in the history."""
+        return sum(self.reviews)
+    
+    @property
+    def total_duration(self) -> int:
+        """Total recorded answer time in milliseconds."""
+        return sum(self.duration)
+    
+    def daily_counts(self) -> Dict[date, int]:
+        """Reviews per calendar day, across all included decks."""
+        counts: Dict[int, int] = {}
+        for day, reviews in zip(self.day, self.reviews):
+            counts[day] = counts.get(day, 0) + reviews
+        return {date.fromordinal(day): count for day, count in counts.items()}
+    
+    def rating_distribution(self) -> Dict[str, int]:
+        """Total number of answers per rating button."""
+        return {
+            "again": sum(self.again),
+            "hard": sum(self.hard),
+            "good": sum(self.good),
+            "easy": sum(self.easy),
+        }
+    
+    def retention_curve(self, window: int = 7) -> List[Tuple[date, float]]:
+        """Rolling share of reviews answered Good or Easy, per day.
+        
+        Args:
+            window: Number of calendar days in each rolling window
+        """
+        totals: Dict[int, List[int]] = {}
+        for day, reviews, good, easy in zip(self.day, self.reviews, self.good, self.easy):
+            entry = totals.setdefault(day, [0, 0])
+            entry[0] += reviews
+            entry[1] += good + easy
+        
+        curve = []
+        days = sorted(totals)
+        start = 0
+        window_reviews = 0
+        window_passed = 0
+        for day in days:
+            window_reviews += totals[day][0]
+            window_passed += totals[day][1]
+            while days[start] <= day - window:
+                window_reviews -= totals[days[start]][0]
+                window_passed -= totals[days[start]][1]
+                start += 1
+            if window_reviews:
+                curve.append((date.fromordinal(day), window_passed / window_reviews))
+        return curve
+    
+    def streaks(self, today: Optional[date] = None) -> Tuple[int, int]:
+        """Return the (current, longest) runs of consecutive study days.
+        
+        The current streak is still alive if the last study day was yesterday.
+        """
+        days = sorted({day for day, reviews in zip(self.day, self.reviews) if reviews})
+        if not days:
+            return 0, 0
+        
+        longest = run = 1
+        for previous, day in zip(days, days[1:]):
+            run = run + 1 if day == previous + 1 else 1
+            longest = max(longest, run)
+        
+        today_ordinal = (today or date.today()).toordinal()
+        if days[-1] < today_ordinal - 1:
+            return 0, longest
+        current = 1
+        for index in range(len(days) - 1, 0, -1):
+            if days[index - 1] != days[index] - 1:
+                break
+            current += 1
+        return current, longest
+    
+    def deck_retention(self) -> Dict[int, float]:
+        """Share of reviews answered Good or Easy, per deck."""
+        totals: Dict[int, List[int]] = {}
+        for deck_id, reviews, good, easy in zip(self.deck_id, self.reviews, self.good, self.easy):
+            entry = totals.setdefault(deck_id, [0, 0])
+            entry[0] += reviews
+            entry[1] += good + easy
+        return {
+            deck_id: passed / reviews
+            for deck_id, (reviews, passed) in totals.items()
+            if reviews
+        }
+    
+    def recent_daily_counts(self, days: int = 30, today: Optional[date] = None) -> List[int]:
+        """Review counts for each of the last ``days`` days, oldest first."""
+        counts = self.daily_counts()
+        end = today or date.today()
+        return [counts.get(end - timedelta(days=offset), 0) for offset in range(days - 1, -1, -1)]
+
+
+@dataclass
+class TimingStats:
+    """Answer timings for a deck or a study session."""
+    reviews: int = 0
+    total_ms: int = 0
+    reveal_ms: array = field(default_factory=_column)
+    
+    def add(self, duration_ms: int, reveal_ms: Optional[int] = None) -> None:
+        """Record one timed answer."""
+        self.reviews += 1
+        self.total_ms += duration_ms
+        if reveal_ms is not None:
+            self.reveal_ms.append(reveal_ms)
+    
+    def discard(self, duration_ms: int, reveal_ms: Optional[int] = None) -> None:
+        """Take back an answer recorded with add(), e.g. after an undo."""
+        self.reviews -= 1
+        self.total_ms -= duration_ms
+        if reveal_ms is not None:
+            self.reveal_ms.remove(reveal_ms)
+    
+    @property
+    def cards_per_minute(self) -> float:
+        """Answered cards per minute of active study time."""
+        return self.reviews / (self.total_ms / 60000) if self.total_ms else 0.0
+    
+    def reveal_percentile(self, percentile: float) -> Optional[int]:
+        """Nearest-rank percentile (0-100) of time-to-reveal in milliseconds."""
+        if not self.reveal_ms:
+            return None
+        ordered = sorted(self.reveal_ms)
+        rank = max(0, min(len(ordered) - 1, round(percentile / 100 * len(ordered)) - 1))
+        return ordered[rank]
+
+
+def load_timing_stats(
+    days: int = 30,
+    db: Optional[Database] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict[int, TimingStats]:
+    """Per-deck answer timings from recent raw study sessions.
+    
+    Only sessions with a recorded duration are included, so reviews from
+    before timing was captured do not skew throughput.
+    
+    Args:
+        days: Look back this many days (raw sessions are kept for 90 by default)
+        db: Database to read. Defaults to the global instance.
+        chunk_size: Rows fetched per round trip
+    """
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    stats: Dict[int, TimingStats] = {}
+    
+    db = db or get_db()
+    with db.get_connection(read_only=True) as conn:
+        cursor = conn.execute("""
+            SELECT c.deck_id, s.duration, s.reveal_duration
+            FROM study_sessions s JOIN cards c ON c.id = s.card_id
+            WHERE s.reviewed_at >= ? AND s.duration IS NOT NULL
+        """, (since,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for deck_id, duration, reveal in rows:
+                entry = stats.get(deck_id)
+                if entry is None:
+                    entry = stats[deck_id] = TimingStats()
+                entry.add(duration, reveal)
+    return stats
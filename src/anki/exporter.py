@@ -0,0 +1,81 @@
+"""Export decks to Anki .apkg packages using genanki."""
+import hashlib
+from pathlib import Path
+
+import genanki
+
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.media import media_path, references
+from src.models.note import Note, NoteType
+
+# Fixed model ID so re-exported decks update the same note type in Anki
+BASIC_MODEL_ID = 1607392319
+
+BASIC_MODEL = genanki.Model(
+    BASIC_MODEL_ID,
+    "TextuAnki Basic",
+    fields=[{"name": "Front"}, {"name": "Back"}],
+    templates=[{
+        "name": "Card 1",
+        "qfmt": "{{Front}}",
+        "afmt": "{{FrontSide}}<hr id=answer>{{Back}}",
+    }],
+)
+
+
+def _stable_id(name: str) -> int:
+    """Derive a stable Anki deck ID from a deck name."""
+    return (1 << 30) + int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:7], 16)
+
+
+def _anki_tags(tags: str) -> list:
+    """Convert comma-separated tags to Anki's space-free tag list."""
+    return [tag.strip().replace(" ", "_") for tag in tags.split(",") if tag.strip()]
+
+
+def export_deck(deck: Deck, output: Path) -> int:
+    """Write a deck and its cards to an .apkg file.
+    
+    Media the cards reference is included once per file. The package is
+    written from the stored files, which are streamed rather than loaded.
+    Cloze notes are exported once, as Anki cloze notes that generate their
+    cards on import; other cards are exported as basic notes.
+    
+    Returns:
+        Number of cards exported
+    """
+    anki_deck = genanki.Deck(_stable_id(deck.name), deck.name, description=deck.description or "")
+    
+    cards = Card.get_by_deck(deck.id)
+    notes = Note.get_by_ids(card.note_id for card in cards if card.note_id is not None)
+    note_types = {}
+    exported_notes = set()
+    media_files = {}
+    for card in cards:
+        for name in references(f"{card.front}\n{card.back}"):
+            path = media_path(name)
+            if name not in media_files and path.exists():
+                media_files[name] = str(path)
+        
+        note = notes.get(card.note_id)
+        if note is not None:
+            if note.note_type_id not in note_types:
+                note_types[note.note_type_id] = NoteType.get_by_id(note.note_type_id)
+            if note_types[note.note_type_id].is_cloze:
+                if note.id not in exported_notes:
+                    exported_notes.add(note.id)
+                    anki_deck.add_note(genanki.Note(
+                        model=genanki.CLOZE_MODEL,
+                        fields=(note.fields + ["", ""])[:2],
+                        tags=_anki_tags(note.tags),
+                    ))
+                continue
+        anki_deck.add_note(genanki.Note(
+            model=BASIC_MODEL,
+            fields=[card.front, card.back],
+            tags=_anki_tags(card.tags or ""),
+        ))
+    
+    genanki.Package(anki_deck, media_files=list(media_files.values())).write_to_file(str(output))
+    return len(cards)
@@ -0,0 +1,113 @@
+"""Import cards from delimited text files and pasted tables."""
+import csv
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.media import Media
+from src.models.note import CLOZE_TYPE, Note, NoteType, cloze_numbers
+
+# Row under a Markdown table's header, e.g. ``|---|:--:|``
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+# Cell borders of a Markdown table row; ``\|`` is a literal pipe
+_CELL_BORDER = re.compile(r"(?<!\\)\|")
+_LINE_BREAK = re.compile(r"<br\s*/?>", re.IGNORECASE)
+
+
+def parse_delimited(text: str, delimiter: str = "\t") -> List[Tuple[str, str, str]]:
+    """Parse delimited text into (front, back, tags) rows.
+    
+    Rows with fewer than two non-empty columns are skipped, except cloze
+    rows, whose back is optional. A third column, when present, is used
+    as the tags.
+    """
+    return _card_rows(csv.reader(text.splitlines(), delimiter=delimiter))
+
+
+def parse_table(text: str) -> List[Tuple[str, str, str]]:
+    """Parse a pasted table into (front, back, tags) rows.
+    
+    Markdown tables (``| front | back |``) drop their header row and turn
+    ``<br>`` into line breaks; anything else is read as tab-separated,
+    the way spreadsheets copy cells. Rows follow parse_delimited()'s rules.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    if not lines or not all(line.lstrip().startswith("|") for line in lines):
+        return parse_delimited(text)
+    
+    records = []
+    for line in lines:
+        if _TABLE_SEPARATOR.match(line):
+            # The rows above the separator are the header
+            records = []
+            continue
+        # Cells between the outer borders; the closing one is optional
+        cells = _CELL_BORDER.split(line.strip())[1:]
+        if len(cells) > 1 and not cells[-1].strip():
+            cells.pop()
+        records.append([_LINE_BREAK.sub("\n", cell).replace("\\|", "|") for cell in cells])
+    return _card_rows(records)
+
+
+def _card_rows(records: Iterable[List[str]]) -> List[Tuple[str, str, str]]:
+    """(front, back, tags) rows of parsed records, skipping incomplete ones."""
+    rows = []
+    for record in records:
+        fields = [field.strip() for field in record]
+        if not fields or not fields[0]:
+            continue
+        back = fields[1] if len(fields) > 1 else ""
+        if not back and not cloze_numbers(fields[0]):
+            continue
+        tags = fields[2] if len(fields) > 2 else ""
+        rows.append((fields[0], back, tags))
+    return rows
+
+
+@dataclass
+class ImportReport:
+    """Outcome of an import: cards created and duplicate cards left out."""
+    imported: int = 0
+    duplicates: int = 0
+
+
+def import_file(path: Path, deck_name: str = "Default", allow_duplicates: bool = False) -> ImportReport:
+    """Import a TSV or CSV file into a deck, creating the deck if needed.
+    
+    Images and sounds the cards reference by a path relative to the file
+    are copied into the media store; each file is stored once however
+    many cards use it. Rows whose front has cloze deletions become Cloze
+    notes, with the back as the extra text, and generate a card per
+    cloze number. Rows whose front is already in the deck, or repeated in
+    the file, are skipped unless allow_duplicates is set.
+    
+    Returns:
+        Numbers of cards imported and of duplicate cards left out
+    """
+    delimiter = "," if path.suffix.lower() == ".csv" else "\t"
+    rows = parse_delimited(path.read_text(encoding="utf-8"), delimiter)
+    
+    stored = {}
+    base_dir = path.parent
+    rows = [
+        (Media.import_references(front, base_dir, stored),
+         Media.import_references(back, base_dir, stored), tags)
+        for front, back, tags in rows
+    ]
+    
+    deck = Deck.get_by_name(deck_name) or Deck.create(name=deck_name)
+    cloze_rows = [([front, back], tags) for front, back, tags in rows if cloze_numbers(front)]
+    card_rows = [row for row in rows if not cloze_numbers(row[0])]
+    report = ImportReport()
+    report.imported = Card.bulk_create(deck.id, card_rows, skip_duplicates=not allow_duplicates)
+    report.duplicates = len(card_rows) - report.imported
+    if cloze_rows:
+        note_type = NoteType.get_by_name(CLOZE_TYPE)
+        created = Note.bulk_create(note_type, deck.id, cloze_rows, skip_duplicates=not allow_duplicates)
+        report.imported += created
+        report.duplicates += sum(len(note_type.card_ordinals(fields)) for fields, _ in cloze_rows) - created
+    return report
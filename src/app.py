@@ -1,11 +1,30 @@
 """Main Textual application for TextuAnki."""
+import sqlite3
+import time
+
+from textual import events
 from textual.app import App, ComposeResult
 from textual.binding import Binding
 from textual.widgets import Header, Footer
 from textual.screen import Screen
+from typing import Optional
 
-from src.screens.dashboard import DashboardScreen
 from src.database.db import get_db
+from src.profiler import get_profiler
+
+# Interval used to sample event loop lag while the profiler overlay is open
+FRAME_SAMPLE_INTERVAL = 1 / 20
+
+# Background maintenance runs once the user has been idle for a while
+MAINTENANCE_CHECK_INTERVAL = 5 * 60
+MAINTENANCE_IDLE_SECONDS = 10 * 60
+MAINTENANCE_MIN_SPACING = 6 * 60 * 60
+MAINTENANCE_VACUUM_PAGES = 2000
+
+# Backups are checked for shortly after startup and then periodically;
+# one is taken when the newest is older than backup.BACKUP_INTERVAL
+BACKUP_STARTUP_DELAY = 30
+BACKUP_CHECK_INTERVAL = 15 * 60
 
 
 class TextuAnkiApp(App):
@@ -52,15 +71,179 @@ class TextuAnkiApp(App):
         Binding("ctrl+s", "study", "Study"),
         Binding("ctrl+b", "browse", "Browse"),
         Binding("ctrl+h", "home", "Home"),
+        Binding("f2", "switch_profile", "Profile"),
+        Binding("f12", "toggle_profiler", "Profiler", show=False),
+        Binding("f11", "toggle_cprofile", "cProfile", show=False),
     ]
     
+    def __init__(self, started_at: Optional[float] = None, profile: Optional[str] = None):
+        """Create the app.
+        
+        Args:
+            started_at: perf_counter() value at process start, used to
+                measure time-to-first-paint
+            profile: Name of the open profile, shown in the header
+        """
+        super().__init__()
+        self.profile = profile
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.first_paint_time: Optional[float] = None
+        self.show_profiler = False
+        self._frame_timer = None
+        # Whether spans were recorded before the overlay turned them on
+        self._profiling_before_overlay = False
+        self._last_frame = 0.0
+        self._last_activity = time.monotonic()
+        self._last_maintenance: Optional[float] = None
+    
     def on_mount(self) -> None:
         """Initialize the app when mounted."""
+        # Screens are imported lazily to keep cold start fast
+        from src.screens.dashboard import DashboardScreen
+        
         # Initialize database
         get_db()
+        if self.profile:
+            self.sub_title = f"{self.SUB_TITLE} • {self.profile}"
         
         # Push the dashboard screen
         self.push_screen(DashboardScreen())
+        self.call_after_refresh(self._record_first_paint)
+        self.set_interval(MAINTENANCE_CHECK_INTERVAL, self._maybe_run_maintenance)
+        self.set_timer(BACKUP_STARTUP_DELAY, self._start_backup)
+        self.set_interval(BACKUP_CHECK_INTERVAL, self._start_backup)
+    
+    def _record_first_paint(self) -> None:
+        """Record the time from process start to the first rendered frame."""
+        self.first_paint_time = time.perf_counter() - self.started_at
+        get_profiler().record("startup.first_paint", self.first_paint_time)
+    
+    async def on_event(self, event: events.Event) -> None:
+        """Track user activity so maintenance only runs while idle."""
+        if isinstance(event, (events.Key, events.MouseDown)):
+            self._last_activity = time.monotonic()
+        await super().on_event(event)
+    
+    def _maybe_run_maintenance(self) -> None:
+        """Start a background maintenance pass if the user is idle."""
+        now = time.monotonic()
+        if now - self._last_activity < MAINTENANCE_IDLE_SECONDS:
+            return
+        if self._last_maintenance is not None and now - self._last_maintenance < MAINTENANCE_MIN_SPACING:
+            return
+        
+        self._last_maintenance = now
+        self.run_worker(
+            self._run_maintenance,
+            thread=True,
+            exclusive=True,
+            group="maintenance"
+        )
+    
+    def _run_maintenance(self) -> None:
+        """Run an incremental maintenance pass off the UI thread."""
+        from src.database.archive import archive_sessions
+        from src.database.maintenance import run_maintenance
+        
+        try:
+            archive_sessions()
+            report = run_maintenance(vacuum_pages=MAINTENANCE_VACUUM_PAGES, check_integrity=False)
+        except (sqlite3.Error, OSError) as e:
+            # Tried again on a later idle pass; never worth crashing the app over
+            self.call_from_thread(self.notify, f"Background maintenance failed: {e}", severity="warning")
+            return
+        get_profiler().record("maintenance", report.duration)
+    
+    def _start_backup(self) -> None:
+        """Check for a due backup off the UI thread."""
+        self.run_worker(self._run_backup, thread=True, exclusive=True, group="backup")
+    
+    def _run_backup(self) -> None:
+        """Back up the collection if the newest backup is too old and it changed since."""
+        from datetime import datetime
+        
+        from src.database.backup import BACKUP_INTERVAL, BackupError, create_backup, list_backups
+        
+        try:
+            backups = list_backups()
+            if backups and datetime.now() - backups[0].created < BACKUP_INTERVAL:
+                return
+            report = create_backup()
+        except (BackupError, OSError, sqlite3.Error) as e:
+            self.call_from_thread(self.notify, f"Backup failed: {e}", severity="error")
+            return
+        if not report.skipped:
+            get_profiler().record("backup", report.duration)
+    
+    def action_switch_profile(self) -> None:
+        """Open another profile's collection without restarting."""
+        from src.screens.profiles import ProfileSwitchModal
+        
+        def switch(name) -> None:
+            if name is None or name == self.profile:
+                return
+            
+            from src.database.profiles import ProfileRegistry, activate_profile
+            from src.screens.dashboard import DashboardScreen
+            
+            registry = ProfileRegistry()
+            activate_profile(name, registry)
+            registry.set_current(name)
+            self.profile = name
+            self.sub_title = f"{self.SUB_TITLE} • {name}"
+            self._last_maintenance = None
+            
+            # Screens hold data from the previous collection
+            while len(self.screen_stack) > 1:
+                self.pop_screen()
+            self.push_screen(DashboardScreen())
+            self.notify(f"Switched to profile '{name}'", severity="information")
+        
+        self.push_screen(ProfileSwitchModal(self.profile or ""), switch)
+    
+    def action_toggle_profiler(self) -> None:
+        """Show or hide the profiling overlay."""
+        from src.widgets.profiler_overlay import ProfilerOverlay
+        
+        self.show_profiler = not self.show_profiler
+        
+        if self.show_profiler:
+            self._profiling_before_overlay = get_profiler().enabled
+            get_profiler().enabled = True
+            self._last_frame = time.perf_counter()
+            self._frame_timer = self.set_interval(FRAME_SAMPLE_INTERVAL, self._sample_frame)
+            self.screen.mount(ProfilerOverlay())
+        else:
+            if self._frame_timer is not None:
+                self._frame_timer.stop()
+                self._frame_timer = None
+            # Stays on if TEXTUANKI_PROFILE had it on
+            get_profiler().enabled = self._profiling_before_overlay
+            for screen in self.screen_stack:
+                for overlay in screen.query(ProfilerOverlay):
+                    overlay.remove()
+    
+    def action_toggle_cprofile(self) -> None:
+        """Start or stop recording a cProfile session to a pstats file."""
+        profiler = get_profiler()
+        if profiler.cprofile_running:
+            path = profiler.stop_cprofile()
+            self.notify(f"Profile saved to {path}", severity="information")
+        else:
+            profiler.start_cprofile()
+            self.notify("cProfile recording started (F11 to stop)", severity="information")
+    
+    def _sample_frame(self) -> None:
+        """Record event loop lag and keep the overlay on the active screen."""
+        from src.widgets.profiler_overlay import ProfilerOverlay
+        
+        now = time.perf_counter()
+        lag = max(0.0, now - self._last_frame - FRAME_SAMPLE_INTERVAL)
+        self._last_frame = now
+        get_profiler().record("event loop lag", lag)
+        
+        if self.show_profiler and not self.screen.query(ProfilerOverlay):
+            self.screen.mount(ProfilerOverlay())
     
     def action_toggle_dark(self) -> None:
         """Toggle dark mode."""
@@ -0,0 +1,287 @@
+"""Headless command implementations for the textuanki CLI.
+
+Nothing in this module may import Textual; heavier dependencies such as
+genanki are imported inside the command that needs them.
+"""
+import argparse
+import json
+import sys
+from dataclasses import asdict
+
+from src.models.card import Card
+from src.models.deck import Deck
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    """Print per-deck card, due and new counts."""
+    summaries = Deck.get_summaries()
+    
+    if args.json:
+        print(json.dumps([asdict(summary) for summary in summaries]))
+        return 0
+    
+    for summary in summaries:
+        print(f"{summary.name:<30} {summary.total:>7} cards {summary.due:>7} due {summary.new:>7} new")
+    
+    print(
+        f"{'Total':<30} {sum(s.total for s in summaries):>7} cards "
+        f"{sum(s.due for s in summaries):>7} due {sum(s.new for s in summaries):>7} new"
+    )
+    return 0
+
+
+def cmd_due(args: argparse.Namespace) -> int:
+    """Print the number of due cards, optionally for a single deck."""
+    deck_id = None
+    if args.deck is not None:
+        deck = Deck.get_by_name(args.deck)
+        if deck is None:
+            print(f"Deck not found: {args.deck}", file=sys.stderr)
+            return 1
+        deck_id = deck.id
+    
+    due = Card.count_due(deck_id)
+    
+    if args.json:
+        print(json.dumps({"deck": args.deck, "due": due}))
+    else:
+        print(due)
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Import cards from a TSV/CSV file."""
+    from src.anki.importer import import_file
+    
+    if not args.path.exists():
+        print(f"File not found: {args.path}", file=sys.stderr)
+        return 1
+    
+    report = import_file(args.path, args.deck, allow_duplicates=args.allow_duplicates)
+    message = f"Imported {report.imported} cards into '{args.deck}'"
+    if report.duplicates:
+        message += f", skipped {report.duplicates} duplicates"
+    print(message)
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """Export a deck to an .apkg package."""
+    deck = Deck.get_by_name(args.deck)
+    if deck is None:
+        print(f"Deck not found: {args.deck}", file=sys.stderr)
+        return 1
+    
+    from src.anki.exporter import export_deck
+    
+    count = export_deck(deck, args.output)
+    print(f"Exported {count} cards to {args.output}")
+    return 0
+
+
+def cmd_dedupe(args: argparse.Namespace) -> int:
+    """Find groups of near-duplicate cards."""
+    from src.models.duplicates import find_near_duplicates
+    
+    deck_id = None
+    if args.deck:
+        deck = Deck.get_by_name(args.deck)
+        if deck is None:
+            print(f"Deck not found: {args.deck}", file=sys.stderr)
+            return 1
+        deck_id = deck.id
+    
+    report = find_near_duplicates(threshold=args.threshold, deck_id=deck_id)
+    if args.json:
+        print(json.dumps([asdict(group) for group in report.groups]))
+        return 0
+    
+    deck_names = {deck.id: deck.name for deck in Deck.get_all()}
+    for group in report.groups[:args.limit]:
+        print(f"Similarity {group.similarity:.2f}:")
+        for card_id in group.card_ids:
+            card = Card.get_by_id(card_id)
+            if card is not None:
+                front = " ".join(card.front.split())
+                print(f"  {card.id:>8}  {deck_names.get(card.deck_id, '?')[:20]:<20}  {front[:60]}")
+    if len(report.groups) > args.limit:
+        print(f"... and {len(report.groups) - args.limit} more groups (see --limit)")
+    print(report.summary())
+    return 0
+
+
+def cmd_maintain(args: argparse.Namespace) -> int:
+    """Analyze, vacuum and integrity-check the database."""
+    from src.database.maintenance import run_maintenance
+    
+    if args.pages is not None and args.pages < 1:
+        print("--pages must be at least 1; leave it out to reclaim every free page", file=sys.stderr)
+        return 1
+    
+    report = run_maintenance(
+        vacuum_pages=args.pages,
+        full_analyze=args.full,
+        check_integrity=not args.skip_integrity
+    )
+    print(report.summary())
+    for error in report.integrity_errors:
+        print(f"  {error}", file=sys.stderr)
+    return 1 if report.integrity_errors else 0
+
+
+def cmd_archive(args: argparse.Namespace) -> int:
+    """Compact old study sessions into daily rollups."""
+    from src.database.archive import archive_sessions
+    
+    report = archive_sessions(keep_days=args.keep_days, archive_path=args.archive)
+    print(report.summary())
+    return 0
+
+
+def cmd_backup(args: argparse.Namespace) -> int:
+    """Back up the collection, or list its backups."""
+    from src.database.backup import BackupError, backups_dir, create_backup, list_backups
+    
+    if args.list:
+        backups = list_backups()
+        if not backups:
+            print(f"No backups in {backups_dir()}")
+        for backup in backups:
+            print(f"{backup.path.name:<50} {backup.created:%Y-%m-%d %H:%M} {backup.size / 1024 / 1024:>8.1f} MiB")
+        return 0
+    
+    try:
+        report = create_backup(force=args.force, compression=args.compression)
+    except BackupError as e:
+        print(f"Backup failed: {e}", file=sys.stderr)
+        return 1
+    print(report.summary())
+    return 0
+
+
+def cmd_restore(args: argparse.Namespace) -> int:
+    """Replace the collection with a backup, backing up the current state first."""
+    from src.database.backup import BackupError, find_backup, restore_backup
+    
+    try:
+        backup = find_backup(args.backup)
+        safety = restore_backup(backup)
+    except BackupError as e:
+        print(f"Restore failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Restored {backup.path.name} (taken {backup.created:%Y-%m-%d %H:%M})")
+    print(f"The previous state was backed up to {safety.path}")
+    return 0
+
+
+def cmd_media(args: argparse.Namespace) -> int:
+    """Add media files, check references or delete unused files."""
+    from src.models.media import Media
+    
+    if args.action == "add":
+        for path in args.files:
+            if not path.is_file():
+                print(f"File not found: {path}", file=sys.stderr)
+                return 1
+            media = Media.add_file(path)
+            print(f"{path}\t{media.reference}")
+    elif args.action == "check":
+        report = Media.check()
+        print(report.summary())
+        for name in report.missing:
+            print(f"  missing: {name}", file=sys.stderr)
+        return 1 if report.missing else 0
+    else:
+        print(f"Deleted {Media.collect_garbage()} unused media files")
+    return 0
+
+
+def cmd_profiles(args: argparse.Namespace) -> int:
+    """List, add, remove or choose the default profile."""
+    from src.database.profiles import ProfileRegistry
+    
+    registry = ProfileRegistry()
+    try:
+        if args.action == "add":
+            profile = registry.add(args.name, args.path)
+            print(f"Added profile {profile.name} at {profile.path}")
+        elif args.action == "remove":
+            registry.remove(args.name)
+            print(f"Removed profile {args.name} (its database file was kept)")
+        elif args.action == "use":
+            registry.set_current(args.name)
+            print(f"Default profile is now {args.name}")
+        else:
+            for profile in registry.profiles():
+                marker = "*" if profile.name == registry.current else " "
+                print(f"{marker} {profile.name:<20} {profile.path}")
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_sync(args: argparse.Namespace) -> int:
+    """Exchange changes with a sync server."""
+    from src.sync.changes import SyncError
+    from src.sync.client import sync
+    
+    try:
+        report = sync(args.url, token=args.token)
+    except SyncError as e:
+        print(f"Sync failed: {e}", file=sys.stderr)
+        return 1
+    print(report.summary())
+    return 0
+
+
+def cmd_sync_server(args: argparse.Namespace) -> int:
+    """Serve the collection to sync clients until interrupted."""
+    from src.database.db import get_db
+    from src.sync.server import make_server
+    
+    db = get_db()
+    server = make_server(db, args.host, args.port, token=args.token)
+    print(f"Serving {db.db_path} on http://{args.host}:{server.server_port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_changes(args: argparse.Namespace) -> int:
+    """Print the change log after a sequence number, one change per line."""
+    from src.database.oplog import changes_since
+    
+    for change in changes_since(args.since, limit=args.limit):
+        if args.json:
+            record = asdict(change)
+            record["created_at"] = change.created_at.isoformat()
+            print(json.dumps(record))
+        else:
+            ids = ",".join(map(str, change.ids[:10])) + ("..." if change.count > 10 else "")
+            print(f"{change.seq:>8} {change.created_at} {change.entity}.{change.op} "
+                  f"{change.count} [{ids}] {json.dumps(change.data) if change.data else ''}".rstrip())
+    return 0
+
+
+# Subcommand name -> handler
+COMMANDS = {
+    "stats": cmd_stats,
+    "due": cmd_due,
+    "import": cmd_import,
+    "export": cmd_export,
+    "dedupe": cmd_dedupe,
+    "maintain": cmd_maintain,
+    "archive": cmd_archive,
+    "backup": cmd_backup,
+    "restore": cmd_restore,
+    "media": cmd_media,
+    "profiles": cmd_profiles,
+    "sync": cmd_sync,
+    "sync-server": cmd_sync_server,
+    "changes": cmd_changes,
+}
@@ -0,0 +1,112 @@
+"""Compaction of old study_sessions rows into per-card daily rollups."""
+import gzip
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from src.database.db import Database, get_db, retry_on_locked
+from src.database.oplog import prune_changes
+
+# Raw sessions younger than this are kept for scheduling and recent statistics
+DEFAULT_KEEP_DAYS = 90
+
+# Rows streamed to the archive file per fetch
+ARCHIVE_BATCH_SIZE = 5000
+
+
+@dataclass
+class ArchiveReport:
+    """Outcome of an archive run."""
+    sessions_compacted: int = 0
+    rollup_rows: int = 0
+    changes_pruned: int = 0
+    archive_path: Optional[Path] = None
+    duration: float = 0.0
+    
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        text = (
+            f"Compacted {self.sessions_compacted} sessions into "
+            f"{self.rollup_rows} daily rollups and pruned {self.changes_pruned} "
+            f"change log entries in {self.duration * 1000:.0f} ms"
+        )
+        if self.archive_path is not None:
+            text += f", raw rows appended to {self.archive_path}"
+        return text
+
+
+@retry_on_locked
+def archive_sessions(
+    keep_days: int = DEFAULT_KEEP_DAYS,
+    archive_path: Optional[Path] = None,
+    db: Optional[Database] = None,
+) -> ArchiveReport:
+    """Roll up study sessions older than ``keep_days`` and delete the raw rows.
+    
+    Sessions are aggregated into ``study_daily`` (one row per card and day,
+    merged with any existing rollup) in the same transaction that deletes
+    them, so history is never lost or double counted. Change log entries
+    older than ``keep_days`` are pruned in the same run.
+    
+    Args:
+        keep_days: Age in days after which raw sessions are compacted
+        archive_path: Optional gzip JSON-lines file the raw rows are appended to
+        db: Database to compact. Defaults to the global instance.
+    """
+    db = db or get_db()
+    report = ArchiveReport(archive_path=archive_path)
+    start = time.perf_counter()
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Take the write lock before streaming, so a lock retry cannot
+        # append the same rows to the archive twice
+        cursor.execute("BEGIN IMMEDIATE")
+        
+        if archive_path is not None:
+            archive_path.parent.mkdir(parents=True, exist_ok=True)
+            cursor.execute(
+                "SELECT id, card_id, rating, duration, reveal_duration, reviewed_at FROM study_sessions "
+                "WHERE reviewed_at < ? ORDER BY id",
+                (cutoff,)
+            )
+            # Appending writes a new gzip member; readers see one continuous stream
+            with gzip.open(archive_path, "at", encoding="utf-8") as archive:
+                while True:
+                    rows = cursor.fetchmany(ARCHIVE_BATCH_SIZE)
+                    if not rows:
+                        break
+                    for row in rows:
+                        archive.write(json.dumps(dict(row)) + "\n")
+        
+        cursor.execute("""
+            INSERT INTO study_daily (card_id, day, reviews, again, hard, good, easy, total_duration)
+            SELECT card_id, date(reviewed_at), COUNT(*),
+                   SUM(rating <= 1), SUM(rating = 2), SUM(rating = 3), SUM(rating >= 4),
+                   COALESCE(SUM(duration), 0)
+            FROM study_sessions
+            WHERE reviewed_at < ?
+            GROUP BY card_id, date(reviewed_at)
+            ON CONFLICT (card_id, day) DO UPDATE SET
+                reviews = reviews + excluded.reviews,
+                again = again + excluded.again,
+                hard = hard + excluded.hard,
+                good = good + excluded.good,
+                easy = easy + excluded.easy,
+                total_duration = total_duration + excluded.total_duration
+        """, (cutoff,))
+        report.rollup_rows = cursor.rowcount
+        
+        cursor.execute("DELETE FROM study_sessions WHERE reviewed_at < ?", (cutoff,))
+        report.sessions_compacted = cursor.rowcount
+        
+        report.changes_pruned = prune_changes(cursor, keep_days)
+        conn.commit()
+    
+    report.duration = time.perf_counter() - start
+    return report
@@ -0,0 +1,349 @@
+"""Compressed, rotated snapshots of a collection and restoring from them.
+
+Snapshots are taken with SQLite's online backup API from a read
+snapshot, a few pages at a time with a short pause between steps, so a
+study session keeps writing while a large collection is copied. The
+copy is then compressed (zstd when the ``zstandard`` package is
+installed, gzip otherwise) into ``backups/<collection>/`` next to the
+database file. File names carry the change log position (see
+src/database/oplog.py), so a backup of an unchanged collection is skipped.
+"""
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Set, Union
+
+from src.database.db import Database, get_db
+from src.database.oplog import COLLECTION, log_change, publish_changes
+
+try:
+    import zstandard
+except ImportError:  # optional: fall back to gzip
+    zstandard = None
+
+# Pages copied per backup step (4 MiB with the default page size) and the
+# pause between steps, which leaves the disk and the GIL to the UI
+BACKUP_STEP_PAGES = 1024
+BACKUP_STEP_SLEEP = 0.005
+
+# How often the app takes a backup of a changed collection
+BACKUP_INTERVAL = timedelta(hours=6)
+
+# Retention: the most recent backups, plus the newest one of each of the
+# last days and weeks that have one
+DEFAULT_KEEP_LAST = 5
+DEFAULT_KEEP_DAILY = 7
+DEFAULT_KEEP_WEEKLY = 4
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+_STAMP_FORMAT = "%Y%m%d-%H%M%S"
+_BACKUP_NAME = re.compile(r"^(?P<stem>.+)-(?P<stamp>\d{8}-\d{6})-(?P<seq>\d+)\.db\.(?P<ext>gz|zst)$")
+
+
+class BackupError(Exception):
+    """A backup could not be read or restored."""
+
+
+@dataclass
+class BackupInfo:
+    """A backup file.
+    
+    Attributes:
+        path: Compressed database file
+        created: When the snapshot was taken
+        seq: Change log position the snapshot contains changes up to
+        size: File size in bytes
+    """
+    path: Path
+    created: datetime
+    seq: int
+    size: int
+    
+    @property
+    def compression(self) -> str:
+        """"gzip" or "zstd"."""
+        return "zstd" if self.path.suffix == ".zst" else "gzip"
+
+
+@dataclass
+class BackupReport:
+    """Outcome of a backup run."""
+    path: Optional[Path] = None
+    skipped: bool = False
+    database_size: int = 0
+    backup_size: int = 0
+    removed: List[Path] = field(default_factory=list)
+    duration: float = 0.0
+    
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        if self.skipped:
+            return "No changes since the last backup, nothing to do"
+        text = (
+            f"Backed up {self.database_size / 1024 / 1024:.1f} MiB to {self.path} "
+            f"({self.backup_size / 1024 / 1024:.1f} MiB) in {self.duration * 1000:.0f} ms"
+        )
+        if self.removed:
+            text += f", removed {len(self.removed)} old backup(s)"
+        return text
+
+
+def backups_dir(db: Optional[Database] = None) -> Path:
+    """Directory holding a collection's backups."""
+    db = db or get_db()
+    return db.db_path.parent / "backups" / db.db_path.stem
+
+
+def default_compression() -> str:
+    """zstd when available, gzip otherwise."""
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def list_backups(db: Optional[Database] = None) -> List[BackupInfo]:
+    """A collection's backups, newest first."""
+    directory = backups_dir(db)
+    if not directory.is_dir():
+        return []
+    
+    backups = []
+    for path in directory.iterdir():
+        match = _BACKUP_NAME.match(path.name)
+        if match is None:
+            continue
+        backups.append(BackupInfo(
+            path=path,
+            created=datetime.strptime(match["stamp"], _STAMP_FORMAT),
+            seq=int(match["seq"]),
+            size=path.stat().st_size
+        ))
+    backups.sort(key=lambda backup: (backup.created, backup.seq), reverse=True)
+    return backups
+
+
+def _oplog_seq(cursor: sqlite3.Cursor) -> int:
+    """Last change log sequence number, counting pruned entries."""
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'oplog'").fetchone()
+    return row[0] if row else 0
+
+
+def create_backup(
+    db: Optional[Database] = None,
+    force: bool = False,
+    compression: Optional[str] = None,
+    keep_last: int = DEFAULT_KEEP_LAST,
+    keep_daily: int = DEFAULT_KEEP_DAILY,
+    keep_weekly: int = DEFAULT_KEEP_WEEKLY,
+) -> BackupReport:
+    """Snapshot a collection into a compressed backup and rotate old ones.
+    
+    Safe to call from a worker thread while the collection is in use: the
+    copy reads one consistent snapshot, so writes made meanwhile neither
+    block on it nor restart it, and end up in the next backup.
+    
+    Args:
+        db: Collection to back up. Defaults to the global instance.
+        force: Back up even if nothing changed since the last backup
+        compression: "gzip" or "zstd". Defaults to zstd when installed.
+        keep_last: Number of most recent backups always kept
+        keep_daily: Days for which the newest backup of the day is kept
+        keep_weekly: Weeks for which the newest backup of the week is kept
+    
+    Raises:
+        BackupError: If zstd is requested but not installed
+    """
+    db = db or get_db()
+    compression = compression or default_compression()
+    if compression == "zstd" and zstandard is None:
+        raise BackupError("zstd compression needs the zstandard package")
+    report = BackupReport()
+    start = time.perf_counter()
+    directory = backups_dir(db)
+    directory.mkdir(parents=True, exist_ok=True)
+    
+    with db.get_connection(read_only=True) as source:
+        # The first read pins the snapshot every backup step copies from
+        seq = _oplog_seq(source.cursor())
+        backups = list_backups(db)
+        if not force and backups and backups[0].seq == seq:
+            report.skipped = True
+            return report
+        
+        created = datetime.now()
+        name = f"{db.db_path.stem}-{created.strftime(_STAMP_FORMAT)}-{seq}.db.{_EXTENSIONS[compression]}"
+        snapshot_path = directory / f".{name}.snapshot"
+        target = sqlite3.connect(snapshot_path)
+        try:
+            target.execute("PRAGMA synchronous = OFF")
+            source.backup(target, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+        finally:
+            target.close()
+    
+    try:
+        report.database_size = snapshot_path.stat().st_size
+        report.path = directory / name
+        _compress(snapshot_path, report.path, compression)
+    finally:
+        snapshot_path.unlink(missing_ok=True)
+    report.backup_size = report.path.stat().st_size
+    
+    report.removed = prune_backups(db, keep_last, keep_daily, keep_weekly)
+    report.duration = time.perf_counter() - start
+    return report
+
+
+def _compress(source: Path, path: Path, compression: str) -> None:
+    """Compress a file, replacing ``path`` only once it is complete."""
+    temp_path = path.with_name(f".{path.name}.tmp")
+    with open(source, "rb") as raw, open(temp_path, "wb") as out:
+        if compression == "zstd":
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+            compressor.copy_stream(raw, out, read_size=COPY_CHUNK_SIZE)
+        else:
+            with gzip.GzipFile(filename="", mode="wb", fileobj=out, compresslevel=GZIP_LEVEL) as packed:
+                shutil.copyfileobj(raw, packed, COPY_CHUNK_SIZE)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(temp_path, path)
+
+
+def _decompress(backup: BackupInfo, path: Path) -> None:
+    """Write a backup's database file to ``path``."""
+    with open(backup.path, "rb") as packed, open(path, "wb") as out:
+        if backup.compression == "zstd":
+            if zstandard is None:
+                raise BackupError(f"{backup.path.name} is zstd-compressed; install zstandard to restore it")
+            zstandard.ZstdDecompressor().copy_stream(packed, out, read_size=COPY_CHUNK_SIZE)
+        else:
+            with gzip.GzipFile(fileobj=packed, mode="rb") as raw:
+                shutil.copyfileobj(raw, out, COPY_CHUNK_SIZE)
+
+
+def _retained(backups: List[BackupInfo], keep_last: int, keep_daily: int, keep_weekly: int) -> Set[Path]:
+    """Paths kept by the retention policy; ``backups`` are newest first."""
+    keep = {backup.path for backup in backups[:keep_last]}
+    for period, count in (
+        (lambda backup: backup.created.date(), keep_daily),
+        (lambda backup: backup.created.isocalendar()[:2], keep_weekly),
+    ):
+        seen = set()
+        for backup in backups:
+            key = period(backup)
+            if key in seen:
+                continue
+            if len(seen) == count:
+                break
+            seen.add(key)
+            keep.add(backup.path)
+    return keep
+
+
+def prune_backups(
+    db: Optional[Database] = None,
+    keep_last: int = DEFAULT_KEEP_LAST,
+    keep_daily: int = DEFAULT_KEEP_DAILY,
+    keep_weekly: int = DEFAULT_KEEP_WEEKLY,
+) -> List[Path]:
+    """Delete backups the retention policy no longer keeps.
+    
+    Returns:
+        The deleted files
+    """
+    backups = list_backups(db)
+    keep = _retained(backups, keep_last, keep_daily, keep_weekly)
+    removed = []
+    for backup in backups:
+        if backup.path not in keep:
+            backup.path.unlink(missing_ok=True)
+            removed.append(backup.path)
+    return removed
+
+
+def find_backup(name: Optional[Union[str, Path]] = None, db: Optional[Database] = None) -> BackupInfo:
+    """Look up a backup by file name or path, or the newest one.
+    
+    Raises:
+        BackupError: If there is no such backup
+    """
+    backups = list_backups(db)
+    if name is None:
+        if not backups:
+            raise BackupError(f"No backups in {backups_dir(db)}")
+        return backups[0]
+    
+    for backup in backups:
+        if backup.path.name == str(name):
+            return backup
+    path = Path(name).expanduser()
+    match = _BACKUP_NAME.match(path.name)
+    if not path.is_file() or match is None:
+        raise BackupError(f"Backup not found: {name}")
+    return BackupInfo(
+        path=path,
+        created=datetime.strptime(match["stamp"], _STAMP_FORMAT),
+        seq=int(match["seq"]),
+        size=path.stat().st_size
+    )
+
+
+def restore_backup(backup: BackupInfo, db: Optional[Database] = None) -> BackupReport:
+    """Replace a collection's contents with a backup.
+    
+    The backup is checked before anything is touched, and the current
+    contents are backed up first, so a restore can itself be undone. The
+    restored database is migrated to the current schema. Change log
+    sequence numbers keep increasing, so readers following the log see
+    the restore as one new change.
+    
+    Returns:
+        The report of the backup taken before restoring
+    
+    Raises:
+        BackupError: If the backup cannot be read or is corrupt
+    """
+    db = db or get_db()
+    restore_path = backups_dir(db) / f".{backup.path.name}.restore"
+    try:
+        try:
+            _decompress(backup, restore_path)
+        except (OSError, EOFError) as e:
+            raise BackupError(f"Cannot read {backup.path.name}: {e}") from e
+        
+        restored = sqlite3.connect(restore_path)
+        try:
+            try:
+                check = restored.execute("PRAGMA quick_check").fetchone()[0]
+            except sqlite3.DatabaseError as e:
+                check = str(e)
+            if check != "ok":
+                raise BackupError(f"{backup.path.name} is corrupt: {check}")
+            
+            safety = create_backup(db, force=True)
+            with db.get_connection() as conn:
+                seq = _oplog_seq(conn.cursor())
+                restored.backup(conn)
+        finally:
+            restored.close()
+    finally:
+        restore_path.unlink(missing_ok=True)
+    
+    # The backup may predate schema changes
+    db.init_db()
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'oplog'", (seq,))
+        if cursor.rowcount == 0:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('oplog', ?)", (seq,))
+        log_change(cursor, COLLECTION, "restore", [], backup=backup.path.name)
+        conn.commit()
+    publish_changes(db)
+    return safety
@@ -1,9 +1,593 @@
 """Database management for TextuAnki."""
+import functools
+import hashlib
+import json
+import re
 import sqlite3
+import threading
+import time
+import unicodedata
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Optional
 from contextlib import contextmanager
 
+from src.profiler import get_profiler
+
+# Seconds a connection waits on a locked database before raising
+BUSY_TIMEOUT = 5.0
+
+# Attempts and initial backoff (seconds) for writes that still hit a lock
+WRITE_RETRIES = 5
+RETRY_BACKOFF = 0.05
+
+# Tables whose rows are exchanged by sync, in dependency order
+SYNC_TABLES = ("decks", "note_types", "notes", "cards", "reviews", "study_sessions")
+
+# Tables whose deletions are recorded for sync. Deleting a deck, note or
+# card removes its cards, reviews and sessions through ON DELETE CASCADE
+# everywhere.
+SYNC_GRAVE_TABLES = ("decks", "note_types", "notes", "cards")
+
+# Current time in milliseconds since the epoch, as an SQL expression
+NOW_MS_SQL = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+
+def _migrate_initial_schema(cursor: sqlite3.Cursor) -> None:
+    """Create the original decks/cards/reviews/study_sessions schema."""
+    # Create decks table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS decks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Create cards table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            deck_id INTEGER NOT NULL,
+            front TEXT NOT NULL,
+            back TEXT NOT NULL,
+            tags TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (deck_id) REFERENCES decks (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create reviews table for spaced repetition
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL,
+            ease_factor REAL DEFAULT 2.5,
+            interval INTEGER DEFAULT 0,
+            repetitions INTEGER DEFAULT 0,
+            due_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_review TIMESTAMP,
+            FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create study_sessions table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS study_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL,
+            duration INTEGER,
+            reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+        )
+    """)
+    
+    # Create default deck if none exists
+    cursor.execute("SELECT COUNT(*) FROM decks")
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(
+            "INSERT INTO decks (name, description) VALUES (?, ?)",
+            ("Default", "Default deck for new cards")
+        )
+
+
+def _migrate_add_indexes(cursor: sqlite3.Cursor) -> None:
+    """Index the columns used by due-card and per-deck lookups."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_id ON cards (deck_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_card_id ON reviews (card_id, due_date, last_review)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_reviews_due_date ON reviews (due_date)")
+
+
+def _delete_orphans(cursor: sqlite3.Cursor) -> int:
+    """Delete cards, reviews and sessions whose parent row no longer exists.
+    
+    Returns:
+        Total number of rows removed
+    """
+    removed = 0
+    cursor.execute("DELETE FROM cards WHERE deck_id NOT IN (SELECT id FROM decks)")
+    removed += cursor.rowcount
+    cursor.execute("DELETE FROM reviews WHERE card_id NOT IN (SELECT id FROM cards)")
+    removed += cursor.rowcount
+    cursor.execute("DELETE FROM study_sessions WHERE card_id NOT IN (SELECT id FROM cards)")
+    removed += cursor.rowcount
+    if cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'study_daily'"
+    ).fetchone():
+        cursor.execute("DELETE FROM study_daily WHERE card_id NOT IN (SELECT id FROM cards)")
+        removed += cursor.rowcount
+    return removed
+
+
+def _migrate_remove_orphans(cursor: sqlite3.Cursor) -> None:
+    """Clean up rows left behind while foreign keys were not enforced."""
+    _delete_orphans(cursor)
+
+
+def _migrate_incremental_auto_vacuum(cursor: sqlite3.Cursor) -> None:
+    """Request incremental auto-vacuum so free pages can be reclaimed in steps.
+    
+    On a database that already has tables the setting only takes effect
+    after a full VACUUM, which a migration cannot run, so this is a no-op
+    for existing collections until a full ``textuanki maintain`` (without
+    --pages) converts them. New files get the mode from init_db.
+    """
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+
+def _migrate_study_rollups(cursor: sqlite3.Cursor) -> None:
+    """Add per-card daily rollups for archived study sessions."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS study_daily (
+            card_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            reviews INTEGER NOT NULL DEFAULT 0,
+            again INTEGER NOT NULL DEFAULT 0,
+            hard INTEGER NOT NULL DEFAULT 0,
+            good INTEGER NOT NULL DEFAULT 0,
+            easy INTEGER NOT NULL DEFAULT 0,
+            total_duration INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (card_id, day),
+            FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_study_daily_day ON study_daily (day)")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_study_sessions_reviewed_at ON study_sessions (reviewed_at)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_study_sessions_card_id ON study_sessions (card_id)"
+    )
+
+
+def _migrate_review_stats(cursor: sqlite3.Cursor) -> None:
+    """Add per-day, per-deck review aggregates and backfill them from history.
+    
+    Review.record_review keeps this table current, so statistics never
+    have to scan the raw study_sessions table.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_stats (
+            day TEXT NOT NULL,
+            deck_id INTEGER NOT NULL,
+            reviews INTEGER NOT NULL DEFAULT 0,
+            again INTEGER NOT NULL DEFAULT 0,
+            hard INTEGER NOT NULL DEFAULT 0,
+            good INTEGER NOT NULL DEFAULT 0,
+            easy INTEGER NOT NULL DEFAULT 0,
+            total_duration INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, deck_id),
+            FOREIGN KEY (deck_id) REFERENCES decks (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO review_stats
+            (day, deck_id, reviews, again, hard, good, easy, total_duration)
+        SELECT day, deck_id, SUM(reviews), SUM(again), SUM(hard), SUM(good), SUM(easy),
+               SUM(total_duration)
+        FROM (
+            SELECT substr(s.reviewed_at, 1, 10) AS day, c.deck_id, COUNT(*) AS reviews,
+                   SUM(s.rating <= 1) AS again, SUM(s.rating = 2) AS hard,
+                   SUM(s.rating = 3) AS good, SUM(s.rating >= 4) AS easy,
+                   COALESCE(SUM(s.duration), 0) AS total_duration
+            FROM study_sessions s JOIN cards c ON c.id = s.card_id
+            GROUP BY day, c.deck_id
+            UNION ALL
+            SELECT d.day, c.deck_id, SUM(d.reviews), SUM(d.again), SUM(d.hard),
+                   SUM(d.good), SUM(d.easy), SUM(d.total_duration)
+            FROM study_daily d JOIN cards c ON c.id = d.card_id
+            GROUP BY d.day, c.deck_id
+        )
+        GROUP BY day, deck_id
+    """)
+
+
+def _migrate_reveal_duration(cursor: sqlite3.Cursor) -> None:
+    """Record time-to-reveal alongside each study session's total duration."""
+    cursor.execute("ALTER TABLE study_sessions ADD COLUMN reveal_duration INTEGER")
+
+
+def _migrate_daily_limits(cursor: sqlite3.Cursor) -> None:
+    """Add per-deck daily limits and count new cards introduced per day."""
+    cursor.execute("ALTER TABLE decks ADD COLUMN new_per_day INTEGER NOT NULL DEFAULT 20")
+    cursor.execute("ALTER TABLE decks ADD COLUMN reviews_per_day INTEGER NOT NULL DEFAULT 200")
+    cursor.execute("ALTER TABLE review_stats ADD COLUMN new_cards INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_deck_hierarchy(cursor: sqlite3.Cursor) -> None:
+    """Add decks.parent_id and link existing ``Parent::Child`` decks to their parents.
+    
+    Missing parent decks are created, so every level of a name is a deck.
+    """
+    cursor.execute(
+        "ALTER TABLE decks ADD COLUMN parent_id INTEGER REFERENCES decks(id) ON DELETE CASCADE"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_decks_parent_id ON decks(parent_id)")
+    
+    cursor.execute("SELECT name FROM decks WHERE name LIKE '%::%'")
+    for (name,) in cursor.fetchall():
+        parts = name.split("::")
+        for depth in range(1, len(parts)):
+            cursor.execute("INSERT OR IGNORE INTO decks (name) VALUES (?)", ("::".join(parts[:depth]),))
+    
+    cursor.execute("SELECT name FROM decks WHERE name LIKE '%::%'")
+    for (name,) in cursor.fetchall():
+        cursor.execute(
+            "UPDATE decks SET parent_id = (SELECT id FROM decks WHERE name = ?) WHERE name = ?",
+            (name.rsplit("::", 1)[0], name)
+        )
+
+
+def _migrate_filtered_decks(cursor: sqlite3.Cursor) -> None:
+    """Add saved filtered-deck searches and a per-card lapse counter to filter on.
+    
+    Lapses (failed recalls of cards that had been learned) are backfilled
+    approximately from the logged history, where every rating below Good
+    counts as a failure.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS filtered_decks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            definition TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    cursor.execute("ALTER TABLE reviews ADD COLUMN lapses INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("""
+        UPDATE reviews SET lapses = (
+            SELECT COUNT(*) FROM study_sessions s
+            WHERE s.card_id = reviews.card_id AND s.rating < 3
+        ) + (
+            SELECT COALESCE(SUM(d.again + d.hard), 0) FROM study_daily d
+            WHERE d.card_id = reviews.card_id
+        )
+        WHERE last_review IS NOT NULL
+    """)
+    # Most cards never lapse, so a partial index stays small
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_reviews_lapses ON reviews (lapses) WHERE lapses > 0"
+    )
+
+
+def _add_sync_state(cursor: sqlite3.Cursor, table: str) -> None:
+    """Add the sync columns and change trigger described in _migrate_sync() to a table."""
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN guid TEXT")
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN usn INTEGER NOT NULL DEFAULT -1")
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN mtime INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_guid ON {table} (guid)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_usn ON {table} (usn)")
+    _create_sync_trigger(cursor, table)
+
+
+def _create_sync_trigger(cursor: sqlite3.Cursor, table: str) -> None:
+    """Mark rows as changed on any update that sets neither ``usn`` nor ``guid``."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_sync_changed AFTER UPDATE ON {table}
+        WHEN NEW.usn = OLD.usn AND NEW.guid IS OLD.guid
+        BEGIN
+            UPDATE {table} SET usn = -1, mtime = {NOW_MS_SQL} WHERE id = NEW.id;
+        END
+    """)
+
+
+def _record_sync_deletions(cursor: sqlite3.Cursor, table: str) -> None:
+    """Record deletions of a table's synced rows in ``sync_graves``."""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_sync_deleted AFTER DELETE ON {table}
+        WHEN OLD.guid IS NOT NULL
+        BEGIN
+            INSERT OR REPLACE INTO sync_graves (guid, table_name) VALUES (OLD.guid, '{table}');
+        END
+    """)
+
+
+def _migrate_sync(cursor: sqlite3.Cursor) -> None:
+    """Add the per-row state used by sync and record deletions.
+    
+    ``usn`` is -1 for rows changed since the last sync, otherwise the
+    server update sequence number the row was last synced at. ``mtime``
+    is the time of the last local change in epoch milliseconds and
+    resolves conflicts. ``guid`` identifies a row across collections and
+    is assigned on first sync, so rows that were never synced leave no
+    record when deleted.
+    
+    Triggers keep the state current, so no write path has to know about
+    sync: any update that sets neither ``usn`` nor ``guid`` marks the row
+    as changed. Sync writes always set one of them.
+    """
+    # Tables created later add their own sync state
+    for table in ("decks", "cards", "reviews", "study_sessions"):
+        _add_sync_state(cursor, table)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_graves (
+            guid TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            usn INTEGER NOT NULL DEFAULT -1
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sync_graves_usn ON sync_graves (usn)")
+    for table in ("decks", "cards"):
+        _record_sync_deletions(cursor, table)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sync_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+def _migrate_oplog(cursor: sqlite3.Cursor) -> None:
+    """Add the append-only log of model changes (see src/database/oplog.py).
+    
+    AUTOINCREMENT keeps sequence numbers from being reused after old
+    entries are pruned, so a reader's cursor stays valid.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS oplog (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            entity TEXT NOT NULL,
+            op TEXT NOT NULL,
+            ids TEXT,
+            count INTEGER NOT NULL DEFAULT 0,
+            data TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+
+def _migrate_media(cursor: sqlite3.Cursor) -> None:
+    """Add media files and the links from cards to the files they reference.
+    
+    Triggers keep each file's reference count equal to its number of
+    links, and links are deleted with their card by ON DELETE CASCADE, so
+    every way of deleting cards releases their media. Links may name
+    files that are not in the store, which media checks report as missing.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS media (
+            name TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS card_media (
+            card_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (card_id, name),
+            FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_card_media_name ON card_media (name)")
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS card_media_linked AFTER INSERT ON card_media
+        BEGIN
+            UPDATE media SET refcount = refcount + 1 WHERE name = NEW.name;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS card_media_unlinked AFTER DELETE ON card_media
+        BEGIN
+            UPDATE media SET refcount = refcount - 1 WHERE name = OLD.name;
+        END
+    """)
+
+
+def _migrate_notes(cursor: sqlite3.Cursor) -> None:
+    """Add notes, their note types, and the link from cards to the note they show.
+    
+    A note type lists field names and card templates (see
+    src/models/note.py). Cards of a note store empty front and back text
+    and ``ordinal``, the template index, or the cloze number for cloze
+    note types. Cards without a note keep their own text as before.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS note_types (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL DEFAULT 'standard',
+            fields TEXT NOT NULL,
+            templates TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            note_type_id INTEGER NOT NULL,
+            fields TEXT NOT NULL,
+            tags TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (note_type_id) REFERENCES note_types (id) ON DELETE CASCADE
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_note_type ON notes (note_type_id)")
+    
+    cursor.execute("ALTER TABLE cards ADD COLUMN note_id INTEGER REFERENCES notes (id) ON DELETE CASCADE")
+    cursor.execute("ALTER TABLE cards ADD COLUMN ordinal INTEGER NOT NULL DEFAULT 0")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_cards_note ON cards (note_id, ordinal) "
+        "WHERE note_id IS NOT NULL"
+    )
+    
+    for table in ("note_types", "notes"):
+        _add_sync_state(cursor, table)
+        _record_sync_deletions(cursor, table)
+    
+    cursor.executemany(
+        "INSERT OR IGNORE INTO note_types (name, kind, fields, templates) VALUES (?, ?, ?, ?)",
+        [
+            ("Basic", "standard", json.dumps(["Front", "Back"]), json.dumps([
+                {"name": "Card 1", "front": "{{Front}}", "back": "{{Back}}"},
+            ])),
+            ("Basic (and reversed card)", "standard", json.dumps(["Front", "Back"]), json.dumps([
+                {"name": "Card 1", "front": "{{Front}}", "back": "{{Back}}"},
+                {"name": "Card 2", "front": "{{Back}}", "back": "{{Front}}"},
+            ])),
+            ("Cloze", "cloze", json.dumps(["Text", "Extra"]), json.dumps([
+                {"name": "Cloze", "front": "{{cloze:Text}}", "back": "{{Extra}}"},
+            ])),
+        ]
+    )
+
+
+# Card front hashing and note rendering as of migration 15, frozen here so
+# the migration computes the same hashes whatever later becomes of
+# src/models/duplicates.py and src/models/note.py, which it must match
+_V15_WHITESPACE = re.compile(r"\s+")
+_V15_CLOZE = re.compile(r"\{\{c(\d+)::(.*?)(?:::(.*?))?\}\}", re.DOTALL)
+_V15_SECTION = re.compile(r"\{\{([#^])\s*([^}]+?)\s*\}\}(.*?)\{\{/\s*\2\s*\}\}", re.DOTALL)
+_V15_FIELD = re.compile(r"\{\{\s*(?:(cloze):)?\s*([^#^/}][^}]*?)\s*\}\}")
+
+
+def _v15_content_hash(front: str) -> int:
+    """Signed 64-bit hash of a card front, normalized for case, Unicode form and spacing."""
+    normalized = _V15_WHITESPACE.sub(" ", unicodedata.normalize("NFKC", front or "")).strip().casefold()
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def _v15_render_front(kind: str, field_names: list, templates: list, fields: list, ordinal: int) -> str:
+    """Question text of one card of a note."""
+    values = dict(zip(field_names, fields))
+    if kind == "cloze":
+        template, number = templates[0]["front"], ordinal
+    elif 0 <= ordinal < len(templates):
+        template, number = templates[ordinal]["front"], None
+    else:
+        return ""
+    
+    def section(match: re.Match) -> str:
+        kind, name, body = match.groups()
+        return body if bool(values.get(name, "").strip()) == (kind == "#") else ""
+    
+    previous = None
+    while previous != template:
+        previous, template = template, _V15_SECTION.sub(section, template)
+    
+    def keep_cloze(text: str) -> str:
+        if number is None or "{{c" not in text:
+            return text
+        return _V15_CLOZE.sub(lambda match: match.group(0) if int(match.group(1)) == number else match.group(2), text)
+    
+    def field(match: re.Match) -> str:
+        modifier, name = match.groups()
+        if name == "FrontSide":
+            return ""
+        value = values.get(name, "")
+        return keep_cloze(value) if modifier == "cloze" else value
+    return _V15_FIELD.sub(field, template)
+
+
+def _migrate_content_hash(cursor: sqlite3.Cursor) -> None:
+    """Add a hash of each card's normalized front, indexed per deck, for duplicate checks.
+    
+    See src/models/duplicates.py. Every collection computes the same
+    hashes, so the backfill runs with the sync trigger dropped rather than
+    marking every card as changed.
+    """
+    cursor.execute("ALTER TABLE cards ADD COLUMN content_hash INTEGER")
+    cursor.execute("DROP TRIGGER IF EXISTS cards_sync_changed")
+    cursor.connection.create_function("content_hash", 1, _v15_content_hash, deterministic=True)
+    cursor.execute("UPDATE cards SET content_hash = content_hash(front) WHERE note_id IS NULL")
+    
+    cursor.execute(
+        """SELECT c.id, c.ordinal, n.fields, t.kind, t.fields, t.templates FROM cards c
+           JOIN notes n ON n.id = c.note_id JOIN note_types t ON t.id = n.note_type_id"""
+    )
+    cursor.executemany(
+        "UPDATE cards SET content_hash = ? WHERE id = ?",
+        [
+            (_v15_content_hash(_v15_render_front(
+                kind, json.loads(field_names), json.loads(templates), json.loads(fields), ordinal
+            )), card_id)
+            for card_id, ordinal, fields, kind, field_names, templates in cursor.fetchall()
+        ]
+    )
+    _create_sync_trigger(cursor, "cards")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cards_deck_hash ON cards (deck_id, content_hash)")
+
+
+# Ordered schema migrations. PRAGMA user_version stores how many have been
+# applied, so opening an up-to-date database never runs any DDL.
+MIGRATIONS = [
+    _migrate_initial_schema,
+    _migrate_add_indexes,
+    _migrate_remove_orphans,
+    _migrate_incremental_auto_vacuum,
+    _migrate_study_rollups,
+    _migrate_review_stats,
+    _migrate_reveal_duration,
+    _migrate_daily_limits,
+    _migrate_deck_hierarchy,
+    _migrate_filtered_decks,
+    _migrate_sync,
+    _migrate_oplog,
+    _migrate_media,
+    _migrate_notes,
+    _migrate_content_hash,
+]
+
+# PRAGMA auto_vacuum value for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _is_lock_error(error: sqlite3.OperationalError) -> bool:
+    """Whether an OperationalError is a transient lock/busy condition."""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+def retry_on_locked(func: Callable) -> Callable:
+    """Retry a write operation with exponential backoff while the database is locked.
+    
+    The wrapped function must be safe to re-run from the start, i.e. it
+    should open its own connection and commit in a single transaction.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(WRITE_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _is_lock_error(e) or attempt == WRITE_RETRIES - 1:
+                    raise
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+    return wrapper
+
 
 class Database:
     """SQLite database manager for TextuAnki."""
@@ -15,96 +599,126 @@ class Database:
             db_path: Path to database file. Defaults to ~/.textuanki/cards.db
         """
         if db_path is None:
-            db_path = Path.home() / ".textuanki" / "cards.db"
+            db_path = default_db_path()
         
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         self.init_db()
     
     @contextmanager
-    def get_connection(self):
-        """Context manager for database connections."""
-        conn = sqlite3.connect(self.db_path)
+    def get_connection(self, read_only: bool = False):
+        """Context manager for database connections.
+        
+        Write connections start their implicit transactions with BEGIN
+        IMMEDIATE, so lock contention is handled by the busy timeout up
+        front instead of failing when a read lock is upgraded mid-transaction.
+        
+        Args:
+            read_only: Open a ``mode=ro`` connection holding a single read
+                snapshot for its whole lifetime. With WAL, such readers never
+                block writers and are never blocked by them.
+        """
+        start = time.perf_counter()
+        if read_only:
+            conn = sqlite3.connect(
+                f"{self.db_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                timeout=BUSY_TIMEOUT
+            )
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level="IMMEDIATE")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA foreign_keys = ON")
         conn.row_factory = sqlite3.Row
         try:
+            if read_only:
+                conn.execute("BEGIN")
             yield conn
         finally:
             conn.close()
+            get_profiler().add_db_time(time.perf_counter() - start)
     
     def init_db(self):
-        """Initialize database schema."""
+        """Initialize or migrate the database schema.
+        
+        Only pending migrations are applied, and they are committed
+        together. Under sqlite3's legacy transaction handling DDL statements
+        commit on their own until the first data change opens a
+        transaction, so an interrupted upgrade may leave schema changes of
+        the pending migrations behind without bumping user_version.
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            # Create decks table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS decks (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL UNIQUE,
-                    description TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create cards table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS cards (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    deck_id INTEGER NOT NULL,
-                    front TEXT NOT NULL,
-                    back TEXT NOT NULL,
-                    tags TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (deck_id) REFERENCES decks (id) ON DELETE CASCADE
-                )
-            """)
+            # Takes effect on a new, empty file only, so it comes first.
+            # Older collections are converted by a full `textuanki maintain`.
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
             
-            # Create reviews table for spaced repetition
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS reviews (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    card_id INTEGER NOT NULL,
-                    ease_factor REAL DEFAULT 2.5,
-                    interval INTEGER DEFAULT 0,
-                    repetitions INTEGER DEFAULT 0,
-                    due_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_review TIMESTAMP,
-                    FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
-                )
-            """)
+            # WAL lets snapshot readers run alongside the study session's writes.
+            # The mode is persistent, so this is a no-op once set.
+            cursor.execute("PRAGMA journal_mode = WAL")
             
-            # Create study_sessions table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS study_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    card_id INTEGER NOT NULL,
-                    rating INTEGER NOT NULL,
-                    duration INTEGER,
-                    reviewed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (card_id) REFERENCES cards (id) ON DELETE CASCADE
-                )
-            """)
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
             
-            # Create default deck if none exists
-            cursor.execute("SELECT COUNT(*) FROM decks")
-            if cursor.fetchone()[0] == 0:
-                cursor.execute(
-                    "INSERT INTO decks (name, description) VALUES (?, ?)",
-                    ("Default", "Default deck for new cards")
-                )
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                migration(cursor)
+                cursor.execute(f"PRAGMA user_version = {number}")
             
             conn.commit()
+    
+    @retry_on_locked
+    def cleanup_orphans(self) -> int:
+        """Remove orphaned cards, reviews and study sessions.
+        
+        Returns:
+            Number of rows removed
+        """
+        with self.get_connection() as conn:
+            removed = _delete_orphans(conn.cursor())
+            conn.commit()
+        return removed
+
+
+def default_db_path() -> Path:
+    """The collection used when no profile or path is given."""
+    return Path.home() / ".textuanki" / "cards.db"
+
+
+# Open databases, one per file, and the one the models currently use
+_databases: Dict[Path, Database] = {}
+_active_db: Optional[Database] = None
+_databases_lock = threading.Lock()
+
+
+def open_db(db_path: Optional[Path] = None) -> Database:
+    """Get the Database for a file, opening and migrating it on first use.
+    
+    Instances are shared per file, so several collections can be open at
+    once and switching back to one does not re-run its startup checks.
+    
+    Args:
+        db_path: Path to database file. Defaults to ~/.textuanki/cards.db
+    """
+    path = Path(db_path or default_db_path()).expanduser().resolve()
+    with _databases_lock:
+        db = _databases.get(path)
+        if db is None:
+            db = _databases[path] = Database(path)
+        return db
 
 
-# Global database instance
-_db_instance: Optional[Database] = None
+def use_db(db: Database) -> Database:
+    """Make a database the one returned by get_db(), e.g. to switch profiles."""
+    global _active_db
+    _active_db = db
+    return db
 
 
 def get_db() -> Database:
-    """Get or create the global database instance."""
-    global _db_instance
-    if _db_instance is None:
-        _db_instance = Database()
-    return _db_instance
+    """Get the active database, opening the default collection if none is active."""
+    global _active_db
+    if _active_db is None:
+        _active_db = open_db()
+    return _active_db
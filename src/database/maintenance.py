@@ -0,0 +1,116 @@
+"""Routine database maintenance: statistics, incremental vacuum and integrity checks."""
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.database.db import AUTO_VACUUM_INCREMENTAL, Database, get_db, retry_on_locked
+
+
+@dataclass
+class MaintenanceReport:
+    """Outcome of a maintenance run."""
+    duration: float = 0.0
+    size_before: int = 0
+    size_after: int = 0
+    free_pages_before: int = 0
+    free_pages_after: int = 0
+    orphans_removed: int = 0
+    integrity_errors: List[str] = field(default_factory=list)
+    integrity_checked: bool = False
+    
+    @property
+    def reclaimed_bytes(self) -> int:
+        """Bytes returned to the filesystem by this run."""
+        return max(0, self.size_before - self.size_after)
+    
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        if not self.integrity_checked:
+            integrity = "integrity not checked"
+        elif self.integrity_errors:
+            integrity = f"{len(self.integrity_errors)} integrity error(s)"
+        else:
+            integrity = "integrity ok"
+        return (
+            f"Reclaimed {self.reclaimed_bytes / 1024:.1f} KiB "
+            f"({self.free_pages_before - self.free_pages_after} pages), "
+            f"removed {self.orphans_removed} orphan rows, {integrity}, "
+            f"took {self.duration * 1000:.0f} ms"
+        )
+
+
+def _database_size(db: Database) -> int:
+    """Size of the database file plus its write-ahead log."""
+    size = 0
+    for suffix in ("", "-wal"):
+        path = db.db_path.with_name(db.db_path.name + suffix)
+        if path.exists():
+            size += path.stat().st_size
+    return size
+
+
+@retry_on_locked
+def run_maintenance(
+    db: Optional[Database] = None,
+    vacuum_pages: Optional[int] = None,
+    full_analyze: bool = False,
+    check_integrity: bool = True,
+) -> MaintenanceReport:
+    """Refresh planner statistics, reclaim free pages and verify the database.
+    
+    Safe to call from a worker thread: it uses its own connection and only
+    holds the write lock for the duration of each pragma.
+    
+    Args:
+        db: Database to maintain. Defaults to the global instance.
+        vacuum_pages: Maximum free pages to reclaim, at least 1. None reclaims
+            all of them, and first switches a collection created before
+            incremental vacuuming to it with a full VACUUM, which rewrites
+            the file.
+        full_analyze: Run a full ANALYZE instead of PRAGMA optimize
+        check_integrity: Run PRAGMA integrity_check after vacuuming
+    
+    Raises:
+        ValueError: If vacuum_pages is below 1
+    """
+    if vacuum_pages is not None and vacuum_pages < 1:
+        # PRAGMA incremental_vacuum(0) would reclaim every free page
+        raise ValueError(f"vacuum_pages must be at least 1, got {vacuum_pages}")
+    db = db or get_db()
+    report = MaintenanceReport(size_before=_database_size(db))
+    start = time.perf_counter()
+    
+    report.orphans_removed = db.cleanup_orphans()
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        report.free_pages_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        
+        if full_analyze:
+            cursor.execute("ANALYZE")
+        else:
+            cursor.execute("PRAGMA optimize")
+        
+        conn.commit()
+        
+        if vacuum_pages is None and cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != AUTO_VACUUM_INCREMENTAL:
+            # Changing auto_vacuum on a database with tables needs a full VACUUM
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
+        
+        # executescript steps the pragma to completion; execute() would free a single page
+        conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages or 0)});")
+        
+        # Fold the WAL back into the main file so the freed pages are truncated
+        cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        
+        if check_integrity:
+            results = [row[0] for row in cursor.execute("PRAGMA integrity_check").fetchall()]
+            report.integrity_errors = [result for result in results if result != "ok"]
+            report.integrity_checked = True
+        
+        report.free_pages_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+    
+    report.size_after = _database_size(db)
+    report.duration = time.perf_counter() - start
+    return report
@@ -0,0 +1,210 @@
+"""Change-data feed: an append-only log of model mutations.
+
+Every model write records a structured change in the ``oplog`` table, in
+the same transaction as the write, so the log never disagrees with the
+data. Readers follow it with a cursor (``changes_since(seq)``), which
+also sees writes made by other processes such as the CLI or a sync. A
+ChangeBus per database delivers new changes to in-process subscribers
+after each write.
+"""
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.database.db import Database, get_db
+
+# Entities that changes are recorded for
+CARD = "card"
+NOTE = "note"
+DECK = "deck"
+REVIEW = "review"
+FILTERED_DECK = "filtered_deck"
+COLLECTION = "collection"
+
+# Changes touching more rows than this record only the count; readers
+# should re-query rather than update row by row
+MAX_LOGGED_IDS = 1000
+
+
+@dataclass(frozen=True)
+class Change:
+    """One recorded mutation.
+    
+    Attributes:
+        seq: Position in the log, increasing and never reused
+        entity: CARD, NOTE, DECK, REVIEW, FILTERED_DECK or COLLECTION
+        op: What happened, e.g. "create", "update", "delete", "move" or "answer"
+        ids: Ids of the affected rows (card ids for reviews); empty when
+            more than MAX_LOGGED_IDS rows were affected
+        count: Number of affected rows
+        data: Operation details, e.g. the target deck of a move
+        created_at: When the change was recorded
+    """
+    seq: int
+    entity: str
+    op: str
+    ids: Tuple[int, ...]
+    count: int
+    data: Dict[str, Any] = field(default_factory=dict)
+    created_at: Optional[datetime] = None
+    
+    @classmethod
+    def _from_row(cls, row) -> "Change":
+        """Build a change from an ``oplog`` row."""
+        return cls(
+            seq=row["seq"],
+            entity=row["entity"],
+            op=row["op"],
+            ids=tuple(json.loads(row["ids"])) if row["ids"] else (),
+            count=row["count"],
+            data=json.loads(row["data"]) if row["data"] else {},
+            created_at=datetime.fromisoformat(row["created_at"])
+        )
+
+
+def log_change(cursor: sqlite3.Cursor, entity: str, op: str, ids: Iterable[int], **data: Any) -> None:
+    """Record a change as part of the caller's write transaction.
+    
+    Args:
+        cursor: Cursor of the transaction making the change
+        entity: Kind of row changed
+        op: What happened
+        ids: Ids of the affected rows
+        data: JSON-serializable operation details
+    """
+    ids = list(ids)
+    cursor.execute(
+        "INSERT INTO oplog (entity, op, ids, count, data) VALUES (?, ?, ?, ?, ?)",
+        (entity, op, json.dumps(ids) if len(ids) <= MAX_LOGGED_IDS else None,
+         len(ids), json.dumps(data) if data else None)
+    )
+
+
+def changes_since(seq: int = 0, limit: Optional[int] = None, db: Optional[Database] = None) -> List[Change]:
+    """Changes recorded after ``seq``, oldest first.
+    
+    Pass the seq of the last change seen to get only newer ones. Entries
+    older than the retention period may have been pruned, so a reader
+    that falls far behind should check the first seq and re-query
+    everything if there is a gap.
+    
+    Args:
+        seq: Return changes with a greater seq
+        limit: Maximum number of changes
+        db: Database to read. Defaults to the global instance.
+    """
+    db = db or get_db()
+    with db.get_connection(read_only=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM oplog WHERE seq > ? ORDER BY seq LIMIT ?",
+            (seq, -1 if limit is None else limit)
+        )
+        return [Change._from_row(row) for row in cursor.fetchall()]
+
+
+def last_seq(db: Optional[Database] = None) -> int:
+    """Seq of the most recent change, 0 if none was recorded.
+    
+    Comparing it with a remembered value is the cheapest way to tell
+    whether anything changed. Pruned changes still count, so it never
+    goes back.
+    """
+    db = db or get_db()
+    with db.get_connection(read_only=True) as conn:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'oplog'").fetchone()
+        return row[0] if row else 0
+
+
+def prune_changes(cursor: sqlite3.Cursor, keep_days: int) -> int:
+    """Delete log entries older than ``keep_days`` in the caller's write transaction.
+    
+    Returns:
+        Number of entries removed
+    """
+    cursor.execute(
+        "DELETE FROM oplog WHERE created_at < datetime('now', ?)", (f"-{int(keep_days)} days",)
+    )
+    return cursor.rowcount
+
+
+class ChangeBus:
+    """Delivers recorded changes to in-process subscribers.
+    
+    Writers call publish() after committing. Subscribers are called on
+    the publishing thread with each change, in order, including changes
+    other processes made in the meantime. Nothing is read while there
+    are no subscribers.
+    """
+    
+    def __init__(self, db: Database):
+        self.db = db
+        self._lock = threading.Lock()
+        self._subscribers: List[Tuple[Callable[[Change], None], Optional[frozenset]]] = []
+        self._seq = 0
+    
+    def subscribe(
+        self,
+        callback: Callable[[Change], None],
+        entities: Optional[Iterable[str]] = None,
+    ) -> Callable[[], None]:
+        """Call ``callback`` with every change published from now on.
+        
+        Args:
+            callback: Called with each Change
+            entities: Only deliver changes to these entities
+        
+        Returns:
+            A function that cancels the subscription
+        """
+        subscriber = (callback, frozenset(entities) if entities is not None else None)
+        with self._lock:
+            if not self._subscribers:
+                self._seq = last_seq(self.db)
+            self._subscribers.append(subscriber)
+        
+        def unsubscribe() -> None:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+        return unsubscribe
+    
+    def publish(self) -> List[Change]:
+        """Deliver the changes recorded since the last publish."""
+        with self._lock:
+            if not self._subscribers:
+                return []
+            changes = changes_since(self._seq, db=self.db)
+            if changes:
+                self._seq = changes[-1].seq
+            subscribers = list(self._subscribers)
+        
+        for change in changes:
+            for callback, entities in subscribers:
+                if entities is None or change.entity in entities:
+                    callback(change)
+        return changes
+
+
+# One bus per database file
+_buses: Dict[Path, ChangeBus] = {}
+_buses_lock = threading.Lock()
+
+
+def get_bus(db: Optional[Database] = None) -> ChangeBus:
+    """Get the change bus of a database. Defaults to the global instance."""
+    db = db or get_db()
+    with _buses_lock:
+        bus = _buses.get(db.db_path)
+        if bus is None:
+            bus = _buses[db.db_path] = ChangeBus(db)
+        return bus
+
+
+def publish_changes(db: Optional[Database] = None) -> None:
+    """Deliver recorded changes to the subscribers of a database's bus."""
+    get_bus(db).publish()
@@ -0,0 +1,139 @@
+"""Profiles: named collections, each stored in its own database file.
+
+The registry lives in ``~/.textuanki/profiles.json`` and maps profile
+names to database paths. The "default" profile is the original
+``~/.textuanki/cards.db`` collection, so existing installs keep working.
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.database.db import Database, default_db_path, open_db, use_db
+
+DEFAULT_PROFILE = "default"
+
+# Profile names become file names
+_VALID_NAME = re.compile(r"^[\w.-]+$")
+
+
+def registry_path() -> Path:
+    """Location of the profile registry."""
+    return Path.home() / ".textuanki" / "profiles.json"
+
+
+def collections_dir() -> Path:
+    """Directory holding the database files of new profiles."""
+    return Path.home() / ".textuanki" / "collections"
+
+
+@dataclass
+class Profile:
+    """A named collection."""
+    name: str
+    path: Path
+
+
+class ProfileRegistry:
+    """Profile names, their database files and the profile opened by default."""
+    
+    def __init__(self, path: Optional[Path] = None):
+        """Load the registry, or start one with only the default profile.
+        
+        Args:
+            path: Registry file. Defaults to ~/.textuanki/profiles.json
+        """
+        self.path = path or registry_path()
+        self.current = DEFAULT_PROFILE
+        self._paths: Dict[str, Path] = {DEFAULT_PROFILE: default_db_path()}
+        
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.current = data.get("current", DEFAULT_PROFILE)
+            self._paths.update(
+                (name, Path(path)) for name, path in data.get("profiles", {}).items()
+            )
+    
+    def save(self) -> None:
+        """Write the registry atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_suffix(".tmp")
+        temp_path.write_text(
+            json.dumps({
+                "current": self.current,
+                "profiles": {name: str(path) for name, path in self._paths.items()},
+            }, indent=2),
+            encoding="utf-8"
+        )
+        os.replace(temp_path, self.path)
+    
+    def profiles(self) -> List[Profile]:
+        """All profiles, sorted by name."""
+        return [Profile(name, self._paths[name]) for name in sorted(self._paths)]
+    
+    def get(self, name: str) -> Optional[Profile]:
+        """Look up a profile by name."""
+        path = self._paths.get(name)
+        return Profile(name, path) if path is not None else None
+    
+    def add(self, name: str, path: Optional[Path] = None) -> Profile:
+        """Register a profile and save the registry.
+        
+        Args:
+            name: Profile name (letters, digits, ``_``, ``.`` and ``-``)
+            path: Database file. Defaults to ~/.textuanki/collections/<name>.db
+        
+        Raises:
+            ValueError: If the name is invalid or already taken
+        """
+        if not _VALID_NAME.match(name):
+            raise ValueError(f"Invalid profile name: {name!r}")
+        if name in self._paths:
+            raise ValueError(f"Profile already exists: {name}")
+        
+        self._paths[name] = Path(path or collections_dir() / f"{name}.db").expanduser().resolve()
+        self.save()
+        return Profile(name, self._paths[name])
+    
+    def remove(self, name: str) -> None:
+        """Unregister a profile and save the registry. Its database file is kept.
+        
+        Raises:
+            ValueError: If the profile does not exist or is the default profile
+        """
+        if name == DEFAULT_PROFILE:
+            raise ValueError("The default profile cannot be removed")
+        if name not in self._paths:
+            raise ValueError(f"Unknown profile: {name}")
+        
+        del self._paths[name]
+        if self.current == name:
+            self.current = DEFAULT_PROFILE
+        self.save()
+    
+    def set_current(self, name: str) -> None:
+        """Make a profile the one opened by default and save the registry."""
+        if name not in self._paths:
+            raise ValueError(f"Unknown profile: {name}")
+        self.current = name
+        self.save()
+
+
+def activate_profile(name: Optional[str] = None, registry: Optional[ProfileRegistry] = None) -> Database:
+    """Open a profile's database and make it the active one.
+    
+    Args:
+        name: Profile to open. Defaults to the registry's current profile.
+        registry: Registry to look the name up in
+    
+    Raises:
+        ValueError: If the profile does not exist
+    """
+    registry = registry or ProfileRegistry()
+    name = name or registry.current
+    profile = registry.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown profile: {name}")
+    return use_db(open_db(profile.path))
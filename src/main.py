@@ -1,18 +1,185 @@
-"""Entry point for TextuAnki application."""
+"""Entry point for TextuAnki application.
+
+Only the standard library is imported at module level so that headless
+subcommands never pay for importing Textual or the screens.
+"""
+import argparse
 import sys
+import time
 from pathlib import Path
 
+# Process start reference used for time-to-first-paint measurements
+STARTED_AT = time.perf_counter()
+
 # Add src directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.app import TextuAnkiApp
 
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command line parser."""
+    parser = argparse.ArgumentParser(
+        prog="textuanki",
+        description="Smart flashcards for your terminal. Runs the TUI when no command is given."
+    )
+    parser.add_argument(
+        "--timing", action="store_true",
+        help="Print startup timing (time-to-first-paint for the TUI) to stderr"
+    )
+    collection = parser.add_mutually_exclusive_group()
+    collection.add_argument("--profile", help="Open this profile instead of the default one")
+    collection.add_argument("--db", type=Path, help="Open this database file directly")
+    
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    
+    stats_parser = subparsers.add_parser("stats", help="Show per-deck card, due and new counts")
+    stats_parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    
+    due_parser = subparsers.add_parser("due", help="Print the number of cards due now")
+    due_parser.add_argument("--deck", help="Only count cards in this deck")
+    due_parser.add_argument("--json", action="store_true", help="Print JSON instead of a bare number")
+    
+    import_parser = subparsers.add_parser("import", help="Import cards from a TSV or CSV file")
+    import_parser.add_argument("path", type=Path, help="File with front, back[, tags] columns")
+    import_parser.add_argument("--deck", default="Default", help="Target deck name (created if missing)")
+    import_parser.add_argument(
+        "--allow-duplicates", action="store_true", help="Also import cards whose front is already in the deck"
+    )
+    
+    export_parser = subparsers.add_parser("export", help="Export a deck to an Anki .apkg package")
+    export_parser.add_argument("deck", help="Name of the deck to export")
+    export_parser.add_argument("output", type=Path, help="Output .apkg path")
+    
+    dedupe_parser = subparsers.add_parser("dedupe", help="Find near-duplicate cards")
+    dedupe_parser.add_argument("--deck", help="Only search this deck")
+    dedupe_parser.add_argument(
+        "--threshold", type=float, default=0.8,
+        help="Minimum similarity (0-1) of the cards' text (default: 0.8)"
+    )
+    dedupe_parser.add_argument("--limit", type=int, default=50, help="Groups to print (default: 50)")
+    dedupe_parser.add_argument("--json", action="store_true", help="Print the groups as JSON")
+    
+    maintain_parser = subparsers.add_parser(
+        "maintain", help="Optimize statistics, reclaim free pages and check integrity"
+    )
+    maintain_parser.add_argument("--pages", type=int, help="Reclaim at most this many free pages")
+    maintain_parser.add_argument("--full", action="store_true", help="Run a full ANALYZE")
+    maintain_parser.add_argument("--skip-integrity", action="store_true", help="Skip the integrity check")
+    
+    archive_parser = subparsers.add_parser(
+        "archive", help="Compact old study sessions into per-card daily rollups"
+    )
+    archive_parser.add_argument(
+        "--keep-days", type=int, default=90, help="Keep raw sessions newer than this (default: 90)"
+    )
+    archive_parser.add_argument(
+        "--archive", type=Path, help="Also append the raw rows to this gzip JSON-lines file"
+    )
+    
+    backup_parser = subparsers.add_parser("backup", help="Take a compressed backup of the collection")
+    backup_parser.add_argument("--force", action="store_true", help="Back up even if nothing changed")
+    backup_parser.add_argument(
+        "--compression", choices=("gzip", "zstd"), help="Default: zstd if installed, gzip otherwise"
+    )
+    backup_parser.add_argument("--list", action="store_true", help="List backups instead")
+    
+    restore_parser = subparsers.add_parser(
+        "restore", help="Replace the collection with a backup (the current state is backed up first)"
+    )
+    restore_parser.add_argument(
+        "backup", nargs="?", help="Backup file name (see backup --list) or path (default: the newest)"
+    )
+    
+    media_parser = subparsers.add_parser("media", help="Manage images and audio used by cards")
+    media_actions = media_parser.add_subparsers(dest="action", metavar="ACTION", required=True)
+    media_add_parser = media_actions.add_parser("add", help="Store files and print the markup to use on cards")
+    media_add_parser.add_argument("files", type=Path, nargs="+", help="Image or audio files")
+    media_actions.add_parser("check", help="Rebuild card references and report missing files")
+    media_actions.add_parser("gc", help="Delete media files no card uses")
+    
+    profiles_parser = subparsers.add_parser("profiles", help="Manage profiles (separate collections)")
+    profiles_actions = profiles_parser.add_subparsers(dest="action", metavar="ACTION")
+    profiles_actions.add_parser("list", help="List profiles; * marks the default")
+    add_parser = profiles_actions.add_parser("add", help="Create a profile")
+    add_parser.add_argument("name", help="Profile name")
+    add_parser.add_argument("--path", type=Path, help="Database file (default: ~/.textuanki/collections/NAME.db)")
+    remove_parser = profiles_actions.add_parser("remove", help="Forget a profile, keeping its file")
+    remove_parser.add_argument("name", help="Profile name")
+    use_parser = profiles_actions.add_parser("use", help="Open this profile by default")
+    use_parser.add_argument("name", help="Profile name")
+    
+    sync_parser = subparsers.add_parser("sync", help="Exchange changes with a sync server")
+    sync_parser.add_argument(
+        "url", nargs="?", help="Server URL, e.g. http://127.0.0.1:27701 (default: the last one used)"
+    )
+    sync_parser.add_argument("--token", help="Shared secret the server was started with")
+    
+    server_parser = subparsers.add_parser("sync-server", help="Serve this collection to sync clients")
+    server_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    server_parser.add_argument("--port", type=int, default=27701, help="Port to listen on (default: 27701)")
+    server_parser.add_argument("--token", help="Only accept clients sending this shared secret")
+    
+    changes_parser = subparsers.add_parser("changes", help="Print the log of changes to the collection")
+    changes_parser.add_argument("--since", type=int, default=0, help="Only changes after this sequence number")
+    changes_parser.add_argument("--limit", type=int, help="Print at most this many changes")
+    changes_parser.add_argument("--json", action="store_true", help="Print JSON lines instead of text")
+    
+    return parser
+
+
+def open_collection(args: argparse.Namespace) -> str:
+    """Activate the database chosen with --db or --profile.
+    
+    Returns:
+        A label for the open collection
+    
+    Raises:
+        ValueError: If the profile does not exist
+    """
+    from src.database.db import open_db, use_db
+    from src.database.profiles import ProfileRegistry, activate_profile
+    
+    if args.db is not None:
+        use_db(open_db(args.db))
+        return str(args.db)
+    
+    registry = ProfileRegistry()
+    activate_profile(args.profile, registry)
+    return args.profile or registry.current
 
-def main():
-    """Run the TextuAnki application."""
-    app = TextuAnkiApp()
+
+def run_tui(args: argparse.Namespace) -> int:
+    """Import and run the Textual application."""
+    from src.app import TextuAnkiApp
+    
+    app = TextuAnkiApp(started_at=STARTED_AT, profile=args.collection)
     app.run()
+    
+    if args.timing and app.first_paint_time is not None:
+        print(f"Time to first paint: {app.first_paint_time * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    """Run the TextuAnki application or one of its headless commands."""
+    args = build_parser().parse_args(argv)
+    
+    if args.command != "profiles":
+        try:
+            args.collection = open_collection(args)
+        except ValueError as e:
+            print(f"{e} (see 'textuanki profiles list')", file=sys.stderr)
+            return 1
+    
+    if args.command is None:
+        return run_tui(args)
+    
+    from src import cli
+    
+    status = cli.COMMANDS[args.command](args)
+    if args.timing:
+        print(f"Completed in {(time.perf_counter() - STARTED_AT) * 1000:.1f} ms", file=sys.stderr)
+    return status
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,13 +1,52 @@
 """Card model for TextuAnki."""
-from dataclasses import dataclass
-from datetime import datetime
-from typing import Optional, List
-from src.database.db import get_db
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Optional, List, Iterable, Tuple
+from src.database.db import SYNC_TABLES, Database, get_db, retry_on_locked
+from src.database.oplog import CARD, log_change, publish_changes
+from src.models.deck import SUBTREE_CTE
+from src.models.duplicates import DuplicateCardError, content_hash, existing_hashes, find_duplicate_id
+from src.models.media import link_media
+from src.models.note import render_note_cards
+
+# How new cards are ordered relative to reviews in a study queue
+NEW_CARDS_MIXED = "mixed"
+NEW_CARDS_FIRST = "new_first"
+NEW_CARDS_LAST = "new_last"
+
+# Due reviews read per round trip while filling a study queue
+QUEUE_FETCH_SIZE = 500
+
+# Due reviews streamed per review slot in the queue before the remaining
+# decks are filled one query at a time
+QUEUE_SCAN_FACTOR = 2
+
+# Tables whose rows belong to a card and are removed with it
+CARD_TABLES = ("cards", "reviews", "study_sessions", "study_daily", "card_media")
+
+
+@dataclass
+class DeletedCards:
+    """Rows removed by Card.delete_for_undo, kept so they can be restored."""
+    card_ids: List[int]
+    # table -> (columns, rows)
+    rows: Dict[str, Tuple[List[str], List[tuple]]] = field(default_factory=dict)
+    
+    @property
+    def count(self) -> int:
+        """Number of cards deleted."""
+        return len(self.rows.get("cards", ([], []))[1])
 
 
 @dataclass
 class Card:
-    """Represents a flashcard."""
+    """Represents a flashcard.
+    
+    Cards generated from a note (see src/models/note.py) have a note_id
+    and store no text of their own; the loaders below fill in front and
+    back from the note.
+    """
     id: Optional[int]
     deck_id: int
     front: str
@@ -15,16 +54,52 @@ class Card:
     tags: str = ""
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    note_id: Optional[int] = None
+    ordinal: int = 0
+    
+    @classmethod
+    def _from_row(cls, row) -> "Card":
+        """Build a card from a ``cards`` row."""
+        return cls(
+            id=row["id"],
+            deck_id=row["deck_id"],
+            front=row["front"],
+            back=row["back"],
+            tags=row["tags"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            note_id=row["note_id"],
+            ordinal=row["ordinal"]
+        )
     
     @classmethod
-    def create(cls, deck_id: int, front: str, back: str, tags: str = "") -> "Card":
-        """Create a new card in the database."""
+    @retry_on_locked
+    def create(
+        cls,
+        deck_id: int,
+        front: str,
+        back: str,
+        tags: str = "",
+        allow_duplicate: bool = False,
+    ) -> "Card":
+        """Create a new card in the database.
+        
+        Raises:
+            DuplicateCardError: If the deck already has a card with the same
+                front (see src/models/duplicates.py), unless allow_duplicate
+        """
         db = get_db()
+        front_hash = content_hash(front)
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if not allow_duplicate:
+                existing_id = find_duplicate_id(cursor, deck_id, front_hash)
+                if existing_id is not None:
+                    raise DuplicateCardError(existing_id, front)
             cursor.execute(
-                "INSERT INTO cards (deck_id, front, back, tags) VALUES (?, ?, ?, ?)",
-                (deck_id, front, back, tags)
+                "INSERT INTO cards (deck_id, front, back, tags, content_hash) VALUES (?, ?, ?, ?, ?)",
+                (deck_id, front, back, tags, front_hash)
             )
             card_id = cursor.lastrowid
             
@@ -33,10 +108,70 @@ class Card:
                 "INSERT INTO reviews (card_id) VALUES (?)",
                 (card_id,)
             )
+            link_media(cursor, [(card_id, f"{front}\n{back}")], replace=False)
+            log_change(cursor, CARD, "create", [card_id], deck_id=deck_id)
             conn.commit()
+        publish_changes(db)
         
         return cls.get_by_id(card_id)
     
+    @classmethod
+    @retry_on_locked
+    def bulk_create(
+        cls,
+        deck_id: int,
+        rows: Iterable[Tuple[str, str, str]],
+        skip_duplicates: bool = True,
+        db: Optional[Database] = None,
+    ) -> int:
+        """Create many cards in a single transaction.
+        
+        Args:
+            deck_id: Deck to add the cards to
+            rows: (front, back, tags) tuples
+            skip_duplicates: Leave out rows whose front is already in the
+                deck or earlier in ``rows``
+            db: Collection to write to. Defaults to the global instance.
+        
+        Returns:
+            Number of cards created
+        """
+        rows = [(front, back, tags, content_hash(front)) for front, back, tags in rows]
+        db = db or get_db()
+        card_ids = []
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            seen = existing_hashes(cursor, deck_id, [row[3] for row in rows]) if skip_duplicates else set()
+            for front, back, tags, front_hash in rows:
+                if skip_duplicates:
+                    if front_hash in seen:
+                        continue
+                    seen.add(front_hash)
+                cursor.execute(
+                    "INSERT INTO cards (deck_id, front, back, tags, content_hash) VALUES (?, ?, ?, ?, ?)",
+                    (deck_id, front, back, tags, front_hash)
+                )
+                card_ids.append(cursor.lastrowid)
+                cursor.execute(
+                    "INSERT INTO reviews (card_id) VALUES (?)",
+                    (cursor.lastrowid,)
+                )
+                link_media(cursor, [(card_ids[-1], f"{front}\n{back}")], replace=False)
+            log_change(cursor, CARD, "create", card_ids, deck_id=deck_id)
+            conn.commit()
+        publish_changes(db)
+        
+        return len(card_ids)
+    
+    @classmethod
+    def find_duplicate(cls, deck_id: int, front: str) -> Optional["Card"]:
+        """The card of a deck whose front equals ``front`` after normalization, if any."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            existing_id = find_duplicate_id(conn.cursor(), deck_id, content_hash(front))
+        return cls.get_by_id(existing_id) if existing_id is not None else None
+    
     @classmethod
     def get_by_id(cls, card_id: int) -> Optional["Card"]:
         """Retrieve a card by ID."""
@@ -47,17 +182,25 @@ class Card:
             row = cursor.fetchone()
             
             if row:
-                return cls(
-                    id=row["id"],
-                    deck_id=row["deck_id"],
-                    front=row["front"],
-                    back=row["back"],
-                    tags=row["tags"],
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                    updated_at=datetime.fromisoformat(row["updated_at"])
-                )
+                card = cls._from_row(row)
+                render_note_cards(cursor, [card])
+                return card
         return None
     
+    @classmethod
+    def get_by_ids(cls, card_ids: Iterable[int]) -> List["Card"]:
+        """Retrieve the cards with these IDs that still exist."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM cards WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id",
+                (json.dumps(list(card_ids)),)
+            )
+            cards = [cls._from_row(row) for row in cursor.fetchall()]
+            render_note_cards(cursor, cards)
+            return cards
+    
     @classmethod
     def get_by_deck(cls, deck_id: int) -> List["Card"]:
         """Retrieve all cards in a deck."""
@@ -68,20 +211,29 @@ class Card:
                 "SELECT * FROM cards WHERE deck_id = ? ORDER BY created_at DESC",
                 (deck_id,)
             )
-            rows = cursor.fetchall()
-            
-            return [
-                cls(
-                    id=row["id"],
-                    deck_id=row["deck_id"],
-                    front=row["front"],
-                    back=row["back"],
-                    tags=row["tags"],
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                    updated_at=datetime.fromisoformat(row["updated_at"])
-                )
-                for row in rows
-            ]
+            cards = [cls._from_row(row) for row in cursor.fetchall()]
+            render_note_cards(cursor, cards)
+            return cards
+    
+    @classmethod
+    def get_all(cls, deck_id: Optional[int] = None) -> List["Card"]:
+        """Retrieve every card, ordered by deck name and newest first, in one query.
+        
+        Args:
+            deck_id: Only cards of this deck and its subdecks
+        """
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH RECURSIVE {SUBTREE_CTE}
+                SELECT c.* FROM cards c JOIN decks d ON d.id = c.deck_id
+                WHERE c.deck_id IN subtree
+                ORDER BY d.name, c.created_at DESC
+            """, (deck_id, deck_id))
+            cards = [cls._from_row(row) for row in cursor.fetchall()]
+            render_note_cards(cursor, cards)
+            return cards
     
     @classmethod
     def get_due_cards(cls, deck_id: Optional[int] = None) -> List["Card"]:
@@ -105,39 +257,280 @@ class Card:
                     ORDER BY r.due_date
                 """)
             
-            rows = cursor.fetchall()
+            cards = [cls._from_row(row) for row in cursor.fetchall()]
+            render_note_cards(cursor, cards)
+            return cards
+    
+    @classmethod
+    def get_study_queue(
+        cls,
+        deck_id: Optional[int] = None,
+        new_order: str = NEW_CARDS_MIXED
+    ) -> List["Card"]:
+        """Get today's study queue, bounded by each deck's daily limits.
+        
+        Each deck contributes at most ``new_per_day`` new cards (oldest
+        created first) and ``reviews_per_day`` reviews (most overdue first),
+        minus what was already studied today, so the queue never holds more
+        than the day's workload. Reviews are streamed in due order from the
+        due-date index and reading stops as soon as every quota is filled.
+        
+        Args:
+            deck_id: Only study this deck and its subdecks
+            new_order: NEW_CARDS_MIXED, NEW_CARDS_FIRST or NEW_CARDS_LAST
+        """
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH RECURSIVE {SUBTREE_CTE}
+                SELECT d.id,
+                       MAX(d.new_per_day - COALESCE(s.new_cards, 0), 0),
+                       MAX(d.reviews_per_day - COALESCE(s.reviews - s.new_cards, 0), 0)
+                FROM decks d
+                JOIN subtree ON subtree.id = d.id
+                LEFT JOIN review_stats s ON s.deck_id = d.id AND s.day = ?
+            """, (deck_id, deck_id, date.today().isoformat()))
+            limits = cursor.fetchall()
+            
+            new_cards = []
+            for limit_deck_id, new_left, _ in limits:
+                if new_left:
+                    cursor.execute("""
+                        SELECT c.* FROM cards c
+                        JOIN reviews r ON c.id = r.card_id
+                        WHERE c.deck_id = ? AND r.last_review IS NULL
+                          AND r.due_date <= CURRENT_TIMESTAMP
+                        ORDER BY c.id
+                        LIMIT ?
+                    """, (limit_deck_id, new_left))
+                    new_cards.extend(cls._from_row(row) for row in cursor.fetchall())
+            
+            reviews = []
+            reviews_left = {row[0]: row[2] for row in limits if row[2]}
+            budget = sum(reviews_left.values()) * QUEUE_SCAN_FACTOR
+            last_seen = ("", 0)
+            if reviews_left:
+                cursor.execute("""
+                    SELECT c.*, r.due_date AS due_date, r.id AS review_id FROM reviews r
+                    JOIN cards c ON c.id = r.card_id
+                    WHERE r.due_date <= CURRENT_TIMESTAMP AND r.last_review IS NOT NULL
+                      AND (? IS NULL OR c.deck_id IN (SELECT value FROM json_each(?)))
+                    ORDER BY r.due_date, r.id
+                """, (deck_id, json.dumps(list(reviews_left))))
+                while reviews_left and budget > 0:
+                    rows = cursor.fetchmany(QUEUE_FETCH_SIZE)
+                    if not rows:
+                        reviews_left.clear()
+                        break
+                    budget -= len(rows)
+                    last_seen = (rows[-1]["due_date"], rows[-1]["review_id"])
+                    for row in rows:
+                        left = reviews_left.get(row["deck_id"])
+                        if left:
+                            reviews.append(cls._from_row(row))
+                            if left == 1:
+                                del reviews_left[row["deck_id"]]
+                            else:
+                                reviews_left[row["deck_id"]] = left - 1
+            
+            # Decks with few due reviews would make the stream read every due
+            # card; finish them with one indexed query per deck instead
+            for left_deck_id, left in reviews_left.items():
+                cursor.execute("""
+                    SELECT c.* FROM cards c
+                    JOIN reviews r ON c.id = r.card_id
+                    WHERE c.deck_id = ? AND r.due_date <= CURRENT_TIMESTAMP
+                      AND r.last_review IS NOT NULL AND (r.due_date, r.id) > (?, ?)
+                    ORDER BY r.due_date, r.id
+                    LIMIT ?
+                """, (left_deck_id, *last_seen, left))
+                reviews.extend(cls._from_row(row) for row in cursor.fetchall())
+            render_note_cards(cursor, reviews + new_cards)
+        
+        return interleave_new_cards(reviews, new_cards, new_order)
+    
+    @classmethod
+    def count_due(cls, deck_id: Optional[int] = None) -> int:
+        """Count due cards without loading them, using the review indexes.
+        
+        Args:
+            deck_id: Only count this deck and its subdecks
+        """
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            
+            if deck_id:
+                cursor.execute(f"""
+                    WITH RECURSIVE {SUBTREE_CTE}
+                    SELECT COUNT(*) FROM cards c
+                    JOIN reviews r ON c.id = r.card_id
+                    WHERE c.deck_id IN subtree AND r.due_date <= CURRENT_TIMESTAMP
+                """, (deck_id, deck_id))
+            else:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM reviews WHERE due_date <= CURRENT_TIMESTAMP"
+                )
             
-            return [
-                cls(
-                    id=row["id"],
-                    deck_id=row["deck_id"],
-                    front=row["front"],
-                    back=row["back"],
-                    tags=row["tags"],
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                    updated_at=datetime.fromisoformat(row["updated_at"])
+            return cursor.fetchone()[0]
+    
+    @classmethod
+    @retry_on_locked
+    def delete_for_undo(cls, card_ids: Iterable[int]) -> DeletedCards:
+        """Delete many cards, returning their rows so the delete can be undone.
+        
+        The rows are read and deleted in one write transaction, so nothing
+        written in between can be missed.
+        """
+        deleted = DeletedCards(card_ids=list(card_ids))
+        ids = json.dumps(deleted.card_ids)
+        
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for table in CARD_TABLES:
+                key = "id" if table == "cards" else "card_id"
+                cursor.execute(
+                    f"SELECT * FROM {table} WHERE {key} IN (SELECT value FROM json_each(?))",
+                    (ids,)
                 )
-                for row in rows
-            ]
+                columns = [column[0] for column in cursor.description]
+                deleted.rows[table] = (columns, [tuple(row) for row in cursor.fetchall()])
+            
+            cursor.execute("DELETE FROM cards WHERE id IN (SELECT value FROM json_each(?))", (ids,))
+            log_change(cursor, CARD, "delete", deleted.card_ids)
+            conn.commit()
+        publish_changes(db)
+        return deleted
     
-    def update(self) -> None:
-        """Update the card in the database."""
+    @classmethod
+    @retry_on_locked
+    def restore(cls, deleted: DeletedCards) -> int:
+        """Re-insert cards removed by delete_for_undo, with their history.
+        
+        Returns:
+            Number of cards restored
+        """
         db = get_db()
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            for table in CARD_TABLES:
+                columns, rows = deleted.rows.get(table, ([], []))
+                if rows:
+                    cursor.executemany(
+                        f"INSERT INTO {table} ({', '.join(columns)}) "
+                        f"VALUES ({', '.join('?' * len(columns))})",
+                        rows
+                    )
+            
+            # The restored rows are sent again by the next sync rather than
+            # their deletion
+            ids = json.dumps(deleted.card_ids)
             cursor.execute(
-                """UPDATE cards 
-                   SET deck_id = ?, front = ?, back = ?, tags = ?, 
-                       updated_at = CURRENT_TIMESTAMP
-                   WHERE id = ?""",
-                (self.deck_id, self.front, self.back, self.tags, self.id)
+                """DELETE FROM sync_graves WHERE guid IN (
+                       SELECT guid FROM cards WHERE id IN (SELECT value FROM json_each(?))
+                   )""",
+                (ids,)
             )
+            for table in CARD_TABLES:
+                if table in SYNC_TABLES:
+                    key = "id" if table == "cards" else "card_id"
+                    cursor.execute(
+                        f"UPDATE {table} SET usn = -1 WHERE {key} IN (SELECT value FROM json_each(?))",
+                        (ids,)
+                    )
+            log_change(cursor, CARD, "restore", deleted.card_ids)
             conn.commit()
+        publish_changes(db)
+        return deleted.count
     
+    @classmethod
+    @retry_on_locked
+    def bulk_move(cls, card_ids: Iterable[int], deck_id: int) -> int:
+        """Move many cards to another deck with a single statement.
+        
+        Returns:
+            Number of cards moved
+        """
+        card_ids = list(card_ids)
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE cards
+                   SET deck_id = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE id IN (SELECT value FROM json_each(?))""",
+                (deck_id, json.dumps(card_ids))
+            )
+            moved = cursor.rowcount
+            log_change(cursor, CARD, "move", card_ids, deck_id=deck_id)
+            conn.commit()
+        publish_changes(db)
+        return moved
+    
+    @retry_on_locked
+    def update(self) -> None:
+        """Update the card in the database.
+        
+        The text of a note's card is edited through its note (Note.update),
+        so only its deck and tags are saved here.
+        """
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            if self.note_id is not None:
+                cursor.execute(
+                    "UPDATE cards SET deck_id = ?, tags = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (self.deck_id, self.tags, self.id)
+                )
+            else:
+                cursor.execute(
+                    """UPDATE cards 
+                       SET deck_id = ?, front = ?, back = ?, tags = ?, content_hash = ?,
+                           updated_at = CURRENT_TIMESTAMP
+                       WHERE id = ?""",
+                    (self.deck_id, self.front, self.back, self.tags, content_hash(self.front), self.id)
+                )
+                link_media(cursor, [(self.id, f"{self.front}\n{self.back}")])
+            log_change(cursor, CARD, "update", [self.id], deck_id=self.deck_id)
+            conn.commit()
+        publish_changes(db)
+    
+    @retry_on_locked
     def delete(self) -> None:
         """Delete the card from the database."""
         db = get_db()
         with db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM cards WHERE id = ?", (self.id,))
+            log_change(cursor, CARD, "delete", [self.id])
             conn.commit()
+        publish_changes(db)
+
+
+def interleave_new_cards(reviews: List[Card], new_cards: List[Card], new_order: str) -> List[Card]:
+    """Combine reviews and new cards according to the new-card order policy.
+    
+    The mixed policy spreads new cards evenly between reviews.
+    """
+    if new_order == NEW_CARDS_FIRST:
+        return new_cards + reviews
+    if new_order == NEW_CARDS_LAST or not new_cards:
+        return reviews + new_cards
+    
+    queue = []
+    step = (len(reviews) + len(new_cards)) / len(new_cards)
+    new_iter = iter(new_cards)
+    review_iter = iter(reviews)
+    next_new = step / 2
+    for position in range(len(reviews) + len(new_cards)):
+        if position >= next_new:
+            card = next(new_iter, None)
+            next_new += step
+            if card is not None:
+                queue.append(card)
+                continue
+        queue.append(next(review_iter, None) or next(new_iter))
+    return queue
@@ -1,8 +1,50 @@
 """Deck model for TextuAnki."""
+import json
+import threading
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional, List
-from src.database.db import get_db
+from pathlib import Path
+from typing import Dict, Optional, List
+from src.database.db import Database, get_db, retry_on_locked
+from src.database.oplog import COLLECTION, DECK, log_change, publish_changes
+
+# Separates the levels of a deck name, e.g. "Languages::Spanish"
+DECK_SEPARATOR = "::"
+
+# Recursive CTE selecting a deck and all of its descendants, or every deck
+# when the deck id is NULL. Takes the deck id twice.
+SUBTREE_CTE = """
+    subtree(id) AS (
+        SELECT id FROM decks WHERE ? IS NULL OR id = ?
+        UNION
+        SELECT d.id FROM decks d JOIN subtree s ON d.parent_id = s.id
+    )
+"""
+
+
+def _leaf_name(name: str) -> str:
+    return name.rsplit(DECK_SEPARATOR, 1)[-1]
+
+
+@dataclass
+class DeckSummary:
+    """Card counts for a deck, as reported by the dashboard and CLI."""
+    deck_id: int
+    name: str
+    total: int = 0
+    due: int = 0
+    new: int = 0
+    parent_id: Optional[int] = None
+    
+    @property
+    def leaf_name(self) -> str:
+        """Last level of the deck name."""
+        return _leaf_name(self.name)
+    
+    @property
+    def depth(self) -> int:
+        """Nesting level, 0 for top-level decks."""
+        return self.name.count(DECK_SEPARATOR)
 
 
 @dataclass
@@ -13,22 +55,69 @@ class Deck:
     description: str = ""
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    new_per_day: int = 20
+    reviews_per_day: int = 200
+    parent_id: Optional[int] = None
+    
+    @property
+    def leaf_name(self) -> str:
+        """Last level of the deck name."""
+        return _leaf_name(self.name)
     
     @classmethod
+    def _from_row(cls, row) -> "Deck":
+        """Build a deck from a ``decks`` row."""
+        return cls(
+            id=row["id"],
+            name=row["name"],
+            description=row["description"],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            new_per_day=row["new_per_day"],
+            reviews_per_day=row["reviews_per_day"],
+            parent_id=row["parent_id"]
+        )
+    
+    @classmethod
+    @retry_on_locked
     def create(cls, name: str, description: str = "") -> "Deck":
-        """Create a new deck in the database."""
+        """Create a new deck in the database.
+        
+        Parent decks named by ``Parent::Child`` are created if missing.
+        """
         db = get_db()
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            parent_id = cls._ensure_parents(cursor, name)
             cursor.execute(
-                "INSERT INTO decks (name, description) VALUES (?, ?)",
-                (name, description)
+                "INSERT INTO decks (name, description, parent_id) VALUES (?, ?, ?)",
+                (name, description, parent_id)
             )
-            conn.commit()
             deck_id = cursor.lastrowid
+            log_change(cursor, DECK, "create", [deck_id], name=name)
+            conn.commit()
+        publish_changes(db)
         
         return cls.get_by_id(deck_id)
     
+    @staticmethod
+    def _ensure_parents(cursor, name: str) -> Optional[int]:
+        """Create any missing ancestors of a deck name and return its parent's id."""
+        parent_id = None
+        parts = name.split(DECK_SEPARATOR)
+        for depth in range(1, len(parts)):
+            path = DECK_SEPARATOR.join(parts[:depth])
+            cursor.execute(
+                "INSERT OR IGNORE INTO decks (name, description, parent_id) VALUES (?, '', ?)",
+                (path, parent_id)
+            )
+            created = cursor.rowcount
+            cursor.execute("SELECT id FROM decks WHERE name = ?", (path,))
+            parent_id = cursor.fetchone()[0]
+            if created:
+                log_change(cursor, DECK, "create", [parent_id], name=path)
+        return parent_id
+    
     @classmethod
     def get_by_id(cls, deck_id: int) -> Optional["Deck"]:
         """Retrieve a deck by ID."""
@@ -39,13 +128,20 @@ class Deck:
             row = cursor.fetchone()
             
             if row:
-                return cls(
-                    id=row["id"],
-                    name=row["name"],
-                    description=row["description"],
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                    updated_at=datetime.fromisoformat(row["updated_at"])
-                )
+                return cls._from_row(row)
+        return None
+    
+    @classmethod
+    def get_by_name(cls, name: str) -> Optional["Deck"]:
+        """Retrieve a deck by its unique name."""
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM decks WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            
+            if row:
+                return cls._from_row(row)
         return None
     
     @classmethod
@@ -57,37 +153,176 @@ class Deck:
             cursor.execute("SELECT * FROM decks ORDER BY name")
             rows = cursor.fetchall()
             
+            return [cls._from_row(row) for row in rows]
+    
+    @classmethod
+    def get_subtree_ids(cls, deck_id: int) -> List[int]:
+        """IDs of a deck and all of its descendants."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"WITH RECURSIVE {SUBTREE_CTE} SELECT id FROM subtree", (deck_id, deck_id))
+            return [row[0] for row in cursor.fetchall()]
+    
+    @classmethod
+    def get_summaries(
+        cls,
+        name: Optional[str] = None,
+        include_subdecks: bool = False
+    ) -> List[DeckSummary]:
+        """Get total, due and new card counts for every deck in one query.
+        
+        Args:
+            name: Only summarize the deck with this name
+            include_subdecks: Count the cards of each deck's whole subtree.
+                Decks are then ordered as a tree, parents before children.
+        """
+        if include_subdecks:
+            return cls._get_tree_summaries(name)
+        
+        query = """
+            SELECT d.id, d.name,
+                   COUNT(c.id) AS total,
+                   COALESCE(SUM(r.due_date <= CURRENT_TIMESTAMP), 0) AS due,
+                   COALESCE(SUM(r.id IS NOT NULL AND r.last_review IS NULL), 0) AS new
+            FROM decks d
+            LEFT JOIN cards c ON c.deck_id = d.id
+            LEFT JOIN reviews r ON r.card_id = c.id
+        """
+        params = ()
+        if name is not None:
+            query += " WHERE d.name = ?"
+            params = (name,)
+        query += " GROUP BY d.id ORDER BY d.name"
+        
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
             return [
-                cls(
-                    id=row["id"],
+                DeckSummary(
+                    deck_id=row["id"],
+                    name=row["name"],
+                    total=row["total"],
+                    due=row["due"],
+                    new=row["new"]
+                )
+                for row in cursor.fetchall()
+            ]
+    
+    @classmethod
+    def _get_tree_summaries(cls, name: Optional[str] = None) -> List[DeckSummary]:
+        """Subtree card counts for every deck, in one recursive query."""
+        query = """
+            WITH RECURSIVE tree(root_id, deck_id) AS (
+                SELECT id, id FROM decks
+                UNION
+                SELECT t.root_id, d.id FROM decks d JOIN tree t ON d.parent_id = t.deck_id
+            ),
+            counts AS (
+                SELECT c.deck_id,
+                       COUNT(c.id) AS total,
+                       COALESCE(SUM(r.due_date <= CURRENT_TIMESTAMP), 0) AS due,
+                       COALESCE(SUM(r.id IS NOT NULL AND r.last_review IS NULL), 0) AS new
+                FROM cards c
+                LEFT JOIN reviews r ON r.card_id = c.id
+                GROUP BY c.deck_id
+            )
+            SELECT d.id, d.name, d.parent_id,
+                   COALESCE(SUM(k.total), 0) AS total,
+                   COALESCE(SUM(k.due), 0) AS due,
+                   COALESCE(SUM(k.new), 0) AS new
+            FROM tree t
+            JOIN decks d ON d.id = t.root_id
+            LEFT JOIN counts k ON k.deck_id = t.deck_id
+        """
+        params = ()
+        if name is not None:
+            query += " WHERE d.name = ?"
+            params = (name,)
+        query += " GROUP BY d.id"
+        
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            summaries = [
+                DeckSummary(
+                    deck_id=row["id"],
                     name=row["name"],
-                    description=row["description"],
-                    created_at=datetime.fromisoformat(row["created_at"]),
-                    updated_at=datetime.fromisoformat(row["updated_at"])
+                    total=row["total"],
+                    due=row["due"],
+                    new=row["new"],
+                    parent_id=row["parent_id"]
                 )
-                for row in rows
+                for row in cursor.fetchall()
             ]
+        summaries.sort(key=lambda summary: summary.name.split(DECK_SEPARATOR))
+        return summaries
     
+    @retry_on_locked
     def update(self) -> None:
-        """Update the deck in the database."""
+        """Update the deck in the database, re-linking it to the parent its name implies.
+        
+        A renamed deck takes its subdecks along: their names get the new
+        prefix in the same transaction.
+        
+        Raises:
+            ValueError: The new name would put the deck under itself
+        """
         db = get_db()
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("SELECT name FROM decks WHERE id = ?", (self.id,))
+            row = cursor.fetchone()
+            old_name = row[0] if row else self.name
+            old_prefix = old_name + DECK_SEPARATOR
+            if self.name.startswith(old_prefix):
+                raise ValueError(f"Deck '{old_name}' cannot be moved into its own subdeck")
+            
+            self.parent_id = self._ensure_parents(cursor, self.name)
+            if self.name != old_name:
+                cursor.execute(
+                    "SELECT id FROM decks WHERE substr(name, 1, ?) = ?",
+                    (len(old_prefix), old_prefix)
+                )
+                subdeck_ids = [row[0] for row in cursor.fetchall()]
+                # Their parent links stay valid: the whole subtree moves
+                cursor.execute(
+                    """UPDATE decks SET name = ? || substr(name, ?), updated_at = CURRENT_TIMESTAMP
+                       WHERE id IN (SELECT value FROM json_each(?))""",
+                    (self.name + DECK_SEPARATOR, len(old_prefix) + 1, json.dumps(subdeck_ids))
+                )
+                if subdeck_ids:
+                    log_change(cursor, DECK, "update", subdeck_ids)
             cursor.execute(
                 """UPDATE decks 
-                   SET name = ?, description = ?, updated_at = CURRENT_TIMESTAMP
+                   SET name = ?, description = ?, new_per_day = ?, reviews_per_day = ?,
+                       parent_id = ?, updated_at = CURRENT_TIMESTAMP
                    WHERE id = ?""",
-                (self.name, self.description, self.id)
+                (self.name, self.description, self.new_per_day, self.reviews_per_day,
+                 self.parent_id, self.id)
             )
+            log_change(cursor, DECK, "update", [self.id], name=self.name)
             conn.commit()
+        publish_changes(db)
     
+    @retry_on_locked
     def delete(self) -> None:
-        """Delete the deck from the database."""
+        """Delete the deck from the database, with its subdecks and their cards."""
         db = get_db()
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            
+            # Subdecks are deleted with their parent by ON DELETE CASCADE
+            cursor.execute(
+                f"WITH RECURSIVE {SUBTREE_CTE} SELECT id FROM subtree", (self.id, self.id)
+            )
+            deck_ids = [row[0] for row in cursor.fetchall()]
             cursor.execute("DELETE FROM decks WHERE id = ?", (self.id,))
+            log_change(cursor, DECK, "delete", deck_ids)
             conn.commit()
+        publish_changes(db)
     
     def get_card_count(self) -> int:
         """Get the number of cards in this deck."""
@@ -96,3 +331,70 @@ class Deck:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM cards WHERE deck_id = ?", (self.id,))
             return cursor.fetchone()[0]
+
+
+class DeckCache:
+    """Every deck of a collection, kept in memory for deck pickers and labels.
+    
+    Decks are read once and again only after the change log records a
+    deck change, sync or restore, which one query over the changes since
+    tells. Opening a screen that lists decks therefore costs nothing on
+    collections with thousands of them. The returned Deck objects are
+    shared: edit a fresh copy from Deck.get_by_id() instead.
+    """
+    
+    def __init__(self, db: Database):
+        self.db = db
+        self._lock = threading.Lock()
+        self._decks: Optional[List[Deck]] = None
+        self._by_id: Dict[int, Deck] = {}
+        self._seq = 0
+    
+    def get_all(self) -> List[Deck]:
+        """All decks ordered by name."""
+        with self._lock:
+            with self.db.get_connection(read_only=True) as conn:
+                cursor = conn.cursor()
+                if self._decks is None:
+                    seq, deck_changes = cursor.execute("SELECT MAX(seq), 1 FROM oplog").fetchone()
+                else:
+                    cursor.execute(
+                        "SELECT MAX(seq), COUNT(CASE WHEN entity IN (?, ?) THEN 1 END) FROM oplog WHERE seq > ?",
+                        (DECK, COLLECTION, self._seq)
+                    )
+                    seq, deck_changes = cursor.fetchone()
+                if deck_changes:
+                    cursor.execute("SELECT * FROM decks ORDER BY name")
+                    self._decks = [Deck._from_row(row) for row in cursor.fetchall()]
+                    self._by_id = {deck.id: deck for deck in self._decks}
+                self._seq = seq or self._seq
+            return list(self._decks)
+    
+    def get(self, deck_id: int) -> Optional[Deck]:
+        """Look up a deck by ID."""
+        self.get_all()
+        return self._by_id.get(deck_id)
+    
+    def names(self) -> Dict[int, str]:
+        """Deck names by ID."""
+        return {deck.id: deck.name for deck in self.get_all()}
+    
+    def invalidate(self) -> None:
+        """Read the decks again on next use."""
+        with self._lock:
+            self._decks = None
+
+
+# One cache per database file
+_caches: Dict[Path, DeckCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_deck_cache(db: Optional[Database] = None) -> DeckCache:
+    """Get the deck cache of a database. Defaults to the global instance."""
+    db = db or get_db()
+    with _caches_lock:
+        cache = _caches.get(db.db_path)
+        if cache is None:
+            cache = _caches[db.db_path] = DeckCache(db)
+        return cache
@@ -0,0 +1,289 @@
+"""Duplicate detection for TextuAnki.
+
+Exact duplicates are cards in the same deck whose fronts are equal after
+normalization (case, Unicode form and whitespace). Every card stores a
+64-bit hash of its normalized front in ``cards.content_hash``, indexed
+per deck, so checking a new card is one index lookup.
+
+Near duplicates (typos, punctuation, accents, a reworded answer) are
+found across a whole collection with MinHash and locality-sensitive
+hashing: each card gets a signature of its character trigrams, cards
+whose signatures agree on a band land in the same bucket, and only cards
+sharing a bucket are compared. The work grows with the number of cards,
+not with the number of pairs.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+
+from src.database.db import Database, get_db
+
+# Jaccard similarity of trigram sets from which cards count as near duplicates
+DEFAULT_THRESHOLD = 0.8
+
+# LSH bands and signature values per band. Cards at the default threshold
+# share a band with a probability of 97%, cards at 0.5 with 49%.
+LSH_BANDS = 5
+LSH_ROWS = 3
+
+SHINGLE_SIZE = 3
+
+# Cards read per round trip while computing signatures
+SCAN_FETCH_SIZE = 5000
+
+_WHITESPACE = re.compile(r"\s+")
+_NON_WORD = re.compile(r"[\W_]+")
+_EMPTY_BIN = 1 << 64
+
+
+class DuplicateCardError(ValueError):
+    """A card with the same front already exists in the deck.
+    
+    Attributes:
+        card_id: Id of the card already in the deck
+    """
+    
+    def __init__(self, card_id: int, front: str):
+        super().__init__(f"The deck already has this card (id {card_id}): {front[:60]}")
+        self.card_id = card_id
+
+
+def normalize(text: str) -> str:
+    """Text as compared for exact duplicates: case, Unicode form and spacing removed."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip().casefold()
+
+
+def content_hash(front: str) -> int:
+    """Signed 64-bit hash of a normalized card front, as stored in ``cards.content_hash``."""
+    digest = hashlib.blake2b(normalize(front).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def existing_hashes(cursor: sqlite3.Cursor, deck_id: int, hashes: List[int]) -> Set[int]:
+    """Which of the given front hashes the deck already has, in one indexed query."""
+    cursor.execute(
+        "SELECT content_hash FROM cards WHERE deck_id = ? AND content_hash IN (SELECT value FROM json_each(?))",
+        (deck_id, json.dumps(hashes))
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def find_duplicate_id(cursor: sqlite3.Cursor, deck_id: int, front_hash: int) -> Optional[int]:
+    """Id of the oldest card of the deck with this front hash, through the index."""
+    row = cursor.execute(
+        "SELECT id FROM cards WHERE deck_id = ? AND content_hash = ? ORDER BY id LIMIT 1",
+        (deck_id, front_hash)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def _loose(text: str) -> str:
+    """Text as compared for near duplicates: also without accents and punctuation."""
+    letters = text.casefold()
+    if not letters.isascii():
+        decomposed = unicodedata.normalize("NFKD", letters)
+        letters = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_WORD.sub(" ", letters).strip()
+
+
+def shingles(text: str, loose: bool = False) -> FrozenSet[str]:
+    """Character trigrams of a card's text, after loose normalization.
+    
+    Args:
+        text: Card text
+        loose: The text is already loosely normalized
+    """
+    text = f" {text if loose else _loose(text)} "
+    if len(text) <= SHINGLE_SIZE:
+        return frozenset((text,))
+    return frozenset(text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two sets."""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def band_keys(items: FrozenSet[str]) -> List[int]:
+    """LSH bucket keys of a shingle set, one per band.
+    
+    Uses one-permutation MinHash: shingle hashes are split into
+    LSH_BANDS * LSH_ROWS bins by value and the minimum of each bin is
+    kept, so each shingle is hashed once. Empty bins borrow the value of
+    the next non-empty bin. Python's string hash is used, which is only
+    stable within one process, so keys must not be stored.
+    """
+    size = LSH_BANDS * LSH_ROWS
+    bins = [_EMPTY_BIN] * size
+    for item in items:
+        value = hash(item) & 0xFFFFFFFFFFFFFFFF
+        index = value % size
+        if value < bins[index]:
+            bins[index] = value
+    for index in range(size):
+        if bins[index] == _EMPTY_BIN:
+            for offset in range(1, size):
+                borrowed = bins[(index + offset) % size]
+                if borrowed != _EMPTY_BIN:
+                    # Offset keeps borrowed values from matching real ones
+                    bins[index] = borrowed + offset
+                    break
+    return [
+        hash((band, *bins[band * LSH_ROWS:(band + 1) * LSH_ROWS]))
+        for band in range(LSH_BANDS)
+    ]
+
+
+@dataclass
+class DuplicateGroup:
+    """Cards that are near duplicates of each other.
+    
+    Attributes:
+        card_ids: Cards in the group, oldest first; a note is represented
+            by its first card
+        similarity: Lowest similarity of the compared pairs that joined
+            the group, 1.0 for exact copies
+    """
+    card_ids: List[int]
+    similarity: float
+
+
+@dataclass
+class DedupeReport:
+    """Outcome of a near-duplicate search."""
+    groups: List[DuplicateGroup] = field(default_factory=list)
+    scanned: int = 0
+    candidates: int = 0
+    duration: float = 0.0
+    
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        duplicates = sum(len(group.card_ids) - 1 for group in self.groups)
+        return (
+            f"Scanned {self.scanned} cards, compared {self.candidates} candidate pairs, "
+            f"found {len(self.groups)} groups with {duplicates} near duplicates "
+            f"in {self.duration * 1000:.0f} ms"
+        )
+
+
+def _card_texts(cursor: sqlite3.Cursor, deck_id: Optional[int]) -> Iterator[Tuple[int, str]]:
+    """(card id, text) of every card, counting the cards of a note once.
+    
+    A note's fields stand for all of its cards, so cloze siblings are not
+    reported as duplicates of each other.
+    """
+    cursor.execute(
+        """SELECT id, front || char(10) || back, NULL FROM cards
+           WHERE note_id IS NULL AND (? IS NULL OR deck_id = ?)
+           UNION ALL
+           SELECT MIN(c.id), NULL, n.fields FROM cards c JOIN notes n ON n.id = c.note_id
+           WHERE ? IS NULL OR c.deck_id = ?
+           GROUP BY n.id""",
+        (deck_id, deck_id, deck_id, deck_id)
+    )
+    while True:
+        rows = cursor.fetchmany(SCAN_FETCH_SIZE)
+        if not rows:
+            return
+        for card_id, text, fields in rows:
+            yield card_id, text if fields is None else "\n".join(json.loads(fields))
+
+
+def find_near_duplicates(
+    threshold: float = DEFAULT_THRESHOLD,
+    deck_id: Optional[int] = None,
+    db: Optional[Database] = None,
+) -> DedupeReport:
+    """Group cards whose text is nearly the same.
+    
+    Signatures and buckets are kept in a private in-memory database, so
+    memory stays small and the collection is only read.
+    
+    Args:
+        threshold: Minimum Jaccard similarity of the cards' trigrams
+        deck_id: Only search this deck, otherwise the whole collection
+        db: Collection to search. Defaults to the global instance.
+    """
+    db = db or get_db()
+    report = DedupeReport()
+    start = time.perf_counter()
+    
+    scratch = sqlite3.connect(":memory:")
+    scratch.execute("CREATE TABLE texts (card_id INTEGER PRIMARY KEY, text TEXT NOT NULL)")
+    scratch.execute("CREATE TABLE buckets (key INTEGER NOT NULL, card_id INTEGER NOT NULL)")
+    with db.get_connection(read_only=True) as conn:
+        batch = []
+        for card_id, text in _card_texts(conn.cursor(), deck_id):
+            report.scanned += 1
+            batch.append((card_id, text))
+            if len(batch) == SCAN_FETCH_SIZE:
+                _add_signatures(scratch, batch)
+                batch = []
+        _add_signatures(scratch, batch)
+    
+    # Each card is compared with the smallest card id of every bucket it
+    # is in, rather than with every other member
+    pairs = set()
+    for members, in scratch.execute(
+        "SELECT group_concat(card_id) FROM buckets GROUP BY key HAVING COUNT(*) > 1"
+    ):
+        ids = sorted({int(card_id) for card_id in members.split(",")})
+        pairs.update((ids[0], other) for other in ids[1:])
+    report.candidates = len(pairs)
+    
+    involved = sorted({card_id for pair in pairs for card_id in pair})
+    texts = dict(scratch.execute(
+        "SELECT card_id, text FROM texts WHERE card_id IN (SELECT value FROM json_each(?))",
+        (json.dumps(involved),)
+    ))
+    scratch.close()
+    sets = {card_id: shingles(text, loose=True) for card_id, text in texts.items()}
+    
+    parent: Dict[int, int] = {}
+    similarity: Dict[int, float] = {}
+    
+    def root(card_id: int) -> int:
+        while card_id in parent:
+            # Path halving keeps chains short
+            grandparent = parent.get(parent[card_id], parent[card_id])
+            parent[card_id] = grandparent
+            card_id = grandparent
+        return card_id
+    
+    for first, other in sorted(pairs):
+        score = jaccard(sets[first], sets[other])
+        if score < threshold:
+            continue
+        a, b = root(first), root(other)
+        if a != b:
+            low, high = min(a, b), max(a, b)
+            parent[high] = low
+            similarity[low] = min(similarity.get(low, 1.0), similarity.pop(high, 1.0), score)
+        else:
+            similarity[a] = min(similarity.get(a, 1.0), score)
+    
+    groups: Dict[int, List[int]] = {}
+    for card_id in list(parent):
+        groups.setdefault(root(card_id), []).append(card_id)
+    for first, members in sorted(groups.items()):
+        card_ids = [first] + sorted(members)
+        report.groups.append(DuplicateGroup(card_ids=card_ids, similarity=similarity.get(first, 1.0)))
+    report.duration = time.perf_counter() - start
+    return report
+
+
+def _add_signatures(scratch: sqlite3.Connection, batch: List[Tuple[int, str]]) -> None:
+    """Store loosely normalized texts and their LSH bucket keys in the scratch database."""
+    batch = [(card_id, _loose(text)) for card_id, text in batch]
+    scratch.executemany("INSERT INTO texts (card_id, text) VALUES (?, ?)", batch)
+    scratch.executemany(
+        "INSERT INTO buckets (key, card_id) VALUES (?, ?)",
+        ((key, card_id) for card_id, text in batch for key in band_keys(shingles(text, loose=True)))
+    )
@@ -0,0 +1,131 @@
+"""Write-behind queue for cards entered faster than they should be saved one by one.
+
+Rapid entry and pasted tables hand their cards to an EntryQueue, which
+returns at once. A worker thread calls flush() every second or so to
+write everything queued since, in one transaction per deck and kind of
+card (Card.bulk_create and Note.bulk_create), so typing never waits for
+the database. Duplicates are left out as in an import.
+
+A queue writes to the collection that was active when it was made, even
+if another profile has been activated by the time it is flushed.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src.database.db import Database, get_db
+from src.models.card import Card
+from src.models.note import CLOZE_TYPE, Note, NoteType, cloze_numbers
+
+# Queued cards at which a flush is worth starting before the next tick
+BATCH_SIZE = 50
+
+# Seconds between flushes of whatever was queued meanwhile
+FLUSH_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class EntryCounts:
+    """Progress of a queue, for a live counter.
+    
+    Attributes:
+        pending: Entries queued or being written
+        saved: Cards written; a cloze entry may make several
+        duplicates: Cards left out because the deck already had them
+    """
+    pending: int = 0
+    saved: int = 0
+    duplicates: int = 0
+
+
+class EntryQueue:
+    """Cards waiting to be written in the background.
+    
+    Thread-safe: cards are added on the UI thread while a worker flushes,
+    and flushes started from several workers run one at a time.
+    """
+    
+    def __init__(self, db: Optional[Database] = None):
+        """
+        Args:
+            db: Collection the cards go to. Defaults to the global instance.
+        """
+        self.db = db or get_db()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # (deck id, front, back, tags) in entry order
+        self._queued: List[Tuple[int, str, str, str]] = []
+        self._writing = 0
+        self._saved = 0
+        self._duplicates = 0
+    
+    def add(self, deck_id: int, front: str, back: str, tags: str = "") -> None:
+        """Queue one card; a front with cloze deletions becomes a Cloze note."""
+        with self._lock:
+            self._queued.append((deck_id, front, back, tags))
+    
+    def extend(self, deck_id: int, rows: List[Tuple[str, str, str]]) -> None:
+        """Queue (front, back, tags) rows for one deck."""
+        with self._lock:
+            self._queued.extend((deck_id, front, back, tags) for front, back, tags in rows)
+    
+    @property
+    def queued(self) -> int:
+        """Entries not yet picked up by a flush."""
+        return len(self._queued)
+    
+    def counts(self) -> EntryCounts:
+        """Current progress."""
+        with self._lock:
+            return EntryCounts(len(self._queued) + self._writing, self._saved, self._duplicates)
+    
+    def flush(self) -> int:
+        """Write every queued card.
+        
+        Returns:
+            Number of cards created
+        
+        Raises:
+            Whatever the write raised. The entries not yet written go back
+            to the front of the queue for the next flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queued = self._queued, []
+                self._writing = len(batch)
+            
+            groups: Dict[Tuple[int, bool], List[Tuple[str, str, str]]] = {}
+            for deck_id, front, back, tags in batch:
+                groups.setdefault((deck_id, bool(cloze_numbers(front))), []).append((front, back, tags))
+            
+            created = 0
+            for (deck_id, cloze), rows in list(groups.items()):
+                try:
+                    saved, duplicates = _write(self.db, deck_id, cloze, rows)
+                except Exception:
+                    with self._lock:
+                        self._queued[:0] = [
+                            entry for entry in batch
+                            if (entry[0], bool(cloze_numbers(entry[1]))) in groups
+                        ]
+                        self._writing = 0
+                    raise
+                del groups[(deck_id, cloze)]
+                created += saved
+                with self._lock:
+                    self._writing -= len(rows)
+                    self._saved += saved
+                    self._duplicates += duplicates
+            return created
+
+
+def _write(db: Database, deck_id: int, cloze: bool, rows: List[Tuple[str, str, str]]) -> Tuple[int, int]:
+    """Create a group of cards, returning the cards created and left out as duplicates."""
+    if not cloze:
+        created = Card.bulk_create(deck_id, rows, db=db)
+        return created, len(rows) - created
+    
+    note_type = NoteType.get_by_name(CLOZE_TYPE, db=db)
+    notes = [([front, back], tags) for front, back, tags in rows]
+    created = Note.bulk_create(note_type, deck_id, notes, db=db)
+    return created, sum(len(note_type.card_ordinals(fields)) for fields, _ in notes) - created
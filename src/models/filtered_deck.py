@@ -0,0 +1,247 @@
+"""Filtered deck model for TextuAnki.
+
+A filtered deck is a saved search. Its definition compiles to one
+parameterized query over the indexed card and review columns, and the
+matching cards are read a page at a time when studied, so they are never
+moved out of their home decks.
+"""
+import functools
+import json
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from src.database.db import get_db, retry_on_locked
+from src.database.oplog import FILTERED_DECK, log_change, publish_changes
+from src.models.card import Card
+from src.models.deck import SUBTREE_CTE
+from src.models.note import render_note_cards
+
+# Cards read per page while studying a filtered deck
+PAGE_SIZE = 200
+
+# Sort orders a filtered deck can use
+ORDER_DUE = "due"
+ORDER_ADDED = "added"
+ORDER_LAPSES = "lapses"
+
+# Sort key and unique tie-breaker of each order. Both come from the same
+# index where possible, so a page is an index seek rather than a sort.
+_ORDER_KEYS = {
+    ORDER_DUE: ("r.due_date", "r.id"),
+    ORDER_ADDED: ("c.id", "c.id"),
+    ORDER_LAPSES: ("-r.lapses", "r.id"),
+}
+
+
+@dataclass(frozen=True)
+class FilterDefinition:
+    """Search criteria of a filtered deck. All criteria must match.
+    
+    Attributes:
+        deck_id: Deck whose subtree is searched, None for all decks
+        tags: Tags a card must all have
+        due_within_days: Due in at most this many days, None for any due date
+        min_lapses: Failed at least this many times
+        text: Substring of the front or back, or of a note's fields
+        limit: Maximum number of cards
+        order: ORDER_DUE, ORDER_ADDED or ORDER_LAPSES. Ordering by lapses
+            only includes cards that have lapsed.
+    """
+    deck_id: Optional[int] = None
+    tags: Tuple[str, ...] = ()
+    due_within_days: Optional[int] = 0
+    min_lapses: int = 0
+    text: str = ""
+    limit: int = 1000
+    order: str = ORDER_DUE
+    
+    def to_json(self) -> str:
+        """Serialize for the ``filtered_decks.definition`` column."""
+        return json.dumps(asdict(self))
+    
+    @classmethod
+    def from_json(cls, text: str) -> "FilterDefinition":
+        """Load a definition saved with to_json()."""
+        data = json.loads(text)
+        data["tags"] = tuple(data.get("tags", ()))
+        return cls(**data)
+
+
+def _escape_like(text: str) -> str:
+    """Text matched literally by a LIKE pattern with ESCAPE '\\'."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@functools.lru_cache(maxsize=64)
+def compile_filter(definition: FilterDefinition) -> Tuple[str, Tuple]:
+    """Compile a definition to a keyset-paged query and its fixed parameters.
+    
+    The query takes the fixed parameters followed by the time the study
+    session started (cards reviewed since are left out), the sort key of
+    the last row of the previous page, that sort key and tie-breaker
+    again, and the page size.
+    """
+    if definition.order not in _ORDER_KEYS:
+        raise ValueError(f"Unknown filtered deck order: {definition.order}")
+    sort_key, tie_breaker = _ORDER_KEYS[definition.order]
+    
+    query = ""
+    conditions = []
+    params: List = []
+    if definition.deck_id is not None:
+        query += f"WITH RECURSIVE {SUBTREE_CTE} "
+        conditions.append("c.deck_id IN subtree")
+        params += [definition.deck_id, definition.deck_id]
+    
+    query += f"""
+        SELECT c.*, {sort_key} AS sort_key, {tie_breaker} AS tie_breaker FROM cards c
+        JOIN reviews r ON r.card_id = c.id
+    """
+    if definition.due_within_days is not None:
+        conditions.append("r.due_date <= datetime('now', ?)")
+        params.append(f"+{int(definition.due_within_days)} days")
+    if definition.min_lapses > 0 or definition.order == ORDER_LAPSES:
+        # Lets SQLite use the partial index of lapsed cards
+        conditions.append("r.lapses >= ? AND r.lapses > 0")
+        params.append(definition.min_lapses)
+    for tag in definition.tags:
+        # Tags are stored comma-separated, with or without spaces
+        conditions.append(
+            "(',' || replace(replace(c.tags, ', ', ','), ' ,', ',') || ',') LIKE ? ESCAPE '\\'"
+        )
+        params.append(f"%,{_escape_like(tag.strip())},%")
+    if definition.text:
+        # Cards of a note have no text of their own; their note's fields do
+        conditions.append(
+            "(c.front LIKE ? ESCAPE '\\' OR c.back LIKE ? ESCAPE '\\'"
+            " OR c.note_id IN (SELECT id FROM notes WHERE fields LIKE ? ESCAPE '\\'))"
+        )
+        params += [f"%{_escape_like(definition.text)}%"] * 3
+    
+    # Answering a card moves its due date past the pages already read
+    conditions.append("(r.last_review IS NULL OR r.last_review < ?)")
+    # The separate range test lets SQLite seek the sort key's index
+    conditions.append(f"{sort_key} >= ? AND ({sort_key}, {tie_breaker}) > (?, ?)")
+    query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {sort_key}, {tie_breaker} LIMIT ?"
+    return query, tuple(params)
+
+
+@dataclass
+class FilteredDeck:
+    """A saved search that can be studied like a deck."""
+    id: Optional[int]
+    name: str
+    definition: FilterDefinition = field(default_factory=FilterDefinition)
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    @classmethod
+    def _from_row(cls, row) -> "FilteredDeck":
+        """Build a filtered deck from a ``filtered_decks`` row."""
+        return cls(
+            id=row["id"],
+            name=row["name"],
+            definition=FilterDefinition.from_json(row["definition"]),
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"])
+        )
+    
+    @classmethod
+    @retry_on_locked
+    def create(cls, name: str, definition: FilterDefinition) -> "FilteredDeck":
+        """Save a new filtered deck."""
+        compile_filter(definition)
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO filtered_decks (name, definition) VALUES (?, ?)",
+                (name, definition.to_json())
+            )
+            filtered_id = cursor.lastrowid
+            log_change(cursor, FILTERED_DECK, "create", [filtered_id], name=name)
+            conn.commit()
+        publish_changes(db)
+        
+        return cls.get_by_id(filtered_id)
+    
+    @classmethod
+    def get_by_id(cls, filtered_id: int) -> Optional["FilteredDeck"]:
+        """Retrieve a filtered deck by ID."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM filtered_decks WHERE id = ?", (filtered_id,))
+            row = cursor.fetchone()
+            
+            if row:
+                return cls._from_row(row)
+        return None
+    
+    @classmethod
+    def get_all(cls) -> List["FilteredDeck"]:
+        """Retrieve all filtered decks."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM filtered_decks ORDER BY name")
+            return [cls._from_row(row) for row in cursor.fetchall()]
+    
+    @retry_on_locked
+    def update(self) -> None:
+        """Update the filtered deck in the database."""
+        compile_filter(self.definition)
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE filtered_decks
+                   SET name = ?, definition = ?, updated_at = CURRENT_TIMESTAMP
+                   WHERE id = ?""",
+                (self.name, self.definition.to_json(), self.id)
+            )
+            log_change(cursor, FILTERED_DECK, "update", [self.id], name=self.name)
+            conn.commit()
+        publish_changes(db)
+    
+    @retry_on_locked
+    def delete(self) -> None:
+        """Delete the filtered deck. Its cards are not affected."""
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM filtered_decks WHERE id = ?", (self.id,))
+            log_change(cursor, FILTERED_DECK, "delete", [self.id])
+            conn.commit()
+        publish_changes(db)
+    
+    def iter_pages(self, page_size: int = PAGE_SIZE) -> Iterator[List[Card]]:
+        """Yield the matching cards a page at a time, up to the definition's limit.
+        
+        Each page is a separate keyset query, so no connection is held
+        open between pages and the first page is available immediately.
+        Cards reviewed after the first page was read are skipped, so an
+        answered card is not served again by a later page.
+        """
+        query, params = compile_filter(self.definition)
+        started = datetime.now().isoformat()
+        remaining = self.definition.limit
+        last_key: Tuple = ("", 0) if self.definition.order == ORDER_DUE else (float("-inf"), 0)
+        
+        db = get_db()
+        while remaining > 0:
+            with db.get_connection(read_only=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    query, (*params, started, last_key[0], *last_key, min(page_size, remaining))
+                )
+                rows = cursor.fetchall()
+                cards = [Card._from_row(row) for row in rows]
+                render_note_cards(cursor, cards)
+            if not rows:
+                return
+            remaining -= len(rows)
+            last_key = (rows[-1]["sort_key"], rows[-1]["tie_breaker"])
+            yield cards
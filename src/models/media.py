@@ -0,0 +1,323 @@
+"""Media model for TextuAnki: images and audio referenced from cards.
+
+Cards reference media the way Anki does, with ``<img src="NAME">`` for
+images and ``[sound:NAME]`` for audio. Files are stored once, named by
+the SHA-256 of their contents, under ``media/<collection>/`` next to the
+database file, so a file used by thousands of cards is stored once. The
+``media`` table counts the cards linking to each file; unreferenced
+files are removed by collect_garbage().
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.database.db import Database, get_db, retry_on_locked
+
+IMAGE_REFERENCE = re.compile(r"""<img\b[^>]*?\bsrc\s*=\s*["']?([^"'>\s]+)""", re.IGNORECASE)
+SOUND_REFERENCE = re.compile(r"\[sound:([^\]]+)\]")
+IMAGE_TAG = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+
+# Cheap test run before the reference patterns, since most cards have no media
+_MAY_REFERENCE = re.compile(r"<img|\[sound:", re.IGNORECASE)
+
+# Names of stored files: content hash plus the original extension
+_STORED_NAME = re.compile(r"^[0-9a-f]{64}(\.[0-9a-z]+)?$")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# External programs tried, in order, to play audio and to show images
+AUDIO_PLAYERS = (
+    ("mpv", "--no-video", "--really-quiet"),
+    ("ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet"),
+    ("afplay",),
+    ("paplay",),
+)
+IMAGE_VIEWERS = (("xdg-open",), ("open",))
+
+
+def media_dir(db: Optional[Database] = None) -> Path:
+    """Directory holding a collection's media files."""
+    db = db or get_db()
+    return db.db_path.parent / "media" / db.db_path.stem
+
+
+def media_path(name: str, db: Optional[Database] = None) -> Path:
+    """Where a stored file lives, sharded by the first two hash digits."""
+    return media_dir(db) / name[:2] / name
+
+
+def references(text: str) -> List[str]:
+    """Names of the media files a card text references, in order, without duplicates."""
+    if not text or not _MAY_REFERENCE.search(text):
+        return []
+    found = IMAGE_REFERENCE.findall(text) + SOUND_REFERENCE.findall(text)
+    return list(dict.fromkeys(name.strip() for name in found))
+
+
+def placeholders(text: str) -> str:
+    """Replace media references with short labels, for display in the terminal."""
+    if not text or not _MAY_REFERENCE.search(text):
+        return text
+    text = IMAGE_TAG.sub("🖼 image", text)
+    return SOUND_REFERENCE.sub("🔊 audio", text)
+
+
+def is_sound(name: str) -> bool:
+    """Whether a media file is audio, judging by its extension."""
+    return Path(name).suffix.lower() in (".mp3", ".ogg", ".wav", ".m4a", ".flac", ".opus", ".aac")
+
+
+def link_media(cursor: sqlite3.Cursor, cards: Iterable[Tuple[int, str]], replace: bool = True) -> None:
+    """Record which media files cards reference, in the caller's write transaction.
+    
+    Args:
+        cursor: Cursor of the transaction writing the cards
+        cards: (card id, front and back text) pairs
+        replace: Drop the cards' existing links first; False for new cards
+    """
+    card_ids = []
+    links = []
+    for card_id, text in cards:
+        card_ids.append(card_id)
+        links.extend((card_id, name) for name in references(text))
+    
+    if replace and card_ids:
+        cursor.execute(
+            "DELETE FROM card_media WHERE card_id IN (SELECT value FROM json_each(?))",
+            (json.dumps(card_ids),)
+        )
+    if links:
+        cursor.executemany("INSERT OR IGNORE INTO card_media (card_id, name) VALUES (?, ?)", links)
+
+
+@dataclass
+class MediaCheckReport:
+    """Outcome of a media check."""
+    files: int = 0
+    links: int = 0
+    missing: List[str] = field(default_factory=list)
+    unused: int = 0
+    
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        return (
+            f"{self.files} media files, {self.links} references, "
+            f"{len(self.missing)} missing, {self.unused} unused"
+        )
+
+
+@dataclass
+class Media:
+    """A stored media file."""
+    name: str
+    size: int
+    refcount: int = 0
+    created_at: Optional[datetime] = None
+    
+    @classmethod
+    def _from_row(cls, row) -> "Media":
+        """Build a media file from a ``media`` row."""
+        return cls(
+            name=row["name"],
+            size=row["size"],
+            refcount=row["refcount"],
+            created_at=datetime.fromisoformat(row["created_at"])
+        )
+    
+    @property
+    def path(self) -> Path:
+        """Location of the file in the active collection's store."""
+        return media_path(self.name)
+    
+    @property
+    def reference(self) -> str:
+        """Markup that shows or plays this file on a card."""
+        return f"[sound:{self.name}]" if is_sound(self.name) else f'<img src="{self.name}">'
+    
+    @classmethod
+    def add_file(cls, source: Path) -> "Media":
+        """Store a file, or find the identical file already stored.
+        
+        The file is hashed while streaming, so large files are never read
+        into memory, and only copied when its content is new.
+        """
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        name = digest.hexdigest() + source.suffix.lower()
+        
+        path = media_path(name)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f".{name}.tmp")
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, path)
+        return cls._register(name, path.stat().st_size)
+    
+    @classmethod
+    @retry_on_locked
+    def _register(cls, name: str, size: int) -> "Media":
+        """Add a stored file's row, counting cards that already reference it."""
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """INSERT INTO media (name, size, refcount)
+                   VALUES (?, ?, (SELECT COUNT(*) FROM card_media WHERE name = ?))
+                   ON CONFLICT (name) DO NOTHING""",
+                (name, size, name)
+            )
+            conn.commit()
+        return cls.get(name)
+    
+    @classmethod
+    def get(cls, name: str) -> Optional["Media"]:
+        """Look up a stored file by name."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM media WHERE name = ?", (name,))
+            row = cursor.fetchone()
+            return cls._from_row(row) if row else None
+    
+    @classmethod
+    def import_references(cls, text: str, base_dir: Path, stored: Dict[Path, str]) -> str:
+        """Store local files a text references and point the text at the stored copies.
+        
+        References are resolved against ``base_dir``. Names that are
+        already stored, do not exist as files or lead outside ``base_dir``
+        (absolute paths, ``..``, symlinks) are left alone, so an imported
+        deck cannot pull arbitrary files into the collection.
+        
+        Args:
+            text: Card text
+            base_dir: Directory relative references are resolved against
+            stored: Cache of file path -> stored name shared across calls,
+                so a file referenced by many cards is hashed once
+        """
+        if not text or not _MAY_REFERENCE.search(text):
+            return text
+        root = base_dir.resolve()
+        
+        def store(match: "re.Match[str]") -> str:
+            name = match.group(1).strip()
+            if _STORED_NAME.match(name):
+                return match.group(0)
+            source = (root / name).resolve()
+            if root not in source.parents:
+                return match.group(0)
+            if source not in stored:
+                if not source.is_file():
+                    return match.group(0)
+                stored[source] = cls.add_file(source).name
+            # Only the name inside this reference is rewritten
+            start, end = match.start(1) - match.start(), match.end(1) - match.start()
+            return match.group(0)[:start] + stored[source] + match.group(0)[end:]
+        
+        text = IMAGE_REFERENCE.sub(store, text)
+        return SOUND_REFERENCE.sub(store, text)
+    
+    @classmethod
+    @retry_on_locked
+    def check(cls) -> MediaCheckReport:
+        """Rebuild card links from card and note texts and report missing and unused files.
+        
+        Links of cards written without going through the Card model, such
+        as cards received by sync, are brought up to date here.
+        """
+        report = MediaCheckReport()
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("DELETE FROM card_media")
+            cursor.execute(
+                """SELECT id, front || char(10) || back FROM cards
+                   WHERE front LIKE '%<img%' OR back LIKE '%<img%'
+                      OR front LIKE '%[sound:%' OR back LIKE '%[sound:%'"""
+            )
+            link_media(cursor, cursor.fetchall(), replace=False)
+            cursor.execute(
+                """SELECT c.id, n.fields FROM cards c JOIN notes n ON n.id = c.note_id
+                   WHERE n.fields LIKE '%<img%' OR n.fields LIKE '%[sound:%'"""
+            )
+            link_media(
+                cursor,
+                [(card_id, "\n".join(json.loads(fields))) for card_id, fields in cursor.fetchall()],
+                replace=False
+            )
+            # Recount, since files might have been stored after their links
+            cursor.execute(
+                "UPDATE media SET refcount = (SELECT COUNT(*) FROM card_media WHERE name = media.name)"
+            )
+            
+            report.links = cursor.execute("SELECT COUNT(*) FROM card_media").fetchone()[0]
+            report.unused = cursor.execute("SELECT COUNT(*) FROM media WHERE refcount = 0").fetchone()[0]
+            cursor.execute("SELECT name FROM media")
+            names = [row[0] for row in cursor.fetchall()]
+            report.files = len(names)
+            report.missing = sorted(
+                {row[0] for row in cursor.execute(
+                    "SELECT DISTINCT name FROM card_media WHERE name NOT IN (SELECT name FROM media)"
+                )} | {name for name in names if not media_path(name, db).exists()}
+            )
+            conn.commit()
+        return report
+    
+    @classmethod
+    @retry_on_locked
+    def collect_garbage(cls) -> int:
+        """Delete stored files no card references.
+        
+        Returns:
+            Number of files deleted
+        """
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT name FROM media WHERE refcount <= 0")
+            names = [row[0] for row in cursor.fetchall()]
+            cursor.execute("DELETE FROM media WHERE refcount <= 0")
+            conn.commit()
+        
+        for name in names:
+            media_path(name, db).unlink(missing_ok=True)
+        return len(names)
+
+
+def open_externally(name: str) -> Optional[str]:
+    """Play or show a stored media file with a system program, without waiting for it.
+    
+    Returns:
+        None on success, otherwise why the file could not be opened
+    """
+    path = media_path(name)
+    if not path.exists():
+        return f"Media file missing: {name}"
+    
+    if sys.platform == "win32":
+        os.startfile(path)
+        return None
+    for command in AUDIO_PLAYERS if is_sound(name) else IMAGE_VIEWERS:
+        if shutil.which(command[0]):
+            subprocess.Popen(
+                [*command, str(path)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+            return None
+    kind = "audio player" if is_sound(name) else "image viewer"
+    return f"No {kind} found to open {name}"
@@ -0,0 +1,538 @@
+"""Note model for TextuAnki: cards generated from fields and templates.
+
+A note holds the fields of one fact, and its note type names the fields
+and lists card templates. A standard note type generates one card per
+template whose question shows some of the note's content; a cloze note
+type generates one card per cloze number (``{{c1::...}}``,
+``{{c2::...}}``). Cards keep their scheduling state and a pointer to
+their note, but no text: their sides are rendered from the note when
+cards are loaded, so a note with four clozes stores its text once.
+
+Templates use a small subset of Anki's syntax: ``{{Field}}``,
+``{{cloze:Field}}``, ``{{FrontSide}}`` on the back, and sections shown
+only when a field is non-empty (``{{#Field}}...{{/Field}}``) or empty
+(``{{^Field}}...{{/Field}}``).
+"""
+import json
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.database.db import Database, get_db, retry_on_locked
+from src.database.oplog import CARD, NOTE, log_change, publish_changes
+from src.models.duplicates import DuplicateCardError, content_hash, existing_hashes, find_duplicate_id
+from src.models.media import link_media
+
+KIND_STANDARD = "standard"
+KIND_CLOZE = "cloze"
+
+# Note types every collection starts with
+BASIC = "Basic"
+BASIC_AND_REVERSED = "Basic (and reversed card)"
+CLOZE_TYPE = "Cloze"
+
+CLOZE = re.compile(r"\{\{c(\d+)::(.*?)(?:::(.*?))?\}\}", re.DOTALL)
+
+_SECTION = re.compile(r"\{\{([#^])\s*([^}]+?)\s*\}\}(.*?)\{\{/\s*\2\s*\}\}", re.DOTALL)
+_FIELD = re.compile(r"\{\{\s*(?:(cloze):)?\s*([^#^/}][^}]*?)\s*\}\}")
+_CLOZE_FIELD = re.compile(r"\{\{\s*cloze:\s*([^}]+?)\s*\}\}")
+
+
+def cloze_numbers(text: str) -> List[int]:
+    """Distinct cloze numbers used in a text, in ascending order."""
+    if "{{c" not in text:
+        return []
+    return sorted({int(match.group(1)) for match in CLOZE.finditer(text)})
+
+
+def _keep_cloze(text: str, number: Optional[int]) -> str:
+    """Reveal every cloze deletion but those numbered ``number``."""
+    if number is None or "{{c" not in text:
+        return text
+    return CLOZE.sub(
+        lambda match: match.group(0) if int(match.group(1)) == number else match.group(2), text
+    )
+
+
+def render_template(
+    template: str,
+    fields: Dict[str, str],
+    number: Optional[int] = None,
+    front_side: str = "",
+) -> str:
+    """Fill a card template with a note's fields.
+    
+    Args:
+        template: Template text
+        fields: Field name -> value
+        number: Cloze number the card tests; ``{{cloze:Field}}`` keeps
+            only its deletions and shows the text of the others
+        front_side: Rendered question, substituted for ``{{FrontSide}}``
+    """
+    def section(match: re.Match) -> str:
+        kind, name, body = match.groups()
+        present = bool(fields.get(name, "").strip())
+        return body if present == (kind == "#") else ""
+    
+    previous = None
+    while previous != template:
+        previous, template = template, _SECTION.sub(section, template)
+    
+    def field(match: re.Match) -> str:
+        modifier, name = match.groups()
+        if name == "FrontSide":
+            return front_side
+        value = fields.get(name, "")
+        return _keep_cloze(value, number) if modifier == "cloze" else value
+    return _FIELD.sub(field, template)
+
+
+@dataclass
+class Template:
+    """A card template: the question and answer built from a note's fields."""
+    name: str
+    front: str
+    back: str
+
+
+@dataclass
+class NoteType:
+    """Field names and card templates shared by notes."""
+    id: Optional[int]
+    name: str
+    kind: str
+    fields: List[str]
+    templates: List[Template]
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    @classmethod
+    def _from_row(cls, row) -> "NoteType":
+        """Build a note type from a ``note_types`` row."""
+        return cls(
+            id=row["id"],
+            name=row["name"],
+            kind=row["kind"],
+            fields=json.loads(row["fields"]),
+            templates=[Template(**template) for template in json.loads(row["templates"])],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"])
+        )
+    
+    @property
+    def is_cloze(self) -> bool:
+        """Whether notes of this type generate a card per cloze number."""
+        return self.kind == KIND_CLOZE
+    
+    def cloze_fields(self) -> List[str]:
+        """Fields the question template reads cloze deletions from."""
+        names = _CLOZE_FIELD.findall(self.templates[0].front) if self.templates else []
+        return names or self.fields[:1]
+    
+    def card_ordinals(self, fields: Sequence[str]) -> List[int]:
+        """Ordinals of the cards a note with these fields generates.
+        
+        A template generates a card when its question shows some of the
+        note's content, i.e. renders differently than with empty fields.
+        """
+        values = dict(zip(self.fields, fields))
+        if self.is_cloze:
+            numbers = set()
+            for name in self.cloze_fields():
+                numbers.update(cloze_numbers(values.get(name, "")))
+            return sorted(numbers)
+        
+        empty = dict.fromkeys(self.fields, "")
+        ordinals = []
+        for ordinal, template in enumerate(self.templates):
+            question = render_template(template.front, values)
+            if question.strip() and question != render_template(template.front, empty):
+                ordinals.append(ordinal)
+        return ordinals
+    
+    def render(self, fields: Sequence[str], ordinal: int) -> Tuple[str, str]:
+        """Front and back text of one of a note's cards."""
+        values = dict(zip(self.fields, fields))
+        if self.is_cloze:
+            template, number = self.templates[0], ordinal
+        elif 0 <= ordinal < len(self.templates):
+            template, number = self.templates[ordinal], None
+        else:
+            return "", ""
+        front = render_template(template.front, values, number)
+        return front, render_template(template.back, values, number, front_side=front)
+    
+    @classmethod
+    @retry_on_locked
+    def create(
+        cls,
+        name: str,
+        fields: List[str],
+        templates: List[Template],
+        kind: str = KIND_STANDARD,
+    ) -> "NoteType":
+        """Create a new note type."""
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO note_types (name, kind, fields, templates) VALUES (?, ?, ?, ?)",
+                (name, kind, json.dumps(fields, ensure_ascii=False),
+                 json.dumps([vars(template) for template in templates], ensure_ascii=False))
+            )
+            note_type_id = cursor.lastrowid
+            conn.commit()
+        return cls.get_by_id(note_type_id)
+    
+    @classmethod
+    def get_by_id(cls, note_type_id: int) -> Optional["NoteType"]:
+        """Retrieve a note type by ID."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            row = conn.execute("SELECT * FROM note_types WHERE id = ?", (note_type_id,)).fetchone()
+            return cls._from_row(row) if row else None
+    
+    @classmethod
+    def get_by_name(cls, name: str, db: Optional[Database] = None) -> Optional["NoteType"]:
+        """Retrieve a note type by name, from ``db`` or the global instance."""
+        db = db or get_db()
+        with db.get_connection(read_only=True) as conn:
+            row = conn.execute("SELECT * FROM note_types WHERE name = ?", (name,)).fetchone()
+            return cls._from_row(row) if row else None
+    
+    @classmethod
+    def get_all(cls) -> List["NoteType"]:
+        """Retrieve all note types."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            rows = conn.execute("SELECT * FROM note_types ORDER BY name").fetchall()
+            return [cls._from_row(row) for row in rows]
+
+
+def render_note_cards(cursor: sqlite3.Cursor, cards: Iterable) -> None:
+    """Fill in the front and back of loaded cards that belong to a note.
+    
+    Notes and their types are read with one query however many cards
+    there are, and each note type is parsed once.
+    
+    Args:
+        cursor: Cursor of the connection the cards were read with
+        cards: Cards, of which those with a note_id are filled in
+    """
+    cards = [card for card in cards if card.note_id is not None]
+    if not cards:
+        return
+    
+    cursor.execute(
+        """SELECT n.id AS note_id, n.fields AS note_fields, t.* FROM notes n
+           JOIN note_types t ON t.id = n.note_type_id
+           WHERE n.id IN (SELECT value FROM json_each(?))""",
+        (json.dumps(list({card.note_id for card in cards})),)
+    )
+    note_types: Dict[int, NoteType] = {}
+    notes: Dict[int, Tuple[NoteType, List[str]]] = {}
+    for row in cursor.fetchall():
+        note_type = note_types.get(row["id"])
+        if note_type is None:
+            note_type = note_types[row["id"]] = NoteType._from_row(row)
+        notes[row["note_id"]] = (note_type, json.loads(row["note_fields"]))
+    
+    for card in cards:
+        note = notes.get(card.note_id)
+        if note is not None:
+            card.front, card.back = note[0].render(note[1], card.ordinal)
+
+
+def _add_cards(
+    cursor: sqlite3.Cursor,
+    note_id: int,
+    deck_id: int,
+    cards: Iterable[Tuple[int, int]],
+    tags: str,
+) -> List[int]:
+    """Insert new cards of a note, given as (ordinal, front hash), with their review records."""
+    card_ids = []
+    for ordinal, front_hash in cards:
+        cursor.execute(
+            """INSERT INTO cards (deck_id, front, back, tags, note_id, ordinal, content_hash)
+               VALUES (?, '', '', ?, ?, ?, ?)""",
+            (deck_id, tags, note_id, ordinal, front_hash)
+        )
+        card_ids.append(cursor.lastrowid)
+        cursor.execute("INSERT INTO reviews (card_id) VALUES (?)", (card_ids[-1],))
+    return card_ids
+
+
+def _front_hashes(note_type: NoteType, fields: List[str], ordinals: Iterable[int]) -> List[Tuple[int, int]]:
+    """(ordinal, front hash) of cards of a note, for duplicate checks."""
+    return [(ordinal, content_hash(note_type.render(fields, ordinal)[0])) for ordinal in ordinals]
+
+
+@dataclass
+class Note:
+    """The fields of one fact, from which its cards are generated."""
+    id: Optional[int]
+    note_type_id: int
+    fields: List[str]
+    tags: str = ""
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    @classmethod
+    def _from_row(cls, row) -> "Note":
+        """Build a note from a ``notes`` row."""
+        return cls(
+            id=row["id"],
+            note_type_id=row["note_type_id"],
+            fields=json.loads(row["fields"]),
+            tags=row["tags"] or "",
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"])
+        )
+    
+    @staticmethod
+    def _insert(
+        cursor: sqlite3.Cursor,
+        note_type: NoteType,
+        deck_id: int,
+        fields: List[str],
+        tags: str,
+        cards: List[Tuple[int, int]],
+    ) -> Tuple[int, List[int]]:
+        """Insert a note and its cards; returns the note id and card ids."""
+        cursor.execute(
+            "INSERT INTO notes (note_type_id, fields, tags) VALUES (?, ?, ?)",
+            (note_type.id, json.dumps(fields, ensure_ascii=False), tags)
+        )
+        note_id = cursor.lastrowid
+        card_ids = _add_cards(cursor, note_id, deck_id, cards, tags)
+        text = "\n".join(fields)
+        link_media(cursor, [(card_id, text) for card_id in card_ids], replace=False)
+        return note_id, card_ids
+    
+    @staticmethod
+    def _prepare(note_type: NoteType, fields: List[str]) -> Tuple[List[str], List[Tuple[int, int]]]:
+        """Pad fields to the note type and work out the cards they generate."""
+        fields = list(fields) + [""] * (len(note_type.fields) - len(fields))
+        return fields, _front_hashes(note_type, fields, note_type.card_ordinals(fields))
+    
+    @classmethod
+    @retry_on_locked
+    def create(
+        cls,
+        note_type: NoteType,
+        deck_id: int,
+        fields: List[str],
+        tags: str = "",
+        allow_duplicate: bool = False,
+    ) -> "Note":
+        """Create a note and the cards it generates.
+        
+        Args:
+            note_type: Type of the note
+            deck_id: Deck the cards are added to
+            fields: Field values in the order of ``note_type.fields``;
+                missing trailing fields are empty
+            tags: Comma-separated tags, given to every card
+            allow_duplicate: Create the note even if the deck has a card
+                with the same front as its first card
+        
+        Raises:
+            DuplicateCardError: If the note's first card is a duplicate
+        """
+        fields, cards = cls._prepare(note_type, fields)
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            if cards and not allow_duplicate:
+                existing_id = find_duplicate_id(cursor, deck_id, cards[0][1])
+                if existing_id is not None:
+                    raise DuplicateCardError(existing_id, note_type.render(fields, cards[0][0])[0])
+            note_id, card_ids = cls._insert(cursor, note_type, deck_id, fields, tags, cards)
+            log_change(cursor, NOTE, "create", [note_id])
+            log_change(cursor, CARD, "create", card_ids, deck_id=deck_id)
+            conn.commit()
+        publish_changes(db)
+        return cls.get_by_id(note_id)
+    
+    @classmethod
+    @retry_on_locked
+    def bulk_create(
+        cls,
+        note_type: NoteType,
+        deck_id: int,
+        rows: Iterable[Tuple[List[str], str]],
+        skip_duplicates: bool = True,
+        db: Optional[Database] = None,
+    ) -> int:
+        """Create many notes and their cards in a single transaction.
+        
+        Args:
+            note_type: Type of the notes
+            deck_id: Deck the cards are added to
+            rows: (fields, tags) tuples
+            skip_duplicates: Leave out notes whose first card's front is
+                already in the deck or earlier in ``rows``
+            db: Collection to write to. Defaults to the global instance.
+        
+        Returns:
+            Number of cards created
+        """
+        prepared = [(*cls._prepare(note_type, fields), tags) for fields, tags in rows]
+        db = db or get_db()
+        note_ids = []
+        card_ids = []
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            seen = set()
+            if skip_duplicates:
+                seen = existing_hashes(cursor, deck_id, [cards[0][1] for _, cards, _ in prepared if cards])
+            for fields, cards, tags in prepared:
+                if skip_duplicates and cards:
+                    if cards[0][1] in seen:
+                        continue
+                    seen.add(cards[0][1])
+                note_id, note_card_ids = cls._insert(cursor, note_type, deck_id, fields, tags, cards)
+                note_ids.append(note_id)
+                card_ids.extend(note_card_ids)
+            log_change(cursor, NOTE, "create", note_ids)
+            log_change(cursor, CARD, "create", card_ids, deck_id=deck_id)
+            conn.commit()
+        publish_changes(db)
+        return len(card_ids)
+    
+    @classmethod
+    def get_by_id(cls, note_id: int) -> Optional["Note"]:
+        """Retrieve a note by ID."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            row = conn.execute("SELECT * FROM notes WHERE id = ?", (note_id,)).fetchone()
+            return cls._from_row(row) if row else None
+    
+    @classmethod
+    def get_by_ids(cls, note_ids: Iterable[int]) -> Dict[int, "Note"]:
+        """Retrieve many notes with one query, keyed by ID."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            rows = conn.execute(
+                "SELECT * FROM notes WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(set(note_ids))),)
+            ).fetchall()
+            return {row["id"]: cls._from_row(row) for row in rows}
+    
+    def card_ids(self) -> List[int]:
+        """Ids of the note's cards, in ordinal order."""
+        db = get_db()
+        with db.get_connection(read_only=True) as conn:
+            rows = conn.execute(
+                "SELECT id FROM cards WHERE note_id = ? ORDER BY ordinal", (self.id,)
+            ).fetchall()
+            return [row[0] for row in rows]
+    
+    @retry_on_locked
+    def update(self, deck_id: Optional[int] = None) -> None:
+        """Save edited fields and tags, updating only the cards the edit affects.
+        
+        Cards whose template no longer generates a card (e.g. a removed
+        cloze number) are deleted with their history, newly generated
+        ones are added, and only cards whose rendered text changed are
+        marked as updated. Cards that are kept keep their scheduling.
+        
+        Args:
+            deck_id: Deck for added cards; defaults to the deck of the
+                note's first card
+        
+        Raises:
+            ValueError: If cards are added but the note has no card left
+                to take the deck from and no deck_id is given
+        """
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            row = cursor.execute(
+                """SELECT n.fields AS note_fields, n.tags AS note_tags, t.* FROM notes n
+                   JOIN note_types t ON t.id = n.note_type_id WHERE n.id = ?""",
+                (self.id,)
+            ).fetchone()
+            note_type = NoteType._from_row(row)
+            old_fields = json.loads(row["note_fields"])
+            self.fields = list(self.fields) + [""] * (len(note_type.fields) - len(self.fields))
+            
+            cursor.execute(
+                "SELECT ordinal, id, deck_id FROM cards WHERE note_id = ? ORDER BY ordinal", (self.id,)
+            )
+            existing = {ordinal: (card_id, card_deck_id) for ordinal, card_id, card_deck_id in cursor.fetchall()}
+            wanted = note_type.card_ordinals(self.fields)
+            removed = [card_id for ordinal, (card_id, _) in existing.items() if ordinal not in wanted]
+            added = [ordinal for ordinal in wanted if ordinal not in existing]
+            changed_ordinals = [
+                ordinal for ordinal in wanted
+                if ordinal in existing
+                and note_type.render(old_fields, ordinal) != note_type.render(self.fields, ordinal)
+            ]
+            changed = [existing[ordinal][0] for ordinal in changed_ordinals]
+            
+            cursor.execute(
+                "UPDATE notes SET fields = ?, tags = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (json.dumps(self.fields, ensure_ascii=False), self.tags, self.id)
+            )
+            if removed:
+                cursor.execute(
+                    "DELETE FROM cards WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(removed),)
+                )
+            card_ids = []
+            if added:
+                if deck_id is None:
+                    if not existing:
+                        raise ValueError("Note has no cards; a deck is needed for the new ones")
+                    deck_id = next(iter(existing.values()))[1]
+                card_ids = _add_cards(
+                    cursor, self.id, deck_id, _front_hashes(note_type, self.fields, added), self.tags
+                )
+            if changed:
+                cursor.executemany(
+                    """UPDATE cards SET content_hash = ?, updated_at = CURRENT_TIMESTAMP
+                       WHERE note_id = ? AND ordinal = ?""",
+                    [
+                        (front_hash, self.id, ordinal)
+                        for ordinal, front_hash in _front_hashes(note_type, self.fields, changed_ordinals)
+                    ]
+                )
+            if self.tags != (row["note_tags"] or ""):
+                cursor.execute("UPDATE cards SET tags = ? WHERE note_id = ?", (self.tags, self.id))
+            
+            text = "\n".join(self.fields)
+            kept = [card_id for card_id, _ in existing.values() if card_id not in removed]
+            link_media(cursor, [(card_id, text) for card_id in kept])
+            link_media(cursor, [(card_id, text) for card_id in card_ids], replace=False)
+            
+            log_change(cursor, NOTE, "update", [self.id])
+            if removed:
+                log_change(cursor, CARD, "delete", removed)
+            if card_ids:
+                log_change(cursor, CARD, "create", card_ids, deck_id=deck_id)
+            if changed:
+                log_change(cursor, CARD, "update", changed)
+            conn.commit()
+        publish_changes(db)
+    
+    @retry_on_locked
+    def delete(self) -> None:
+        """Delete the note; its cards are removed by ON DELETE CASCADE."""
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            card_ids = [
+                row[0] for row in cursor.execute("SELECT id FROM cards WHERE note_id = ?", (self.id,))
+            ]
+            cursor.execute("DELETE FROM notes WHERE id = ?", (self.id,))
+            log_change(cursor, NOTE, "delete", [self.id])
+            log_change(cursor, CARD, "delete", card_ids)
+            conn.commit()
+        publish_changes(db)
@@ -1,8 +1,25 @@
 """Review model and spaced repetition logic for TextuAnki."""
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
-from src.database.db import get_db
+from typing import Optional, Tuple
+from src.database.db import get_db, retry_on_locked
+from src.database.oplog import REVIEW, log_change, publish_changes
+
+# Ratings at or below this are a failed recall: the card lapses and is relearned
+LAPSE_RATING = 2
+
+
+@dataclass
+class ReviewUndo:
+    """What one recorded review changed, so it can be reverted."""
+    card_id: int
+    deck_id: int
+    previous: Tuple  # (ease_factor, interval, repetitions, due_date, last_review, lapses)
+    session_id: int
+    day: str
+    rating: int
+    duration_ms: int
+    was_new: bool
 
 
 @dataclass
@@ -15,6 +32,7 @@ class Review:
     repetitions: int = 0
     due_date: datetime = None
     last_review: Optional[datetime] = None
+    lapses: int = 0
     
     def __post_init__(self):
         if self.due_date is None:
@@ -37,11 +55,17 @@ class Review:
                     interval=row["interval"],
                     repetitions=row["repetitions"],
                     due_date=datetime.fromisoformat(row["due_date"]),
-                    last_review=datetime.fromisoformat(row["last_review"]) if row["last_review"] else None
+                    last_review=datetime.fromisoformat(row["last_review"]) if row["last_review"] else None,
+                    lapses=row["lapses"]
                 )
         return None
     
-    def record_review(self, rating: int) -> None:
+    def record_review(
+        self,
+        rating: int,
+        duration_ms: Optional[int] = None,
+        reveal_ms: Optional[int] = None
+    ) -> ReviewUndo:
         """
         Record a review and update spaced repetition data.
         
@@ -53,10 +77,19 @@ class Review:
                 3 = Correct, but difficult
                 4 = Correct, with hesitation
                 5 = Perfect recall
+            duration_ms: Time from showing the question to rating it
+            reveal_ms: Time from showing the question to revealing the answer
+        
+        Returns:
+            The information needed to undo this review with Review.undo()
         """
+        was_new = self.last_review is None
+        
         # SM-2 Algorithm
-        if rating < 3:
+        if rating <= LAPSE_RATING:
             # Failed recall - reset
+            if not was_new:
+                self.lapses += 1
             self.repetitions = 0
             self.interval = 1
         else:
@@ -76,25 +109,128 @@ class Review:
         self.due_date = datetime.now() + timedelta(days=self.interval)
         self.last_review = datetime.now()
         
-        # Save to database
+        return self._save(rating, duration_ms, reveal_ms, was_new)
+    
+    @retry_on_locked
+    def _save(
+        self,
+        rating: int,
+        duration_ms: Optional[int],
+        reveal_ms: Optional[int],
+        was_new: bool
+    ) -> ReviewUndo:
+        """Persist the scheduling state and log the study session."""
         db = get_db()
         with db.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Keep the stored state, exactly as written, for undo
+            cursor.execute(
+                """SELECT c.deck_id, r.ease_factor, r.interval, r.repetitions,
+                          r.due_date, r.last_review, r.lapses
+                   FROM reviews r JOIN cards c ON c.id = r.card_id
+                   WHERE r.card_id = ?""",
+                (self.card_id,)
+            )
+            deck_id, *previous = cursor.fetchone()
             
             # Update review data
             cursor.execute(
                 """UPDATE reviews 
                    SET ease_factor = ?, interval = ?, repetitions = ?,
-                       due_date = ?, last_review = ?
+                       due_date = ?, last_review = ?, lapses = ?
                    WHERE card_id = ?""",
                 (self.ease_factor, self.interval, self.repetitions,
-                 self.due_date.isoformat(), self.last_review.isoformat(), self.card_id)
+                 self.due_date.isoformat(), self.last_review.isoformat(), self.lapses,
+                 self.card_id)
             )
             
             # Record study session
+            reviewed_at = datetime.now().isoformat()
+            cursor.execute(
+                """INSERT INTO study_sessions (card_id, rating, duration, reveal_duration, reviewed_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (self.card_id, rating, duration_ms, reveal_ms, reviewed_at)
+            )
+            session_id = cursor.lastrowid
+            
+            # Keep the daily per-deck aggregates used by statistics current
             cursor.execute(
-                "INSERT INTO study_sessions (card_id, rating, reviewed_at) VALUES (?, ?, ?)",
-                (self.card_id, rating, datetime.now().isoformat())
+                """INSERT INTO review_stats
+                       (day, deck_id, reviews, new_cards, again, hard, good, easy, total_duration)
+                   SELECT ?, deck_id, 1, ?, ? <= 1, ? = 2, ? = 3, ? >= 4, ? FROM cards WHERE id = ?
+                   ON CONFLICT (day, deck_id) DO UPDATE SET
+                       reviews = reviews + 1,
+                       new_cards = new_cards + excluded.new_cards,
+                       again = again + excluded.again,
+                       hard = hard + excluded.hard,
+                       good = good + excluded.good,
+                       easy = easy + excluded.easy,
+                       total_duration = total_duration + excluded.total_duration""",
+                (reviewed_at[:10], int(was_new), rating, rating, rating, rating,
+                 duration_ms or 0, self.card_id)
             )
             
+            log_change(
+                cursor, REVIEW, "answer", [self.card_id],
+                deck_id=deck_id, rating=rating, due_date=self.due_date.isoformat()
+            )
+            conn.commit()
+        publish_changes(db)
+        
+        return ReviewUndo(
+            card_id=self.card_id,
+            deck_id=deck_id,
+            previous=tuple(previous),
+            session_id=session_id,
+            day=reviewed_at[:10],
+            rating=rating,
+            duration_ms=duration_ms or 0,
+            was_new=was_new
+        )
+    
+    @staticmethod
+    @retry_on_locked
+    def undo(entry: ReviewUndo) -> None:
+        """Revert a recorded review in a single transaction.
+        
+        Restores the card's previous scheduling state, deletes the study
+        session that was logged and takes it back out of the daily stats.
+        If the session was already synced, its deletion is recorded so the
+        next sync removes it from the other collections too.
+        """
+        db = get_db()
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE reviews
+                   SET ease_factor = ?, interval = ?, repetitions = ?,
+                       due_date = ?, last_review = ?, lapses = ?
+                   WHERE card_id = ?""",
+                (*entry.previous, entry.card_id)
+            )
+            # Deleting sessions leaves no grave otherwise, since archiving
+            # deletes them too and must not remove them elsewhere
+            cursor.execute(
+                """INSERT OR REPLACE INTO sync_graves (guid, table_name)
+                   SELECT guid, 'study_sessions' FROM study_sessions WHERE id = ? AND guid IS NOT NULL""",
+                (entry.session_id,)
+            )
+            cursor.execute("DELETE FROM study_sessions WHERE id = ?", (entry.session_id,))
+            cursor.execute(
+                """UPDATE review_stats
+                   SET reviews = reviews - 1,
+                       new_cards = new_cards - ?,
+                       again = again - (? <= 1),
+                       hard = hard - (? = 2),
+                       good = good - (? = 3),
+                       easy = easy - (? >= 4),
+                       total_duration = total_duration - ?
+                   WHERE day = ? AND deck_id = ?""",
+                (int(entry.was_new), entry.rating, entry.rating, entry.rating, entry.rating,
+                 entry.duration_ms, entry.day, entry.deck_id)
+            )
+            log_change(cursor, REVIEW, "undo", [entry.card_id], deck_id=entry.deck_id)
             conn.commit()
+        publish_changes(db)
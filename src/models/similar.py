@@ -0,0 +1,320 @@
+"""Lookup of existing cards similar to a card being written.
+
+The create screen asks this module for cards like the front being typed,
+on every pause in typing, so a lookup must take a few milliseconds even
+on collections of hundreds of thousands of cards. Card fronts (a note's
+first field) are split into character trigrams, after the same loose
+normalization as near-duplicate search, in an inverted index held in
+memory: trigram -> numbers of the documents containing it.
+
+A lookup counts the documents in the posting lists of the query's rarest
+trigrams only, up to a fixed number of entries. Rare trigrams are what
+tell cards apart; common ones such as " th" match a large part of the
+collection and would cost most of the time while ranking little. The
+best-counted candidates are then read from the database and scored
+exactly, so the work per keystroke does not grow with the collection.
+
+The index is built once per collection, off the UI thread, and follows
+the change log (src/database/oplog.py) from then on, so cards added,
+edited or deleted by this or any other process are picked up by the next
+lookup.
+"""
+import json
+import sqlite3
+import threading
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set
+
+from src.database.db import Database, get_db
+from src.database.oplog import CARD, COLLECTION, NOTE, changes_since
+from src.models.duplicates import SCAN_FETCH_SIZE, jaccard, shingles
+
+# Share of the query's trigrams a card must contain to be shown
+MIN_SCORE = 0.5
+
+# Posting entries counted per lookup, rarest trigrams first
+MAX_POSTINGS = 20000
+
+# Best-counted documents read back and scored exactly
+CANDIDATES = 40
+
+# Queries need at least this many trigrams, about as many characters
+MIN_QUERY_TRIGRAMS = 4
+
+# Rebuild when this share of the documents was replaced or deleted
+REBUILD_DEAD_RATIO = 0.25
+
+
+@dataclass
+class SimilarCard:
+    """An existing card resembling the one being written.
+    
+    Attributes:
+        card_id: The card, or the first card of its note
+        front: Front text, the first field for note cards
+        back: Back text, the second field for note cards
+        deck_name: Deck the card is in
+        score: Share of the query's trigrams the front contains
+        similarity: Jaccard similarity of the two fronts' trigrams
+    """
+    card_id: int
+    front: str
+    back: str
+    deck_name: str
+    score: float
+    similarity: float
+
+
+class SimilarCardIndex:
+    """In-memory trigram index of a collection's card fronts.
+    
+    Thread-safe: lookups and updates hold a lock, so a lookup started
+    while the index is built waits for the build to finish.
+    """
+    
+    def __init__(self, db: Database):
+        self.db = db
+        self._lock = threading.Lock()
+        self._built = False
+        self._seq = 0
+        self._postings: Dict[str, array] = defaultdict(lambda: array("i"))
+        # Document number -> card id, 0 for replaced or deleted documents
+        self._doc_cards = array("q")
+        self._card_docs: Dict[int, int] = {}
+        # Note id -> the card id its document is filed under
+        self._note_cards: Dict[int, int] = {}
+        self._dead = 0
+    
+    def __len__(self) -> int:
+        return len(self._card_docs)
+    
+    @property
+    def built(self) -> bool:
+        """Whether the index has been built; lookups build it first otherwise."""
+        return self._built
+    
+    def build(self) -> None:
+        """Build the index if it has not been built yet."""
+        with self._lock:
+            if not self._built:
+                self._rebuild()
+    
+    def _rebuild(self) -> None:
+        """Index every card front from scratch."""
+        self._postings = defaultdict(lambda: array("i"))
+        self._doc_cards = array("q")
+        self._card_docs = {}
+        self._note_cards = {}
+        self._dead = 0
+        with self.db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            # Read in the snapshot the documents come from
+            self._seq = cursor.execute("SELECT MAX(seq) FROM oplog").fetchone()[0] or 0
+            cursor.execute(
+                """SELECT id, front, NULL, NULL FROM cards WHERE note_id IS NULL
+                   UNION ALL
+                   SELECT MIN(c.id), NULL, n.id, n.fields FROM cards c JOIN notes n ON n.id = c.note_id
+                   GROUP BY n.id"""
+            )
+            while True:
+                rows = cursor.fetchmany(SCAN_FETCH_SIZE)
+                if not rows:
+                    break
+                for card_id, front, note_id, fields in rows:
+                    if note_id is not None:
+                        front = _first_field(fields)
+                        self._note_cards[note_id] = card_id
+                    self._add(card_id, shingles(front))
+        self._built = True
+    
+    def _add(self, card_id: int, grams: FrozenSet[str]) -> None:
+        """File a card's trigrams under a new document number."""
+        doc = len(self._doc_cards)
+        self._doc_cards.append(card_id)
+        self._card_docs[card_id] = doc
+        postings = self._postings
+        for gram in grams:
+            postings[gram].append(doc)
+    
+    def _remove(self, card_id: int) -> None:
+        """Forget a card's document; its postings are skipped until the next rebuild."""
+        doc = self._card_docs.pop(card_id, None)
+        if doc is not None:
+            self._doc_cards[doc] = 0
+            self._dead += 1
+    
+    def _catch_up(self) -> None:
+        """Apply the changes logged since the index was last brought up to date."""
+        changes = changes_since(self._seq, db=self.db)
+        if not changes:
+            return
+        if changes[0].seq > self._seq + 1:
+            # Entries were pruned, or the collection restored, before this index saw them
+            self._rebuild()
+            return
+        
+        card_ids: Set[int] = set()
+        note_ids: Set[int] = set()
+        for change in changes:
+            if change.entity == COLLECTION:
+                if change.op != "sync" or change.data.get("pulled") or change.data.get("deleted"):
+                    self._rebuild()
+                    return
+            elif change.entity in (CARD, NOTE) and not change.ids and change.count:
+                # Too many rows to list; re-read everything
+                self._rebuild()
+                return
+            elif change.entity == CARD:
+                card_ids.update(change.ids)
+            elif change.entity == NOTE:
+                note_ids.update(change.ids)
+            # Cards of deleted decks are dropped when a lookup finds them gone
+        self._seq = changes[-1].seq
+        self._refresh(card_ids, note_ids)
+        if self._dead > len(self._doc_cards) * REBUILD_DEAD_RATIO:
+            self._rebuild()
+    
+    def _refresh(self, card_ids: Set[int], note_ids: Set[int]) -> None:
+        """Re-index changed cards and notes from the database."""
+        with self.db.get_connection(read_only=True) as conn:
+            cursor = conn.cursor()
+            if card_ids:
+                cursor.execute(
+                    "SELECT id, front, note_id FROM cards WHERE id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(sorted(card_ids)),)
+                )
+                found = set()
+                for card_id, front, note_id in cursor.fetchall():
+                    found.add(card_id)
+                    if note_id is not None:
+                        note_ids.add(note_id)
+                    else:
+                        self._remove(card_id)
+                        self._add(card_id, shingles(front))
+                for card_id in card_ids - found:
+                    self._remove(card_id)
+            
+            for note_id in note_ids:
+                self._remove(self._note_cards.pop(note_id, 0))
+            if note_ids:
+                cursor.execute(
+                    """SELECT n.id, MIN(c.id), n.fields FROM notes n JOIN cards c ON c.note_id = n.id
+                       WHERE n.id IN (SELECT value FROM json_each(?)) GROUP BY n.id""",
+                    (json.dumps(sorted(note_ids)),)
+                )
+                for note_id, card_id, fields in cursor.fetchall():
+                    self._remove(card_id)
+                    self._note_cards[note_id] = card_id
+                    self._add(card_id, shingles(_first_field(fields)))
+    
+    def lookup(self, text: str, limit: int = 5, exclude: Iterable[int] = ()) -> List[SimilarCard]:
+        """Cards whose front contains most of the trigrams of ``text``, best first.
+        
+        Args:
+            text: Front being written
+            limit: Maximum number of cards
+            exclude: Card ids to leave out
+        """
+        query = shingles(text)
+        if len(query) < MIN_QUERY_TRIGRAMS:
+            return []
+        
+        with self._lock:
+            if not self._built:
+                self._rebuild()
+            else:
+                self._catch_up()
+            
+            # Rarest trigrams first, as many as the budget allows
+            postings = self._postings
+            lists = sorted((postings[gram] for gram in query if gram in postings), key=len)
+            counts: Counter = Counter()
+            counted = 0
+            for docs in lists:
+                if counted + len(docs) > MAX_POSTINGS:
+                    if not counted:
+                        # Only common trigrams: sample the rarest
+                        counts.update(docs[:MAX_POSTINGS])
+                    break
+                counts.update(docs)
+                counted += len(docs)
+            doc_cards = self._doc_cards
+            excluded = set(exclude)
+            candidates = []
+            # Leave room for replaced documents and excluded cards
+            for doc, _ in counts.most_common(CANDIDATES * 2 + len(excluded)):
+                card_id = doc_cards[doc]
+                if card_id and card_id not in excluded:
+                    candidates.append(card_id)
+                    if len(candidates) == CANDIDATES:
+                        break
+        
+        return self._score(query, candidates, limit)
+    
+    def _score(self, query: FrozenSet[str], card_ids: List[int], limit: int) -> List[SimilarCard]:
+        """Read candidate cards and rank them by their exact trigram overlap."""
+        if not card_ids:
+            return []
+        with self.db.get_connection(read_only=True) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT c.id, c.front, c.back, n.fields, d.name AS deck_name
+                   FROM cards c JOIN decks d ON d.id = c.deck_id
+                   LEFT JOIN notes n ON n.id = c.note_id
+                   WHERE c.id IN (SELECT value FROM json_each(?))""",
+                (json.dumps(card_ids),)
+            )
+            rows = cursor.fetchall()
+        
+        missing = set(card_ids) - {row["id"] for row in rows}
+        if missing:
+            # Deleted along with their deck
+            with self._lock:
+                for card_id in missing:
+                    self._remove(card_id)
+        
+        results = []
+        for row in rows:
+            front, back = row["front"], row["back"]
+            if row["fields"] is not None:
+                fields = json.loads(row["fields"])
+                front = fields[0] if fields else ""
+                back = fields[1] if len(fields) > 1 else ""
+            grams = shingles(front)
+            score = len(query & grams) / len(query)
+            if score >= MIN_SCORE:
+                results.append(SimilarCard(
+                    card_id=row["id"],
+                    front=front,
+                    back=back,
+                    deck_name=row["deck_name"],
+                    score=score,
+                    similarity=jaccard(query, grams)
+                ))
+        results.sort(key=lambda card: (card.score, card.similarity), reverse=True)
+        return results[:limit]
+
+
+def _first_field(fields: str) -> str:
+    """First field of a note's JSON field list."""
+    values = json.loads(fields)
+    return values[0] if values else ""
+
+
+# One index per database file
+_indexes: Dict[Path, SimilarCardIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(db: Optional[Database] = None) -> SimilarCardIndex:
+    """Get the similar-card index of a database. Defaults to the global instance."""
+    db = db or get_db()
+    with _indexes_lock:
+        index = _indexes.get(db.db_path)
+        if index is None:
+            index = _indexes[db.db_path] = SimilarCardIndex(db)
+        return index
@@ -0,0 +1,207 @@
+"""Lightweight in-process profiling for TextuAnki screens."""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+@dataclass
+class TimingStat:
+    """Accumulated timings for a single profiled span."""
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    last: float = 0.0
+    db_total: float = 0.0
+    db_last: float = 0.0
+    
+    def add(self, elapsed: float, db_elapsed: float) -> None:
+        """Record one completed span."""
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.last = elapsed
+        self.db_total += db_elapsed
+        self.db_last = db_elapsed
+    
+    @property
+    def mean(self) -> float:
+        """Average span duration in seconds."""
+        return self.total / self.count if self.count else 0.0
+
+
+class Profiler:
+    """Collects span timings and attributes database time to the active span."""
+    
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stats: Dict[str, TimingStat] = {}
+        self.unattributed_db = 0.0
+        # Innermost open span as a [name, db time] frame. Threads and
+        # asyncio tasks each see their own, so spans of interleaved
+        # handlers on the event loop never collect each other's DB time.
+        self._current: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar(
+            "profiler_span", default=None
+        )
+        self._lock = threading.Lock()
+        self._cprofile = None
+    
+    @contextmanager
+    def span(self, name: str):
+        """Time a block of code under the given name."""
+        if not self.enabled:
+            yield
+            return
+        
+        parent = self._current.get()
+        frame = [name, 0.0]
+        self._current.set(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._current.set(parent)
+            self.record(name, elapsed, frame[1])
+            # Nested spans count towards their parent's DB time as well
+            if parent is not None:
+                parent[1] += frame[1]
+    
+    def record(self, name: str, elapsed: float, db_elapsed: float = 0.0) -> None:
+        """Record a measurement taken outside of :meth:`span`."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stats.setdefault(name, TimingStat()).add(elapsed, db_elapsed)
+    
+    def add_db_time(self, elapsed: float) -> None:
+        """Attribute database time to the innermost active span."""
+        if not self.enabled:
+            return
+        frame = self._current.get()
+        if frame is not None:
+            frame[1] += elapsed
+        else:
+            with self._lock:
+                self.unattributed_db += elapsed
+    
+    def reset(self) -> None:
+        """Discard all collected timings."""
+        with self._lock:
+            self.stats.clear()
+            self.unattributed_db = 0.0
+    
+    @property
+    def cprofile_running(self) -> bool:
+        """Whether a cProfile session is currently recording."""
+        return self._cprofile is not None
+    
+    def start_cprofile(self) -> None:
+        """Start recording a cProfile session."""
+        if self._cprofile is not None:
+            return
+        import cProfile
+        self._cprofile = cProfile.Profile()
+        self._cprofile.enable()
+    
+    def stop_cprofile(self, path: Optional[Path] = None) -> Optional[Path]:
+        """Stop the cProfile session and dump it as a pstats file.
+        
+        Args:
+            path: Output file. Defaults to ~/.textuanki/profiles/session-<timestamp>.pstats
+        
+        Returns:
+            The path written, or None if no session was running.
+        """
+        if self._cprofile is None:
+            return None
+        
+        self._cprofile.disable()
+        if path is None:
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = Path.home() / ".textuanki" / "profiles" / f"session-{stamp}.pstats"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._cprofile.dump_stats(str(path))
+        self._cprofile = None
+        return path
+    
+    def format_report(self, limit: int = 20) -> str:
+        """Render the collected timings as Rich markup, slowest first."""
+        with self._lock:
+            items = sorted(self.stats.items(), key=lambda item: item[1].max, reverse=True)
+            unattributed = self.unattributed_db
+        
+        lines = ["[bold]Span                          last    max   mean    db[/bold]"]
+        for name, stat in items[:limit]:
+            lines.append(
+                f"{name[:28]:<28} {stat.last * 1000:6.1f} {stat.max * 1000:6.1f} "
+                f"{stat.mean * 1000:6.1f} {stat.db_last * 1000:5.1f}"
+            )
+        if not items:
+            lines.append("[dim]No spans recorded yet[/dim]")
+        lines.append(f"\nUnattributed DB: {unattributed * 1000:.1f} ms")
+        if self.cprofile_running:
+            lines.append("[bold red]● cProfile recording[/bold red]")
+        return "\n".join(lines)
+
+
+def profiled(name: Optional[str] = None) -> Callable:
+    """Decorator that records each call of the function as a profiler span.
+    
+    Generator functions (such as ``compose``) are timed over their full
+    iteration, and coroutine functions over their full await.
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+        
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def gen_wrapper(*args, **kwargs):
+                with get_profiler().span(span_name):
+                    return (yield from func(*args, **kwargs))
+            return gen_wrapper
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with get_profiler().span(span_name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with get_profiler().span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    
+    return decorator
+
+
+# Methods instrumented on every profiled screen, in addition to action_* handlers
+PROFILED_METHODS = ("compose", "on_mount", "refresh_display", "rate_card", "load_decks")
+
+
+def profile_screen(cls: type) -> type:
+    """Class decorator that profiles compose, mount and action handlers of a screen."""
+    for attr, value in list(vars(cls).items()):
+        if not callable(value):
+            continue
+        if attr in PROFILED_METHODS or attr.startswith("action_"):
+            setattr(cls, attr, profiled(f"{cls.__name__}.{attr}")(value))
+    return cls
+
+
+# Global profiler instance
+_profiler = Profiler(enabled=bool(os.environ.get("TEXTUANKI_PROFILE")))
+
+
+def get_profiler() -> Profiler:
+    """Get the global profiler instance."""
+    return _profiler
@@ -1,14 +1,88 @@
 """Browse cards screen for TextuAnki - Colorful Design."""
 from textual.app import ComposeResult
-from textual.containers import Container, Vertical
-from textual.screen import Screen
-from textual.widgets import Static, DataTable, Button
+from textual.containers import Container, Vertical, Horizontal
+from textual.screen import Screen, ModalScreen
+from textual.widgets import Static, DataTable, Button, Input, Label
 from textual.binding import Binding
+from textual.message import Message
+from typing import Dict, List, Optional, Set
 
+from src.database.oplog import CARD, COLLECTION, DECK, Change, get_bus
 from src.models.card import Card
-from src.models.deck import Deck
+from src.models.deck import Deck, get_deck_cache
+from src.profiler import profile_screen
+from src.undo import UndoStack
+from src.widgets.deck_picker import DeckPicker
 
 
+class MoveCardsModal(ModalScreen):
+    """Modal for choosing the deck to move selected cards into."""
+    
+    CSS = """
+    MoveCardsModal {
+        align: center middle;
+        background: #00000099;
+    }
+    
+    #modal-container {
+        width: 60;
+        height: auto;
+        border: round $primary;
+        background: $surface;
+        padding: 2 3;
+    }
+    
+    #modal-title {
+        text-align: center;
+        text-style: bold;
+        color: $primary;
+        margin: 0 0 1 0;
+        background: $surface;
+    }
+    
+    #button-row {
+        align: center middle;
+        height: auto;
+        margin: 1 0 0 0;
+        background: $surface;
+    }
+    
+    Button {
+        min-width: 12;
+        height: 3;
+        margin: 0 1;
+        border: round $primary;
+        background: $panel;
+        color: $text;
+    }
+    """
+    
+    def __init__(self, count: int):
+        super().__init__()
+        self.count = count
+    
+    def compose(self) -> ComposeResult:
+        with Container(id="modal-container"):
+            yield Static(f"📦 Move {self.count} Card(s)", id="modal-title")
+            yield Label("Target deck:")
+            yield DeckPicker(id="deck-select")
+            
+            with Horizontal(id="button-row"):
+                yield Button("📦 Move", id="move-btn")
+                yield Button("✗ Cancel", id="cancel-btn")
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "move-btn":
+            deck_id = self.query_one("#deck-select", DeckPicker).value
+            if deck_id is None:
+                self.app.notify("Please select a deck", severity="error")
+                return
+            self.dismiss(deck_id)
+        else:
+            self.dismiss(None)
+
+
+@profile_screen
 class BrowseScreen(Screen):
     """Screen for browsing and managing cards."""
     
@@ -68,60 +142,234 @@ class BrowseScreen(Screen):
     
     BINDINGS = [
         Binding("escape", "back", "Back"),
-        Binding("d", "delete", "Delete Card"),
+        Binding("slash", "filter", "Filter Deck"),
+        Binding("space", "toggle_select", "Select"),
+        Binding("a", "select_all", "Select All"),
+        Binding("d", "delete", "Delete"),
+        Binding("m", "move", "Move"),
+        Binding("u", "undo", "Undo"),
+        Binding("ctrl+z", "undo", "Undo", show=False),
     ]
     
+    class ChangesRecorded(Message):
+        """Cards or decks changed; posted from whichever thread made the change."""
+    
+    def __init__(self):
+        super().__init__()
+        self.selected_ids: Set[int] = set()
+        self.deck_names = {}
+        # Deck of each listed card, to relabel rows when a deck is renamed
+        self.card_decks: Dict[int, int] = {}
+        # Decks whose cards are listed, None for all of them
+        self.shown_decks: Optional[Set[int]] = None
+        self.undo_stack = UndoStack()
+        self._pending: List[Change] = []
+    
     def compose(self) -> ComposeResult:
         """Create child widgets for browsing."""
         with Container(id="browse-container"):
             yield Static("🔍 Browse Cards", id="title")
+            yield DeckPicker(id="deck-filter", prompt="All decks", blank_label="All decks")
             yield DataTable(id="cards-table")
             yield Static(
-                "Arrow keys to navigate • D to delete • ESC to go back",
+                "Arrow keys to navigate • / to filter by deck • SPACE to select • A to select all • "
+                "D to delete • M to move • U to undo • ESC to go back",
                 id="instructions"
             )
     
     def on_mount(self) -> None:
         """Set up the data table when screen mounts."""
         table = self.query_one(DataTable)
-        table.add_columns("ID", "Deck", "Front", "Back", "Tags")
+        self.select_column, *_ = table.add_columns("", "ID", "Deck", "Front", "Back", "Tags")
         table.cursor_type = "row"
+        table.focus()
+        self.load_cards()
+        self._unsubscribe = get_bus().subscribe(self._on_change, entities=(CARD, DECK, COLLECTION))
+    
+    def on_unmount(self) -> None:
+        self._unsubscribe()
+    
+    def load_cards(self) -> None:
+        """Fill the table with the cards of the filtered deck and its subdecks, or every card."""
+        self.query_one(DataTable).clear()
+        self.card_decks.clear()
+        self.selected_ids.clear()
+        self.deck_names = get_deck_cache().names()
+        picker = self.query_one("#deck-filter", DeckPicker)
+        if picker.value not in self.deck_names:
+            # The filtered deck was deleted
+            picker.value = None
+        deck_id = picker.value
+        self.shown_decks = set(Deck.get_subtree_ids(deck_id)) if deck_id is not None else None
+        for card in Card.get_all(deck_id):
+            self.add_card_row(card)
+    
+    def on_deck_picker_changed(self, event: DeckPicker.Changed) -> None:
+        self.load_cards()
+        self.query_one(DataTable).focus()
+    
+    def action_filter(self) -> None:
+        """Type in the deck filter."""
+        self.query_one("#deck-filter", DeckPicker).query_one(Input).focus()
+    
+    def add_card_row(self, card: Card) -> None:
+        """Append a card to the table, or refresh its row if it is listed."""
+        # Truncate long text
+        front = card.front[:50] + "..." if len(card.front) > 50 else card.front
+        back = card.back[:50] + "..." if len(card.back) > 50 else card.back
         
-        # Load all cards
-        decks = {deck.id: deck.name for deck in Deck.get_all()}
+        if self.shown_decks is not None and card.deck_id not in self.shown_decks:
+            # Moved out of, or created outside, the filtered deck
+            if self.card_decks.pop(card.id, None) is not None:
+                self.query_one(DataTable).remove_row(str(card.id))
+                self.selected_ids.discard(card.id)
+            return
         
-        for deck_id, deck_name in decks.items():
-            if deck_id is None:
-                continue
-            cards = Card.get_by_deck(deck_id)
-            for card in cards:
-                # Truncate long text
-                front = card.front[:50] + "..." if len(card.front) > 50 else card.front
-                back = card.back[:50] + "..." if len(card.back) > 50 else card.back
-                
-                table.add_row(
-                    str(card.id),
-                    deck_name,
-                    front,
-                    back,
-                    card.tags or ""
-                )
+        table = self.query_one(DataTable)
+        cells = (
+            "✓" if card.id in self.selected_ids else "",
+            str(card.id),
+            self.deck_names.get(card.deck_id, ""),
+            front,
+            back,
+            card.tags or "",
+        )
+        if card.id in self.card_decks:
+            for column, value in zip(table.columns, cells):
+                table.update_cell(str(card.id), column, value)
+        else:
+            table.add_row(*cells, key=str(card.id))
+        self.card_decks[card.id] = card.deck_id
     
-    def action_delete(self) -> None:
-        """Delete the selected card."""
+    def _on_change(self, change: Change) -> None:
+        """Queue a change for the table; post_message is safe from any thread."""
+        self._pending.append(change)
+        self.post_message(self.ChangesRecorded())
+    
+    def on_browse_screen_changes_recorded(self, message: ChangesRecorded) -> None:
+        """Update only the rows of the changed cards."""
+        changes, self._pending = self._pending, []
+        if not changes:
+            return
+        
+        changed: Set[int] = set()
+        deleted: Set[int] = set()
+        decks_changed = False
+        for change in changes:
+            if change.entity == COLLECTION:
+                if change.op != "sync" or change.data.get("pulled") or change.data.get("deleted"):
+                    self.load_cards()
+                    return
+            elif change.entity == DECK:
+                if change.op == "delete" or self.shown_decks is not None:
+                    # Deleted decks' cards went without a change of their own,
+                    # and a moved or new subdeck may change what the filter shows
+                    self.load_cards()
+                    return
+                decks_changed = True
+            elif not change.ids and change.count:
+                # Too many cards to list; read them all again
+                self.load_cards()
+                return
+            elif change.op == "delete":
+                deleted.update(change.ids)
+                changed.difference_update(change.ids)
+            else:
+                changed.update(change.ids)
+                deleted.difference_update(change.ids)
+        
         table = self.query_one(DataTable)
+        for card_id in deleted:
+            if self.card_decks.pop(card_id, None) is not None:
+                table.remove_row(str(card_id))
+            self.selected_ids.discard(card_id)
+        if decks_changed:
+            self.deck_names = get_deck_cache().names()
+            deck_column = list(table.columns)[2]
+            for card_id, deck_id in self.card_decks.items():
+                table.update_cell(str(card_id), deck_column, self.deck_names.get(deck_id, ""))
+        for card in Card.get_by_ids(changed):
+            self.add_card_row(card)
+    
+    def _cursor_card_id(self):
+        """Return the card ID under the cursor, if any."""
+        table = self.query_one(DataTable)
+        if table.row_count == 0 or table.cursor_row is None or table.cursor_row < 0:
+            return None
+        row_key = table.coordinate_to_cell_key(table.cursor_coordinate).row_key
+        return int(row_key.value)
+    
+    def _target_ids(self) -> Set[int]:
+        """Selected card IDs, or the card under the cursor when none are selected."""
+        if self.selected_ids:
+            return set(self.selected_ids)
+        card_id = self._cursor_card_id()
+        return {card_id} if card_id is not None else set()
+    
+    def action_toggle_select(self) -> None:
+        """Toggle selection of the card under the cursor."""
+        card_id = self._cursor_card_id()
+        if card_id is None:
+            return
         
-        if table.cursor_row is not None and table.cursor_row >= 0:
-            row_key = table.coordinate_to_cell_key(table.cursor_coordinate).row_key
-            row = table.get_row(row_key)
-            card_id = int(row[0])
+        table = self.query_one(DataTable)
+        if card_id in self.selected_ids:
+            self.selected_ids.discard(card_id)
+            table.update_cell(str(card_id), self.select_column, "")
+        else:
+            self.selected_ids.add(card_id)
+            table.update_cell(str(card_id), self.select_column, "✓")
+        
+        if table.cursor_row < table.row_count - 1:
+            table.move_cursor(row=table.cursor_row + 1)
+    
+    def action_select_all(self) -> None:
+        """Select every card, or clear the selection if all are selected."""
+        table = self.query_one(DataTable)
+        select = len(self.selected_ids) < table.row_count
+        
+        for row_key in table.rows:
+            table.update_cell(row_key, self.select_column, "✓" if select else "")
+        self.selected_ids = {int(row_key.value) for row_key in table.rows} if select else set()
+    
+    def action_delete(self) -> None:
+        """Delete the selected cards in a single transaction."""
+        card_ids = self._target_ids()
+        if not card_ids:
+            return
+        
+        deleted = Card.delete_for_undo(card_ids)
+        
+        def revert() -> None:
+            Card.restore(deleted)
+        
+        count = deleted.count
+        self.undo_stack.push(f"delete of {count} card(s)", revert)
+        self.notify(f"{count} card(s) deleted • U to undo", severity="information")
+    
+    def action_undo(self) -> None:
+        """Restore the most recently deleted cards."""
+        label = self.undo_stack.undo()
+        if label is None:
+            self.notify("Nothing to undo", severity="warning")
+        else:
+            self.notify(f"Undid {label}", severity="information")
+    
+    def action_move(self) -> None:
+        """Move the selected cards to another deck."""
+        card_ids = self._target_ids()
+        if not card_ids:
+            return
+        
+        def move_to(deck_id) -> None:
+            if deck_id is None:
+                return
             
-            # Confirm deletion
-            card = Card.get_by_id(card_id)
-            if card:
-                card.delete()
-                table.remove_row(row_key)
-                self.notify(f"Card deleted", severity="information")
+            self.selected_ids.clear()
+            moved = Card.bulk_move(card_ids, deck_id)
+            self.notify(f"{moved} card(s) moved", severity="information")
+        
+        self.app.push_screen(MoveCardsModal(len(card_ids)), move_to)
     
     def action_back(self) -> None:
         """Return to dashboard."""
@@ -1,15 +1,144 @@
 """Create card screen for TextuAnki - Colorful Design."""
+import sqlite3
+
 from textual.app import ComposeResult
 from textual.containers import Container, Vertical, Horizontal
-from textual.screen import Screen
-from textual.widgets import Static, Input, TextArea, Button, Select, Label
+from textual.screen import Screen, ModalScreen
+from textual.widgets import Static, Input, TextArea, Button, Label
 from textual.binding import Binding
-from typing import cast
+from textual.timer import Timer
+from textual.worker import get_current_worker
+from rich.text import Text
+from typing import List, Optional, Tuple, cast
 
-from src.models.deck import Deck
+from src.anki.importer import parse_table
+from src.models.deck import get_deck_cache
 from src.models.card import Card
+from src.models.duplicates import DuplicateCardError
+from src.models.entry_queue import BATCH_SIZE, FLUSH_INTERVAL, EntryQueue
+from src.models.note import CLOZE_TYPE, Note, NoteType, cloze_numbers
+from src.models.similar import SimilarCard, get_index
+from src.profiler import get_profiler, profile_screen
+from src.widgets.deck_picker import DeckPicker
+
+# Pause in typing after which similar cards are looked up, in seconds
+SIMILAR_DEBOUNCE = 0.15
+
+# Similar cards listed in the side panel
+SIMILAR_LIMIT = 6
+
+# Parsed rows shown in the paste-table preview
+PREVIEW_ROWS = 5
 
 
+class PasteTableModal(ModalScreen):
+    """Modal for pasting a table of cards, one row per card.
+    
+    Dismisses with the parsed (front, back, tags) rows, or None.
+    """
+    
+    CSS = """
+    PasteTableModal {
+        align: center middle;
+        background: #00000099;
+    }
+    
+    #modal-container {
+        width: 90;
+        height: auto;
+        border: round $primary;
+        background: $surface;
+        padding: 1 3;
+    }
+    
+    #modal-title {
+        text-align: center;
+        text-style: bold;
+        color: $primary;
+        margin: 0 0 1 0;
+        background: $surface;
+    }
+    
+    #table-input {
+        height: 12;
+        border: round $secondary;
+        background: $panel;
+    }
+    
+    #table-preview {
+        color: $text-muted;
+        margin: 1 0 0 0;
+        background: $surface;
+    }
+    
+    #button-row {
+        align: center middle;
+        height: auto;
+        margin: 1 0 0 0;
+        background: $surface;
+    }
+    
+    Button {
+        min-width: 12;
+        height: 3;
+        margin: 0 1;
+        border: round $primary;
+        background: $panel;
+        color: $text;
+    }
+    """
+    
+    BINDINGS = [
+        Binding("escape", "cancel", "Cancel"),
+        Binding("ctrl+s", "add", "Add Cards"),
+    ]
+    
+    def __init__(self, deck_name: str):
+        super().__init__()
+        self.deck_name = deck_name
+        self.rows: List[Tuple[str, str, str]] = []
+    
+    def compose(self) -> ComposeResult:
+        with Vertical(id="modal-container"):
+            yield Static(f"📋 Paste a Table into {self.deck_name}", id="modal-title")
+            yield Label("Rows of front, back and optional tags, tab-separated or as a Markdown table:")
+            yield TextArea(id="table-input")
+            yield Static("Nothing to add yet", id="table-preview")
+            
+            with Horizontal(id="button-row"):
+                yield Button("➕ Add", id="add-btn")
+                yield Button("✗ Cancel", id="cancel-btn")
+    
+    def on_mount(self) -> None:
+        self.query_one("#table-input", TextArea).focus()
+    
+    def on_text_area_changed(self, event: TextArea.Changed) -> None:
+        """Parse the table again and preview its first cards."""
+        self.rows = parse_table(event.text_area.text)
+        preview = Text(f"{len(self.rows)} card(s)", style="bold")
+        for front, back, _ in self.rows[:PREVIEW_ROWS]:
+            preview.append(f"\n{front[:40]}  →  {back[:40]}")
+        if len(self.rows) > PREVIEW_ROWS:
+            preview.append("\n...")
+        self.query_one("#table-preview", Static).update(preview)
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "add-btn":
+            self.action_add()
+        else:
+            self.action_cancel()
+    
+    def action_add(self) -> None:
+        if not self.rows:
+            self.app.notify("No complete rows to add", severity="error")
+            return
+        self.dismiss(self.rows)
+    
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+
+@profile_screen
 class CreateCardScreen(Screen):
     """Screen for creating a new flashcard."""
     
@@ -32,13 +161,34 @@ class CreateCardScreen(Screen):
         margin: 1 0 2 0;
     }
     
+    #create-body {
+        height: auto;
+        align: center top;
+    }
+    
     #form-container {
-        width: 80;
+        width: 1fr;
+        max-width: 80;
         height: auto;
         border: round $primary;
         padding: 2 3;
         background: $surface;
-        margin: 1 auto;
+        margin: 1 1;
+    }
+    
+    #similar-panel {
+        width: 40;
+        height: auto;
+        max-height: 100%;
+        border: round $secondary;
+        border-title-color: $text-muted;
+        padding: 0 1;
+        background: $surface;
+        margin: 1 1;
+    }
+    
+    #similar-list {
+        color: $text-muted;
     }
     
     Label {
@@ -72,17 +222,6 @@ class CreateCardScreen(Screen):
         background: $surface;
     }
     
-    Select {
-        margin: 0 0 1 0;
-        border: round $secondary;
-        background: $panel;
-        color: $text;
-    }
-    
-    Select:focus {
-        border: round $accent;
-    }
-    
     #button-container {
         height: auto;
         margin: 2 0;
@@ -104,6 +243,18 @@ class CreateCardScreen(Screen):
         color: $background;
     }
     
+    #entry-status {
+        display: none;
+        text-align: center;
+        text-style: bold;
+        color: $accent;
+        background: $background;
+    }
+    
+    #entry-status.active {
+        display: block;
+    }
+    
     #instructions {
         text-align: center;
         color: $text-muted;
@@ -115,39 +266,125 @@ class CreateCardScreen(Screen):
     BINDINGS = [
         Binding("escape", "cancel", "Cancel"),
         Binding("ctrl+s", "save", "Save Card"),
+        Binding("ctrl+r", "toggle_rapid", "Rapid Entry"),
+        Binding("ctrl+t", "paste_table", "Paste Table"),
     ]
     
+    # (deck id, front) of the last duplicate the user was warned about
+    _duplicate_warned: Optional[Tuple[int, str]] = None
+    
+    _similar_timer: Optional[Timer] = None
+    
+    def __init__(self):
+        super().__init__()
+        # In rapid entry, saved cards are queued and written in the background
+        self.rapid_entry = False
+        self.entries = EntryQueue()
+        self._entry_error: Optional[str] = None
+    
     def compose(self) -> ComposeResult:
         """Create child widgets for the form."""
         with Container(id="create-card-container"):
             yield Static("➕ Create New Card", id="title")
             
-            with Vertical(id="form-container"):
-                yield Label("Deck:")
-                
-                # Get available decks
-                decks = Deck.get_all()
-                deck_options = [(deck.name, deck.id) for deck in decks]
-                yield Select(deck_options, id="deck-select", prompt="Select a deck")
-                
-                yield Label("Front (Question):")
-                yield TextArea(id="front-input")
-                
-                yield Label("Back (Answer):")
-                yield TextArea(id="back-input")
+            with Horizontal(id="create-body"):
+                with Vertical(id="form-container"):
+                    yield Label("Deck:")
+                    yield DeckPicker(id="deck-select")
+                    
+                    yield Label("Front (Question):")
+                    yield TextArea(id="front-input")
+                    
+                    yield Label("Back (Answer):")
+                    yield TextArea(id="back-input")
+                    
+                    yield Label("Tags (optional, comma-separated):")
+                    yield Input(placeholder="e.g., vocabulary, chapter1", id="tags-input")
+                    
+                    with Horizontal(id="button-container"):
+                        yield Button("💾 Save Card", id="save-btn")
+                        yield Button("✗ Cancel", id="cancel-btn")
                 
-                yield Label("Tags (optional, comma-separated):")
-                yield Input(placeholder="e.g., vocabulary, chapter1", id="tags-input")
-                
-                with Horizontal(id="button-container"):
-                    yield Button("💾 Save Card", id="save-btn")
-                    yield Button("✗ Cancel", id="cancel-btn")
+                with Vertical(id="similar-panel") as panel:
+                    panel.border_title = "Similar cards"
+                    yield Static("Start typing a question to see similar cards", id="similar-list")
             
+            yield Static("", id="entry-status")
             yield Static(
-                "Ctrl+S to save • ESC to cancel",
+                "Ctrl+S to save • Ctrl+R rapid entry • Ctrl+T paste a table • "
+                "{{c1::answer}} in the front makes a cloze note • ESC to cancel",
                 id="instructions"
             )
     
+    def on_mount(self) -> None:
+        """Start indexing cards for the similar-cards panel and flushing queued cards."""
+        index = get_index()
+        if not index.built:
+            self.run_worker(index.build, thread=True, exclusive=True, group="similar-index")
+        self.set_interval(FLUSH_INTERVAL, self._flush_entries)
+    
+    def on_unmount(self) -> None:
+        """Write the cards still queued, so leaving the screen loses none."""
+        if not self.entries.queued:
+            return
+        try:
+            self.entries.flush()
+        except sqlite3.Error as e:
+            self.app.notify(f"{self.entries.queued} card(s) could not be saved: {e}", severity="error")
+    
+    def on_text_area_changed(self, event: TextArea.Changed) -> None:
+        """Look up similar cards once typing in the front pauses."""
+        if event.text_area.id != "front-input":
+            return
+        if self._similar_timer is not None:
+            self._similar_timer.stop()
+        self._similar_timer = self.set_timer(SIMILAR_DEBOUNCE, self._find_similar)
+    
+    def _find_similar(self) -> None:
+        """Look up cards similar to the front off the UI thread."""
+        self._similar_timer = None
+        front = self.query_one("#front-input", TextArea).text
+        if not get_index().built:
+            self.query_one("#similar-list", Static).update("Indexing cards...")
+        self.run_worker(
+            lambda: self._lookup_similar(front),
+            thread=True,
+            exclusive=True,
+            group="similar"
+        )
+    
+    def _lookup_similar(self, front: str) -> None:
+        """Run a lookup in a worker thread and hand the result to the UI."""
+        with get_profiler().span("similar.lookup"):
+            cards = get_index().lookup(front, limit=SIMILAR_LIMIT)
+        if not get_current_worker().is_cancelled:
+            self.app.call_from_thread(self._show_similar, front, cards)
+    
+    def _show_similar(self, front: str, cards: List[SimilarCard]) -> None:
+        """List similar cards, unless the front changed since they were looked up."""
+        if not self.is_mounted or front != self.query_one("#front-input", TextArea).text:
+            return
+        listing = self.query_one("#similar-list", Static)
+        if not front.strip():
+            listing.update("Start typing a question to see similar cards")
+            return
+        if not cards:
+            listing.update("No similar cards")
+            return
+        
+        # Card text is shown as typed, never as markup
+        text = Text()
+        for index, card in enumerate(cards):
+            if index:
+                text.append("\n\n")
+            text.append(f"{card.score:.0%} ", style="bold")
+            text.append(card.deck_name, style="italic")
+            text.append("\n")
+            text.append(card.front[:120], style="bold" if card.score == 1 else "")
+            if card.back:
+                text.append(f"\n→ {card.back[:80]}")
+        listing.update(text)
+    
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Handle button presses."""
         if event.button.id == "save-btn":
@@ -157,7 +394,7 @@ class CreateCardScreen(Screen):
     
     def action_save(self) -> None:
         """Save the new card."""
-        deck_select = self.query_one("#deck-select", Select)
+        deck_select = self.query_one("#deck-select", DeckPicker)
         front_input = self.query_one("#front-input", TextArea)
         back_input = self.query_one("#back-input", TextArea)
         tags_input = self.query_one("#tags-input", Input)
@@ -171,13 +408,47 @@ class CreateCardScreen(Screen):
             self.notify("Please select a deck", severity="error")
             return
         
-        if not front or not back:
+        numbers = cloze_numbers(front)
+        if not front or not (back or numbers):
             self.notify("Front and back fields are required", severity="error")
             return
         
-        # Create the card
-        Card.create(deck_id=cast(int, deck_id), front=front, back=back, tags=tags)
-        self.notify("Card created successfully!", severity="information")
+        if self.rapid_entry:
+            self.entries.add(deck_id, front, back, tags)
+            if self.entries.queued >= BATCH_SIZE:
+                self._flush_entries()
+            self._update_entry_status()
+            front_input.clear()
+            back_input.clear()
+            front_input.focus()
+            return
+        
+        # Saving the same duplicate a second time adds it anyway
+        allow_duplicate = self._duplicate_warned == (deck_id, front)
+        try:
+            if numbers:
+                # One card per cloze number, with the back as extra text
+                Note.create(
+                    NoteType.get_by_name(CLOZE_TYPE), cast(int, deck_id), [front, back], tags,
+                    allow_duplicate=allow_duplicate
+                )
+                self.notify(f"Cloze note created with {len(numbers)} card(s)", severity="information")
+            else:
+                Card.create(
+                    deck_id=cast(int, deck_id), front=front, back=back, tags=tags,
+                    allow_duplicate=allow_duplicate
+                )
+                self.notify("Card created successfully!", severity="information")
+        except DuplicateCardError as e:
+            self._duplicate_warned = (deck_id, front)
+            existing = Card.get_by_id(e.card_id)
+            answer = f" (answer: {existing.back[:40]})" if existing and existing.back else ""
+            self.notify(
+                f"This deck already has this card{answer}. Save again to add it anyway.",
+                severity="warning"
+            )
+            return
+        self._duplicate_warned = None
         
         # Clear form
         front_input.clear()
@@ -185,6 +456,62 @@ class CreateCardScreen(Screen):
         tags_input.value = ""
         front_input.focus()
     
+    def action_toggle_rapid(self) -> None:
+        """Switch between saving each card and queueing cards to save in the background."""
+        self.rapid_entry = not self.rapid_entry
+        self._update_entry_status()
+        if self.rapid_entry:
+            self.notify("Rapid entry: Ctrl+S queues the card and clears the form", severity="information")
+    
+    def action_paste_table(self) -> None:
+        """Add the rows of a pasted table to the selected deck."""
+        deck_id = self.query_one("#deck-select", DeckPicker).value
+        deck = get_deck_cache().get(deck_id) if deck_id is not None else None
+        if deck is None:
+            self.notify("Please select a deck", severity="error")
+            return
+        
+        def queue_rows(rows: Optional[List[Tuple[str, str, str]]]) -> None:
+            if rows:
+                self.entries.extend(deck.id, rows)
+                self._update_entry_status()
+                self._flush_entries()
+        
+        self.app.push_screen(PasteTableModal(deck.name), queue_rows)
+    
+    def _flush_entries(self) -> None:
+        """Write queued cards off the UI thread."""
+        if self.entries.queued:
+            self.run_worker(self._write_entries, thread=True, group="entries")
+    
+    def _write_entries(self) -> None:
+        """Flush the queue in a worker thread and report back to the UI."""
+        error = None
+        try:
+            self.entries.flush()
+        except sqlite3.Error as e:
+            # The cards stay queued and the next tick tries again
+            error = str(e)
+        self.app.call_from_thread(self._entries_written, error)
+    
+    def _entries_written(self, error: Optional[str]) -> None:
+        if self.is_mounted:
+            self._entry_error = error
+            self._update_entry_status()
+    
+    def _update_entry_status(self) -> None:
+        """Show how many queued cards are waiting and how many were saved."""
+        counts = self.entries.counts()
+        status = self.query_one("#entry-status", Static)
+        status.set_class(bool(self.rapid_entry or counts.pending or counts.saved), "active")
+        text = "⚡ Rapid entry • " if self.rapid_entry else ""
+        text += f"{counts.pending} waiting • {counts.saved} saved"
+        if counts.duplicates:
+            text += f" • {counts.duplicates} duplicate(s) skipped"
+        if self._entry_error:
+            text += f" • ⚠ saving failed, retrying: {self._entry_error}"
+        status.update(Text(text))
+    
     def action_cancel(self) -> None:
         """Cancel and return to previous screen."""
         self.app.pop_screen()
@@ -7,6 +7,8 @@ from textual.binding import Binding
 
 from src.models.deck import Deck
 from src.models.card import Card
+from src.database.oplog import CARD, COLLECTION, DECK, REVIEW, Change, get_bus, publish_changes
+from src.profiler import profile_screen
 
 
 class StatBlock(Static):
@@ -55,6 +57,11 @@ class StatBlock(Static):
         yield Label(self.icon_char, classes="icon")
         yield Label(self.value_text, classes="value")
         yield Label(self.label_text, classes="label")
+    
+    def set_value(self, value: str) -> None:
+        """Replace the displayed value."""
+        self.value_text = value
+        self.query_one(".value", Label).update(value)
 
 
 class MenuButton(Button):
@@ -85,6 +92,7 @@ class MenuButton(Button):
     """
 
 
+@profile_screen
 class DashboardScreen(Screen):
     """Main dashboard screen - Modern colorful design."""
     
@@ -145,9 +153,11 @@ class DashboardScreen(Screen):
     
     BINDINGS = [
         Binding("s", "study", "Study", show=True),
+        Binding("r", "study_shuffled", "Shuffled", show=True),
         Binding("n", "new_card", "New", show=True),
         Binding("b", "browse", "Browse", show=True),
         Binding("d", "manage_decks", "Decks", show=True),
+        Binding("t", "stats", "Stats", show=True),
     ]
     
     def compose(self) -> ComposeResult:
@@ -160,15 +170,10 @@ class DashboardScreen(Screen):
             
             # Statistics
             with Horizontal(id="stats-container"):
-                # Get statistics
-                decks = Deck.get_all()
-                total_decks = len(decks)
-                total_cards = sum(deck.get_card_count() for deck in decks)
-                due_cards = len(Card.get_due_cards())
-                
-                yield StatBlock("⏰", "Cards Due", str(due_cards))
-                yield StatBlock("📖", "Total Cards", str(total_cards))
-                yield StatBlock("🗂️", "Decks", str(total_decks))
+                due_cards, total_cards, total_decks = self._collect_stats()
+                yield StatBlock("⏰", "Cards Due", str(due_cards), id="stat-due")
+                yield StatBlock("📖", "Total Cards", str(total_cards), id="stat-cards")
+                yield StatBlock("🗂️", "Decks", str(total_decks), id="stat-decks")
             
             yield Static("─" * 70, classes="divider")
             
@@ -178,14 +183,44 @@ class DashboardScreen(Screen):
                 yield MenuButton("➕ Create New Card", id="new-card-btn")
                 yield MenuButton("🔍 Browse Cards", id="browse-btn")
                 yield MenuButton("📂 Manage Decks", id="decks-btn")
+                yield MenuButton("📊 Statistics", id="stats-btn")
             
             yield Static("─" * 70, classes="divider")
             
             yield Static(
-                "[S]tudy • [N]ew Card • [B]rowse • [D]ecks • Ctrl+Q to quit",
+                "[S]tudy • [N]ew Card • [B]rowse • [D]ecks • S[t]ats • Ctrl+Q to quit",
                 id="shortcuts-help"
             )
     
+    def on_mount(self) -> None:
+        self._stale = False
+        self._unsubscribe = get_bus().subscribe(self._on_change, entities=(CARD, DECK, REVIEW, COLLECTION))
+    
+    def on_unmount(self) -> None:
+        self._unsubscribe()
+    
+    def _on_change(self, change: Change) -> None:
+        # Called on the writing thread; the statistics are read on return
+        self._stale = True
+    
+    def _collect_stats(self):
+        """Count due cards, cards and decks."""
+        summaries = Deck.get_summaries()
+        total_cards = sum(summary.total for summary in summaries)
+        return Card.count_due(), total_cards, len(summaries)
+    
+    def on_screen_resume(self) -> None:
+        """Refresh the statistics if anything changed while another screen was open."""
+        # Also delivers changes other processes, such as the CLI, made meanwhile
+        publish_changes()
+        if not self._stale:
+            return
+        self._stale = False
+        due_cards, total_cards, total_decks = self._collect_stats()
+        self.query_one("#stat-due", StatBlock).set_value(str(due_cards))
+        self.query_one("#stat-cards", StatBlock).set_value(str(total_cards))
+        self.query_one("#stat-decks", StatBlock).set_value(str(total_decks))
+    
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Handle button presses."""
         button_id = event.button.id
@@ -198,11 +233,27 @@ class DashboardScreen(Screen):
             self.action_browse()
         elif button_id == "decks-btn":
             self.action_manage_decks()
+        elif button_id == "stats-btn":
+            self.action_stats()
     
     def action_study(self) -> None:
-        """Navigate to study screen."""
+        """Pick a deck subtree and navigate to study screen."""
+        from src.screens.study import ALL_DECKS, StudyDeckModal, StudyScreen
+        
+        def start(choice) -> None:
+            if choice == ALL_DECKS:
+                self.app.push_screen(StudyScreen())
+            elif isinstance(choice, int):
+                self.app.push_screen(StudyScreen(choice))
+            elif choice is not None:
+                self.app.push_screen(StudyScreen(filtered=choice))
+        
+        self.app.push_screen(StudyDeckModal(), start)
+    
+    def action_study_shuffled(self) -> None:
+        """Study with cards from all decks in random order."""
         from src.screens.study import StudyScreen
-        self.app.push_screen(StudyScreen())
+        self.app.push_screen(StudyScreen(shuffle=True))
     
     def action_new_card(self) -> None:
         """Navigate to create card screen."""
@@ -218,3 +269,8 @@ class DashboardScreen(Screen):
         """Navigate to deck manager screen."""
         from src.screens.deck_manager import DeckManagerScreen
         self.app.push_screen(DeckManagerScreen())
+    
+    def action_stats(self) -> None:
+        """Navigate to statistics screen."""
+        from src.screens.stats import StatsScreen
+        self.app.push_screen(StatsScreen())
@@ -2,10 +2,15 @@
 from textual.app import ComposeResult
 from textual.containers import Container, Vertical, Horizontal
 from textual.screen import Screen, ModalScreen
-from textual.widgets import Static, DataTable, Button, Input, Label
+from textual.widgets import Static, DataTable, Button, Input, Label, Select
 from textual.binding import Binding
 
 from src.models.deck import Deck
+from src.models.filtered_deck import (
+    FilterDefinition, FilteredDeck, ORDER_ADDED, ORDER_DUE, ORDER_LAPSES
+)
+from src.profiler import profile_screen
+from src.widgets.deck_picker import DeckPicker
 
 
 class CreateDeckModal(ModalScreen):
@@ -77,7 +82,7 @@ class CreateDeckModal(ModalScreen):
         with Container(id="modal-container"):
             yield Static("📂 Create New Deck", id="modal-title")
             yield Label("Deck Name:")
-            yield Input(placeholder="e.g., Spanish Vocabulary", id="deck-name")
+            yield Input(placeholder="e.g., Languages::Spanish", id="deck-name")
             yield Label("Description (optional):")
             yield Input(placeholder="Description", id="deck-description")
             
@@ -107,6 +112,131 @@ class CreateDeckModal(ModalScreen):
             self.dismiss(False)
 
 
+class DeckLimitsModal(ModalScreen):
+    """Modal for editing a deck's daily study limits."""
+    
+    CSS = CreateDeckModal.CSS.replace("CreateDeckModal", "DeckLimitsModal")
+    
+    def __init__(self, deck: Deck):
+        super().__init__()
+        self.deck = deck
+    
+    def compose(self) -> ComposeResult:
+        with Container(id="modal-container"):
+            yield Static(f"⏱ Daily Limits: {self.deck.name}", id="modal-title")
+            yield Label("New cards per day:")
+            yield Input(str(self.deck.new_per_day), type="integer", id="new-per-day")
+            yield Label("Reviews per day:")
+            yield Input(str(self.deck.reviews_per_day), type="integer", id="reviews-per-day")
+            
+            with Horizontal(id="button-row"):
+                yield Button("💾 Save", id="save-btn")
+                yield Button("✗ Cancel", id="cancel-btn")
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "save-btn":
+            try:
+                new_per_day = int(self.query_one("#new-per-day", Input).value)
+                reviews_per_day = int(self.query_one("#reviews-per-day", Input).value)
+            except ValueError:
+                self.app.notify("Limits must be whole numbers", severity="error")
+                return
+            
+            if new_per_day < 0 or reviews_per_day < 0:
+                self.app.notify("Limits cannot be negative", severity="error")
+                return
+            
+            self.deck.new_per_day = new_per_day
+            self.deck.reviews_per_day = reviews_per_day
+            self.deck.update()
+            self.app.notify(f"Limits for '{self.deck.name}' saved", severity="information")
+            self.dismiss(True)
+        else:
+            self.dismiss(False)
+
+
+class FilteredDeckModal(ModalScreen):
+    """Modal for saving a filtered deck search."""
+    
+    CSS = CreateDeckModal.CSS.replace("CreateDeckModal", "FilteredDeckModal") + """
+    #modal-container {
+        max-height: 90%;
+        overflow-y: auto;
+    }
+    
+    Select {
+        margin: 0 0 1 0;
+    }
+    """
+    
+    def compose(self) -> ComposeResult:
+        with Container(id="modal-container"):
+            yield Static("🔎 New Filtered Deck", id="modal-title")
+            yield Label("Name:")
+            yield Input(placeholder="e.g., Spanish leeches", id="filter-name")
+            yield Label("Search in deck (and its subdecks):")
+            yield DeckPicker(id="filter-deck", prompt="All decks", blank_label="All decks")
+            yield Label("Tags (comma-separated, all must match):")
+            yield Input(placeholder="e.g., verbs, chapter1", id="filter-tags")
+            yield Label("Due within days (blank for any due date):")
+            yield Input("0", type="integer", id="filter-due")
+            yield Label("Minimum lapses:")
+            yield Input("0", type="integer", id="filter-lapses")
+            yield Label("Text on front or back:")
+            yield Input(id="filter-text")
+            yield Label("Maximum cards:")
+            yield Input("1000", type="integer", id="filter-limit")
+            yield Label("Order:")
+            yield Select(
+                [("Due date", ORDER_DUE), ("Date added", ORDER_ADDED), ("Most lapses", ORDER_LAPSES)],
+                value=ORDER_DUE,
+                allow_blank=False,
+                id="filter-order"
+            )
+            
+            with Horizontal(id="button-row"):
+                yield Button("💾 Save", id="save-btn")
+                yield Button("✗ Cancel", id="cancel-btn")
+    
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id != "save-btn":
+            self.dismiss(False)
+            return
+        
+        name = self.query_one("#filter-name", Input).value.strip()
+        if not name:
+            self.app.notify("Filtered deck name is required", severity="error")
+            return
+        
+        deck_id = self.query_one("#filter-deck", DeckPicker).value
+        due = self.query_one("#filter-due", Input).value.strip()
+        try:
+            definition = FilterDefinition(
+                deck_id=deck_id,
+                tags=tuple(
+                    tag.strip()
+                    for tag in self.query_one("#filter-tags", Input).value.split(",")
+                    if tag.strip()
+                ),
+                due_within_days=int(due) if due else None,
+                min_lapses=int(self.query_one("#filter-lapses", Input).value or 0),
+                text=self.query_one("#filter-text", Input).value.strip(),
+                limit=int(self.query_one("#filter-limit", Input).value or 0),
+                order=self.query_one("#filter-order", Select).value
+            )
+        except ValueError:
+            self.app.notify("Numbers must be whole numbers", severity="error")
+            return
+        
+        try:
+            FilteredDeck.create(name, definition)
+            self.app.notify(f"Filtered deck '{name}' saved", severity="information")
+            self.dismiss(True)
+        except Exception as e:
+            self.app.notify(f"Error: {str(e)}", severity="error")
+
+
+@profile_screen
 class DeckManagerScreen(Screen):
     """Screen for managing decks."""
     
@@ -189,6 +319,8 @@ class DeckManagerScreen(Screen):
         Binding("escape", "back", "Back"),
         Binding("n", "new_deck", "New Deck"),
         Binding("d", "delete", "Delete Deck"),
+        Binding("l", "limits", "Daily Limits"),
+        Binding("f", "new_filtered_deck", "New Filtered Deck"),
     ]
     
     def compose(self) -> ComposeResult:
@@ -199,10 +331,12 @@ class DeckManagerScreen(Screen):
             
             with Horizontal(id="button-container"):
                 yield Button("➕ New Deck [N]", id="new-btn")
+                yield Button("🔎 Filtered Deck [F]", id="filtered-btn")
                 yield Button("🗑️ Delete [D]", id="delete-btn")
             
             yield Static(
-                "Arrow keys to navigate • N for new deck • D to delete • ESC to go back",
+                "Arrow keys to navigate • N for new deck • F for filtered deck • D to delete • "
+                "L for daily limits • ESC to go back",
                 id="instructions"
             )
     
@@ -214,16 +348,19 @@ class DeckManagerScreen(Screen):
         """Load decks into the table."""
         table = self.query_one(DataTable)
         table.clear(columns=True)
-        table.add_columns("ID", "Name", "Description", "Cards")
+        table.add_columns("ID", "Name", "Description", "Cards", "New/day", "Reviews/day")
         table.cursor_type = "row"
         
         decks = Deck.get_all()
+        card_counts = {summary.deck_id: summary.total for summary in Deck.get_summaries()}
         for deck in decks:
             table.add_row(
                 str(deck.id),
                 deck.name,
                 deck.description or "",
-                str(deck.get_card_count())
+                str(card_counts.get(deck.id, 0)),
+                str(deck.new_per_day),
+                str(deck.reviews_per_day)
             )
     
     def action_new_deck(self) -> None:
@@ -234,6 +371,10 @@ class DeckManagerScreen(Screen):
         
         self.app.push_screen(CreateDeckModal(), check_result)
     
+    def action_new_filtered_deck(self) -> None:
+        """Show modal to save a filtered deck search."""
+        self.app.push_screen(FilteredDeckModal())
+    
     def action_delete(self) -> None:
         """Delete the selected deck."""
         table = self.query_one(DataTable)
@@ -251,14 +392,31 @@ class DeckManagerScreen(Screen):
             
             deck = Deck.get_by_id(deck_id)
             if deck:
+                # Subdecks are deleted with their parent
                 deck.delete()
-                table.remove_row(row_key)
+                self.load_decks()
                 self.notify(f"Deck '{deck_name}' deleted", severity="information")
     
+    def action_limits(self) -> None:
+        """Edit the daily limits of the selected deck."""
+        table = self.query_one(DataTable)
+        
+        if table.cursor_row is not None and table.cursor_row >= 0:
+            row_key = table.coordinate_to_cell_key(table.cursor_coordinate).row_key
+            deck = Deck.get_by_id(int(table.get_row(row_key)[0]))
+            if deck:
+                def check_result(saved) -> None:
+                    if saved:
+                        self.load_decks()
+                
+                self.app.push_screen(DeckLimitsModal(deck), check_result)
+    
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Handle button presses."""
         if event.button.id == "new-btn":
             self.action_new_deck()
+        elif event.button.id == "filtered-btn":
+            self.action_new_filtered_deck()
         elif event.button.id == "delete-btn":
             self.action_delete()
     
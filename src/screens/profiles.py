@@ -0,0 +1,115 @@
+"""Profile switcher for TextuAnki - Colorful Design."""
+from textual.app import ComposeResult
+from textual.containers import Container
+from textual.screen import ModalScreen
+from textual.widgets import Static, DataTable, Input, Label
+from textual.binding import Binding
+
+from src.database.profiles import ProfileRegistry
+
+
+class ProfileSwitchModal(ModalScreen):
+    """Modal for switching to another profile or creating a new one.
+    
+    Dismisses with the chosen profile name, or None when cancelled.
+    """
+    
+    CSS = """
+    ProfileSwitchModal {
+        align: center middle;
+        background: #00000099;
+    }
+    
+    #modal-container {
+        width: 80;
+        height: auto;
+        border: round $primary;
+        background: $surface;
+        padding: 1 2;
+    }
+    
+    #modal-title {
+        text-align: center;
+        text-style: bold;
+        color: $primary;
+        margin: 0 0 1 0;
+        background: $surface;
+    }
+    
+    DataTable {
+        height: auto;
+        max-height: 15;
+        border: round $primary;
+        background: $surface;
+        color: $text;
+    }
+    
+    DataTable > .datatable--header {
+        background: $panel;
+        color: $accent;
+        text-style: bold;
+    }
+    
+    Label {
+        margin: 1 0 0 0;
+        color: $text;
+        background: $surface;
+    }
+    
+    Input {
+        border: round $secondary;
+        background: $panel;
+        color: $text;
+    }
+    
+    #modal-help {
+        text-align: center;
+        color: $text-muted;
+        margin: 1 0 0 0;
+        background: $surface;
+    }
+    """
+    
+    BINDINGS = [
+        Binding("escape", "cancel", "Cancel"),
+    ]
+    
+    def __init__(self, active: str):
+        super().__init__()
+        self.active = active
+        self.registry = ProfileRegistry()
+    
+    def compose(self) -> ComposeResult:
+        with Container(id="modal-container"):
+            yield Static("👤 Switch Profile", id="modal-title")
+            yield DataTable(id="profiles-table")
+            yield Label("New profile:")
+            yield Input(placeholder="Name, then ENTER", id="new-profile")
+            yield Static("ENTER to open • ESC to cancel", id="modal-help")
+    
+    def on_mount(self) -> None:
+        table = self.query_one(DataTable)
+        table.add_columns("", "Profile", "Database")
+        table.cursor_type = "row"
+        for profile in self.registry.profiles():
+            table.add_row(
+                "●" if profile.name == self.active else "",
+                profile.name,
+                str(profile.path),
+                key=profile.name
+            )
+        table.focus()
+    
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        self.dismiss(event.row_key.value)
+    
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        try:
+            profile = self.registry.add(event.value.strip())
+        except ValueError as e:
+            self.app.notify(str(e), severity="error")
+            return
+        self.dismiss(profile.name)
+    
+    def action_cancel(self) -> None:
+        self.dismiss(None)
@@ -0,0 +1,162 @@
+"""Statistics screen for TextuAnki - Colorful Design."""
+from textual.app import ComposeResult
+from textual.containers import VerticalScroll
+from textual.screen import Screen
+from textual.widgets import Static, DataTable
+from textual.binding import Binding
+
+from src.analytics import ReviewHistory, load_timing_stats
+from src.models.deck import get_deck_cache
+from src.profiler import profile_screen
+
+# Characters used to draw the daily review bar chart, lowest to highest
+BAR_LEVELS = " ▁▂▃▄▅▆▇█"
+
+
+def render_bars(values) -> str:
+    """Render a list of counts as a single-line bar chart."""
+    peak = max(values) if values else 0
+    if not peak:
+        return BAR_LEVELS[0] * len(values)
+    return "".join(
+        BAR_LEVELS[round(value / peak * (len(BAR_LEVELS) - 1))] for value in values
+    )
+
+
+@profile_screen
+class StatsScreen(Screen):
+    """Screen showing review history statistics."""
+    
+    CSS = """
+    StatsScreen {
+        background: $background;
+    }
+    
+    #stats-container {
+        width: 100%;
+        height: 100%;
+        padding: 2 4;
+        background: $background;
+    }
+    
+    #title {
+        text-align: center;
+        text-style: bold;
+        color: $primary;
+        margin: 1 0 2 0;
+    }
+    
+    .stats-section {
+        width: 100%;
+        height: auto;
+        border: round $primary;
+        background: $surface;
+        color: $text;
+        padding: 1 2;
+        margin: 1 0;
+    }
+    
+    DataTable {
+        height: auto;
+        max-height: 20;
+        margin: 1 0;
+        border: round $primary;
+        background: $surface;
+        color: $text;
+    }
+    
+    DataTable > .datatable--header {
+        background: $panel;
+        color: $accent;
+        text-style: bold;
+    }
+    
+    #instructions {
+        text-align: center;
+        color: $text-muted;
+        margin: 1 0;
+        background: $background;
+    }
+    """
+    
+    BINDINGS = [
+        Binding("escape", "back", "Back"),
+        Binding("r", "refresh", "Refresh"),
+    ]
+    
+    def compose(self) -> ComposeResult:
+        """Create child widgets for statistics."""
+        with VerticalScroll(id="stats-container"):
+            yield Static("📊 Statistics", id="title")
+            yield Static("", id="summary", classes="stats-section")
+            yield Static("", id="activity", classes="stats-section")
+            yield Static("", id="ratings", classes="stats-section")
+            yield DataTable(id="deck-table")
+            yield Static("R to refresh • ESC to go back", id="instructions")
+    
+    def on_mount(self) -> None:
+        """Load statistics when the screen mounts."""
+        table = self.query_one(DataTable)
+        table.add_columns("Deck", "Reviews", "Retention", "Cards/min", "Reveal p50", "Reveal p90")
+        table.cursor_type = "row"
+        self.load_stats()
+    
+    def load_stats(self) -> None:
+        """Load review history and fill in every section."""
+        history = ReviewHistory.load()
+        current, longest = history.streaks()
+        curve = history.retention_curve()
+        retention = f"{curve[-1][1]:.0%}" if curve else "—"
+        
+        self.query_one("#summary", Static).update(
+            f"[bold cyan]Total reviews:[/bold cyan] {history.total_reviews}\n"
+            f"[bold cyan]Current streak:[/bold cyan] {current} day(s)   "
+            f"[bold cyan]Longest streak:[/bold cyan] {longest} day(s)\n"
+            f"[bold cyan]7-day retention:[/bold cyan] {retention}"
+        )
+        
+        recent = history.recent_daily_counts(30)
+        self.query_one("#activity", Static).update(
+            f"[bold cyan]Last 30 days[/bold cyan] (max {max(recent)} reviews/day)\n\n"
+            f"{render_bars(recent)}"
+        )
+        
+        distribution = history.rating_distribution()
+        total = sum(distribution.values()) or 1
+        self.query_one("#ratings", Static).update(
+            "[bold cyan]Answer buttons[/bold cyan]\n\n" + "\n".join(
+                f"{name.capitalize():<6} {count:>8}  {count / total:6.1%}  "
+                f"{'█' * round(count / total * 40)}"
+                for name, count in distribution.items()
+            )
+        )
+        
+        table = self.query_one(DataTable)
+        table.clear()
+        deck_names = get_deck_cache().names()
+        reviews_by_deck = {}
+        for deck_id, reviews in zip(history.deck_id, history.reviews):
+            reviews_by_deck[deck_id] = reviews_by_deck.get(deck_id, 0) + reviews
+        timing = load_timing_stats()
+        
+        def seconds(ms) -> str:
+            return f"{ms / 1000:.1f}s" if ms is not None else "—"
+        
+        for deck_id, rate in sorted(history.deck_retention().items(), key=lambda item: item[1]):
+            deck_timing = timing.get(deck_id)
+            table.add_row(
+                deck_names.get(deck_id, f"#{deck_id}"),
+                str(reviews_by_deck.get(deck_id, 0)),
+                f"{rate:.1%}",
+                f"{deck_timing.cards_per_minute:.1f}" if deck_timing else "—",
+                seconds(deck_timing.reveal_percentile(50)) if deck_timing else "—",
+                seconds(deck_timing.reveal_percentile(90)) if deck_timing else "—"
+            )
+    
+    def action_refresh(self) -> None:
+        """Reload statistics."""
+        self.load_stats()
+    
+    def action_back(self) -> None:
+        """Return to dashboard."""
+        self.app.pop_screen()
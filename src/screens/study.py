@@ -1,14 +1,184 @@
 """Study screen for TextuAnki - Colorful Design."""
+import time
+
 from textual.app import ComposeResult
 from textual.containers import Container, Vertical, Horizontal
-from textual.screen import Screen
-from textual.widgets import Static, Button, Label
+from textual.screen import Screen, ModalScreen
+from textual.widgets import Static, Button, Label, DataTable, Input
 from textual.binding import Binding
+from typing import Optional
 
+from src.analytics import TimingStats
 from src.models.card import Card
+from src.models.deck import Deck
+from src.models.filtered_deck import FilteredDeck
+from src.models.media import is_sound, open_externally, references
 from src.models.review import Review
+from src.profiler import profile_screen
+from src.study_queue import StudyQueue
+from src.undo import UndoStack
+from src.widgets.card_renderer import PRERENDER_COUNT, CardRenderer
+from src.widgets.deck_picker import MAX_SHOWN, DeckPicker
+
+
+# Row key of the "All decks" entry in the deck picker
+ALL_DECKS = "all"
 
+# Row key prefix of filtered decks in the deck picker
+FILTERED_PREFIX = "filtered:"
 
+
+class StudyDeckModal(ModalScreen):
+    """Modal for choosing the deck subtree or filtered deck to study.
+    
+    Dismisses with a deck id, a FilteredDeck, ALL_DECKS, or None when cancelled.
+    """
+    
+    CSS = """
+    StudyDeckModal {
+        align: center middle;
+        background: #00000099;
+    }
+    
+    #modal-container {
+        width: 80;
+        height: auto;
+        max-height: 90%;
+        border: round $primary;
+        background: $surface;
+        padding: 1 2;
+    }
+    
+    #modal-title {
+        text-align: center;
+        text-style: bold;
+        color: $primary;
+        margin: 0 0 1 0;
+        background: $surface;
+    }
+    
+    DataTable {
+        height: auto;
+        max-height: 30;
+        border: round $primary;
+        background: $surface;
+        color: $text;
+    }
+    
+    DataTable > .datatable--header {
+        background: $panel;
+        color: $accent;
+        text-style: bold;
+    }
+    
+    #more-decks {
+        color: $text-muted;
+        background: $surface;
+    }
+    
+    #modal-help {
+        text-align: center;
+        color: $text-muted;
+        margin: 1 0 0 0;
+        background: $surface;
+    }
+    """
+    
+    BINDINGS = [
+        Binding("escape", "cancel", "Cancel"),
+        Binding("x", "delete_filtered", "Delete Filtered Deck"),
+        Binding("slash", "search", "Search"),
+    ]
+    
+    def __init__(self):
+        super().__init__()
+        self.summaries = []
+        self.filtered_decks = {}
+    
+    def compose(self) -> ComposeResult:
+        with Container(id="modal-container"):
+            yield Static("📝 Study Which Deck?", id="modal-title")
+            yield DeckPicker(id="deck-search", blank_label="All decks")
+            yield DataTable(id="deck-tree")
+            yield Static(id="more-decks")
+            yield Static(
+                "ENTER to study • / to search decks • X to delete a filtered deck • ESC to cancel",
+                id="modal-help"
+            )
+    
+    def on_mount(self) -> None:
+        table = self.query_one(DataTable)
+        table.add_columns("Deck", "Due", "New", "Total")
+        table.cursor_type = "row"
+        
+        self.summaries = Deck.get_summaries(include_subdecks=True)
+        for filtered in FilteredDeck.get_all():
+            self.filtered_decks[f"{FILTERED_PREFIX}{filtered.id}"] = filtered
+        self._fill_table()
+        table.focus()
+    
+    def _fill_table(self) -> None:
+        """Show the deck tree with card counts, then the filtered decks.
+        
+        Only the first MAX_SHOWN decks get a row; the deck search reaches the rest.
+        """
+        table = self.query_one(DataTable)
+        top_level = [summary for summary in self.summaries if summary.parent_id is None]
+        table.add_row(
+            "[bold]All decks[/bold]",
+            str(sum(summary.due for summary in top_level)),
+            str(sum(summary.new for summary in top_level)),
+            str(sum(summary.total for summary in top_level)),
+            key=ALL_DECKS
+        )
+        for summary in self.summaries[:MAX_SHOWN]:
+            table.add_row(
+                "  " * (summary.depth + 1) + summary.leaf_name,
+                str(summary.due),
+                str(summary.new),
+                str(summary.total),
+                key=str(summary.deck_id)
+            )
+        for key, filtered in self.filtered_decks.items():
+            table.add_row(f"🔎 {filtered.name}", "", "", "", key=key)
+        hidden = len(self.summaries) - MAX_SHOWN
+        self.query_one("#more-decks", Static).update(
+            f"... {hidden} more decks, press / to search them" if hidden > 0 else ""
+        )
+    
+    def on_deck_picker_changed(self, event: DeckPicker.Changed) -> None:
+        """Study the deck picked in the search."""
+        self.dismiss(ALL_DECKS if event.value is None else event.value)
+    
+    def action_search(self) -> None:
+        self.query_one("#deck-search", DeckPicker).query_one(Input).focus()
+    
+    def on_data_table_row_selected(self, event: DataTable.RowSelected) -> None:
+        key = event.row_key.value
+        if key == ALL_DECKS:
+            self.dismiss(ALL_DECKS)
+        elif key in self.filtered_decks:
+            self.dismiss(self.filtered_decks[key])
+        else:
+            self.dismiss(int(key))
+    
+    def action_delete_filtered(self) -> None:
+        """Delete the filtered deck under the cursor. Its cards are kept."""
+        table = self.query_one(DataTable)
+        if table.row_count == 0:
+            return
+        row_key = table.coordinate_to_cell_key(table.cursor_coordinate).row_key
+        filtered = self.filtered_decks.pop(row_key.value, None)
+        if filtered is not None:
+            filtered.delete()
+            table.remove_row(row_key)
+            self.app.notify(f"Filtered deck '{filtered.name}' deleted", severity="information")
+    
+    def action_cancel(self) -> None:
+        self.dismiss(None)
+
+
+@profile_screen
 class StudyScreen(Screen):
     """Screen for studying flashcards."""
     
@@ -129,20 +299,87 @@ class StudyScreen(Screen):
         Binding("2", "rate_hard", "Hard"),
         Binding("3", "rate_good", "Good"),
         Binding("4", "rate_easy", "Easy"),
+        Binding("u", "undo", "Undo"),
+        Binding("ctrl+z", "undo", "Undo", show=False),
+        Binding("p", "play_audio", "Play Audio"),
+        Binding("o", "open_images", "Open Images"),
     ]
     
-    def __init__(self):
+    def __init__(
+        self,
+        deck_id: Optional[int] = None,
+        shuffle: bool = False,
+        filtered: Optional[FilteredDeck] = None
+    ):
+        """Study a deck and its subdecks, every deck, or a filtered deck."""
         super().__init__()
-        self.cards = []
-        self.current_index = 0
+        self.deck_id = deck_id
+        self.shuffle = shuffle
+        self.filtered = filtered
+        self.queue = StudyQueue([])
+        self.current_card: Optional[Card] = None
         self.show_answer = False
+        self.shown_at: Optional[float] = None
+        self.revealed_at: Optional[float] = None
+        self.session_timing = TimingStats()
+        self.undo_stack = UndoStack()
+        self.renderer = CardRenderer()
+        self._wait_timer = None
     
     def on_mount(self) -> None:
         """Load cards when screen mounts."""
-        self.cards = Card.get_due_cards()
-        self.current_index = 0
+        title = self.query_one("#title", Static)
+        if self.filtered is not None:
+            # Filtered decks ignore daily limits and are read a page at a time
+            title.update(f"🔎 Filtered Deck: {self.filtered.name}")
+            self.queue = StudyQueue([], shuffle=self.shuffle, pages=self.filtered.iter_pages())
+            self.next_card()
+            return
+        
+        if self.deck_id is not None:
+            deck = Deck.get_by_id(self.deck_id)
+            if deck:
+                title.update(f"📝 Study Session: {deck.name}")
+        self.queue = StudyQueue(Card.get_study_queue(self.deck_id), shuffle=self.shuffle)
+        self.next_card()
+    
+    def next_card(self) -> None:
+        """Show the next card from the queue and start timing it."""
+        self.show_card(self.queue.current(time.monotonic()))
+        
+        # Only relearning cards are left and none is due yet
+        if self.current_card is None and len(self.queue):
+            wait = self.queue.next_due_in(time.monotonic())
+            self._wait_timer = self.set_timer(wait + 0.1, self.next_card)
+    
+    def show_card(self, card: Optional[Card]) -> None:
+        """Show a card's question and start timing it."""
+        if self._wait_timer is not None:
+            self._wait_timer.stop()
+            self._wait_timer = None
+        self.current_card = card
         self.show_answer = False
         self.refresh_display()
+        self.start_card_timer()
+        self.prerender_upcoming()
+    
+    def prerender_upcoming(self) -> None:
+        """Render the answer of this card and the next few cards off the UI thread."""
+        width = self.query_one("#card-content", Static).size.width
+        if width < 1 or self.current_card is None:
+            return
+        cards = [self.current_card, *self.queue.upcoming(PRERENDER_COUNT)]
+        self.run_worker(
+            lambda: self.renderer.prerender(cards, width),
+            thread=True,
+            exclusive=True,
+            group="prerender"
+        )
+    
+    def start_card_timer(self) -> None:
+        """Start timing the question that is now on screen."""
+        self.shown_at = time.monotonic()
+        self.revealed_at = None
     
     def compose(self) -> ComposeResult:
         """Create child widgets for study mode."""
@@ -160,7 +397,7 @@ class StudyScreen(Screen):
                 yield Button("Easy [4]", classes="rating-btn rating-easy", id="easy-btn")
             
             yield Static(
-                "Press SPACE to reveal • 1-4 to rate • ESC to exit",
+                "Press SPACE to reveal • 1-4 to rate • U to undo • ESC to exit",
                 id="instructions"
             )
     
@@ -169,60 +406,131 @@ class StudyScreen(Screen):
         content_widget = self.query_one("#card-content", Static)
         progress_widget = self.query_one("#progress", Static)
         
-        if not self.cards:
-            content_widget.update("🎉 No cards due! Great work!")
+        card = self.current_card
+        if card is None and len(self.queue):
+            wait = self.queue.next_due_in(time.monotonic()) or 0
+            content_widget.update(
+                f"⏳ {len(self.queue)} card(s) relearning\n\n"
+                f"Next card in {wait / 60:.0f} min"
+            )
+            progress_widget.update("")
+            self.query_one("#rating-buttons").display = False
+            return
+        
+        if card is None:
+            summary = "🎉 No cards due! Great work!"
+            timing = self.session_timing
+            if timing.reviews:
+                median = timing.reveal_percentile(50)
+                summary += (
+                    f"\n\n{timing.reviews} cards in {timing.total_ms / 60000:.1f} min "
+                    f"({timing.cards_per_minute:.1f} cards/min)"
+                )
+                if median is not None:
+                    summary += f"\nMedian time to reveal: {median / 1000:.1f}s"
+            content_widget.update(summary)
             progress_widget.update("")
             self.query_one("#rating-buttons").display = False
             return
         
         self.query_one("#rating-buttons").display = True
-        card = self.cards[self.current_index]
         
         # Update progress
-        progress_widget.update(f"Card {self.current_index + 1} of {len(self.cards)}")
+        progress = f"{len(self.queue)}{'' if self.queue.exhausted else '+'} remaining"
+        if self.queue.learning_count:
+            progress += f" • {self.queue.learning_count} relearning"
+        if self.session_timing.reviews:
+            progress += f" • {self.session_timing.cards_per_minute:.1f} cards/min"
+        progress_widget.update(progress)
         
-        # Update content
+        # Update content, usually already rendered in the background
+        content_widget.update(
+            self.renderer.render(card, self.show_answer, content_widget.size.width)
+        )
         if self.show_answer:
-            content_widget.update(
-                f"[bold cyan]Question:[/bold cyan]\n\n{card.front}\n\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━\n\n"
-                f"[bold green]Answer:[/bold green]\n\n{card.back}"
-            )
             # Show rating buttons
             for btn in self.query(Button):
                 btn.disabled = False
         else:
-            content_widget.update(f"[bold cyan]Question:[/bold cyan]\n\n{card.front}")
             # Hide rating buttons
             for btn in self.query(Button):
                 btn.disabled = True
     
     def action_reveal(self) -> None:
         """Reveal the answer."""
-        if self.cards and not self.show_answer:
+        if self.current_card is not None and not self.show_answer:
+            self.revealed_at = time.monotonic()
             self.show_answer = True
             self.refresh_display()
     
     def rate_card(self, rating: int) -> None:
         """Rate the current card and move to next."""
-        if not self.cards or not self.show_answer:
+        card = self.current_card
+        if card is None or not self.show_answer:
             return
         
-        card = self.cards[self.current_index]
-        if card.id is not None:
+        now = time.monotonic()
+        duration_ms = round((now - self.shown_at) * 1000)
+        reveal_ms = round((self.revealed_at - self.shown_at) * 1000)
+        self.session_timing.add(duration_ms, reveal_ms)
+        
+        review_undo = None
+        # Relearning steps are in-session only; the card was scheduled when first answered
+        if card.id is not None and not self.queue.is_relearning(card):
             review = Review.get_by_card_id(card.id)
             
             if review:
-                review.record_review(rating)
+                review_undo = review.record_review(rating, duration_ms, reveal_ms)
         
-        # Move to next card
-        self.cards.pop(self.current_index)
+        answer_undo = self.queue.answer(card, rating, now)
         
-        if self.current_index >= len(self.cards) and self.cards:
-            self.current_index = len(self.cards) - 1
+        def revert() -> None:
+            if review_undo is not None:
+                Review.undo(review_undo)
+            self.queue.undo(answer_undo)
+            self.session_timing.discard(duration_ms, reveal_ms)
+            self.show_card(card)
         
-        self.show_answer = False
-        self.refresh_display()
+        self.undo_stack.push(f"rating of '{card.front[:30]}'", revert)
+        self.next_card()
+    
+    def _shown_media(self, sound: bool) -> list:
+        """Media referenced by the side of the current card on screen."""
+        card = self.current_card
+        if card is None:
+            return []
+        text = card.back if self.show_answer else card.front
+        return [name for name in references(text) if is_sound(name) == sound]
+    
+    def action_play_audio(self) -> None:
+        """Play the first sound on the side of the card on screen."""
+        sounds = self._shown_media(sound=True)
+        if not sounds:
+            self.notify("No audio on this side of the card", severity="warning")
+            return
+        error = open_externally(sounds[0])
+        if error:
+            self.notify(error, severity="error")
+    
+    def action_open_images(self) -> None:
+        """Show the images on the side of the card on screen in the system viewer."""
+        images = self._shown_media(sound=False)
+        if not images:
+            self.notify("No images on this side of the card", severity="warning")
+            return
+        for name in images:
+            error = open_externally(name)
+            if error:
+                self.notify(error, severity="error")
+                return
+    
+    def action_undo(self) -> None:
+        """Revert the last rating and show its card again."""
+        label = self.undo_stack.undo()
+        if label is None:
+            self.notify("Nothing to undo", severity="warning")
+        else:
+            self.notify(f"Undid {label}", severity="information")
     
     def action_rate_again(self) -> None:
         """Rate card as 'Again' (difficulty 0)."""
@@ -0,0 +1,278 @@
+"""In-session study scheduling for TextuAnki.
+
+Cards waiting for their first answer are kept in a heap keyed on their
+position in the day's queue, optionally read in pages as it drains;
+lapsed cards move to a relearning heap keyed on the monotonic
+time they are due again. Both are plain ``heapq`` lists, so taking and
+requeueing a card is O(log n).
+"""
+import heapq
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from src.models.card import Card
+from src.models.review import LAPSE_RATING
+
+# Delays in seconds before a lapsed card is shown again this session
+RELEARN_STEPS = (60, 600)
+
+# Relearning cards due within this many seconds are shown early rather than
+# waiting, once nothing else is left to study
+LEARN_AHEAD = 20 * 60
+
+# Rating that sends a relearning card back to the first step
+AGAIN_RATING = 1
+
+
+def sibling_key(card: Card) -> Hashable:
+    """Cards with the same key are siblings, e.g. a card and its reverse.
+    
+    Cards generated from the same note, such as its clozes, are always
+    siblings.
+    """
+    if card.note_id is not None:
+        return ("note", card.note_id)
+    return frozenset((card.front.strip().casefold(), card.back.strip().casefold()))
+
+
+@dataclass
+class AnswerUndo:
+    """Queue state changed by one answer, used by StudyQueue.undo()."""
+    card: Card
+    entry: tuple
+    from_learning: bool
+    step: Optional[int]
+    requeued: Optional[tuple]
+    buried: List[int]
+    sibling_key: Hashable
+    siblings: Optional[List[int]]
+
+
+class StudyQueue:
+    """Priority queue of the cards left to study in one session.
+    
+    Answering a card buries its siblings for the rest of the session, and
+    lapsed cards come back after each of ``relearn_steps`` until they are
+    answered correctly at the last step. Only a card's first answer of the
+    session is scheduled (Review.record_review); the relearning steps
+    after it live in the queue alone.
+    """
+    
+    def __init__(
+        self,
+        cards: Sequence[Card],
+        relearn_steps: Sequence[int] = RELEARN_STEPS,
+        learn_ahead: float = LEARN_AHEAD,
+        bury_siblings: bool = True,
+        shuffle: bool = False,
+        seed: Optional[int] = None,
+        key: Callable[[Card], Hashable] = sibling_key,
+        pages: Optional[Iterator[List[Card]]] = None,
+    ):
+        """Build the queue from the day's cards, in study order.
+        
+        Args:
+            cards: Cards to study, e.g. from Card.get_study_queue()
+            relearn_steps: Delays in seconds for lapsed cards
+            learn_ahead: Show relearning cards this many seconds early when idle
+            bury_siblings: Skip the siblings of answered cards
+            shuffle: Randomize the order across decks
+            seed: Random seed used when shuffling
+            key: Function grouping cards into siblings
+            pages: More cards, read a page at a time once the others run out
+        """
+        self.relearn_steps = tuple(relearn_steps)
+        self.learn_ahead = learn_ahead
+        self.bury_siblings = bury_siblings
+        self.key = key
+        
+        self._random = random.Random(seed) if shuffle else None
+        self._pages = pages
+        self._pending: List[Tuple[int, Card]] = []
+        self._learning: List[Tuple[float, int, Card]] = []
+        self._sequence = 0
+        
+        # Card ids still queued, for lazy removal of buried siblings
+        self._queued: Set[int] = set()
+        self._entries: Dict[int, Tuple[int, Card]] = {}
+        self._siblings: Dict[Hashable, List[int]] = {}
+        self._steps: Dict[int, int] = {}
+        self.buried = 0
+        self.add(cards)
+    
+    def add(self, cards: Iterable[Card]) -> None:
+        """Queue more cards after the ones already pending."""
+        cards = [card for card in cards if card.id not in self._queued]
+        order = list(range(self._sequence, self._sequence + len(cards)))
+        if self._random is not None:
+            self._random.shuffle(order)
+        self._sequence += len(cards)
+        
+        for position, card in zip(order, cards):
+            entry = (position, card)
+            heapq.heappush(self._pending, entry)
+            self._entries[card.id] = entry
+            self._queued.add(card.id)
+            self._siblings.setdefault(self.key(card), []).append(card.id)
+    
+    @property
+    def exhausted(self) -> bool:
+        """Whether every card has been read into the queue."""
+        return self._pages is None
+    
+    def __len__(self) -> int:
+        return len(self._queued)
+    
+    def is_relearning(self, card: Card) -> bool:
+        """Whether the card was already answered this session and is back for a step."""
+        return card.id in self._steps
+    
+    @property
+    def learning_count(self) -> int:
+        """Number of cards waiting for a relearning step."""
+        return len(self._learning)
+    
+    def _discard_buried(self) -> None:
+        while True:
+            while self._pending and self._pending[0][1].id not in self._queued:
+                heapq.heappop(self._pending)
+            if self._pending or self._pages is None:
+                return
+            page = next(self._pages, None)
+            if page is None:
+                self._pages = None
+            else:
+                self.add(page)
+    
+    def current(self, now: float) -> Optional[Card]:
+        """Card to show at monotonic time ``now``, or None if nothing is due.
+        
+        Relearning cards take priority once due; otherwise the next pending
+        card is shown, and when none are left relearning cards within the
+        learn-ahead window are shown early.
+        """
+        if self._learning and self._learning[0][0] <= now:
+            return self._learning[0][2]
+        self._discard_buried()
+        if self._pending:
+            return self._pending[0][1]
+        if self._learning and self._learning[0][0] <= now + self.learn_ahead:
+            return self._learning[0][2]
+        return None
+    
+    def upcoming(self, count: int) -> List[Card]:
+        """Up to ``count`` pending cards likely to be shown next, soonest first.
+        
+        Only looks at the top of the heap, which holds the smallest
+        entries, so it is cheap for any queue size; buried siblings and
+        relearning cards coming due may change the actual order.
+        """
+        top = heapq.nsmallest(count, self._pending[:2 ** count - 1])
+        return [card for _, card in top if card.id in self._queued]
+    
+    def next_due_in(self, now: float) -> Optional[float]:
+        """Seconds until the next relearning card is due, or None if empty."""
+        if not self._learning:
+            return None
+        return max(0.0, self._learning[0][0] - now)
+    
+    def _take(self, card: Card) -> Tuple[tuple, bool]:
+        """Remove the heap entry of ``card`` and return it."""
+        if self._learning and self._learning[0][2] is card:
+            return heapq.heappop(self._learning), True
+        self._discard_buried()
+        if self._pending and self._pending[0][1] is card:
+            return heapq.heappop(self._pending), False
+        
+        # Not at the top, e.g. a card shown again after an undo
+        for heap, from_learning in ((self._learning, True), (self._pending, False)):
+            for index, entry in enumerate(heap):
+                if entry[-1] is card:
+                    heap[index] = heap[-1]
+                    heap.pop()
+                    heapq.heapify(heap)
+                    return entry, from_learning
+        raise ValueError(f"card {card.id} is not in the queue")
+    
+    def answer(self, card: Card, rating: int, now: float) -> AnswerUndo:
+        """Remove an answered card, requeueing it if it needs relearning.
+        
+        Args:
+            card: The card returned by current()
+            rating: The rating given (0-4)
+            now: Monotonic time of the answer
+        
+        Returns:
+            The queue changes, for undo()
+        """
+        entry, from_learning = self._take(card)
+        previous_step = step = self._steps.get(card.id)
+        if step is None:
+            step = 0 if rating <= LAPSE_RATING else None
+        elif rating <= AGAIN_RATING:
+            step = 0
+        elif rating == 2:
+            # Hard repeats the current step
+            pass
+        elif rating == 3:
+            step += 1
+        else:
+            step = None
+        
+        undo = AnswerUndo(
+            card=card,
+            entry=entry,
+            from_learning=from_learning,
+            step=previous_step,
+            requeued=None,
+            buried=[],
+            sibling_key=self.key(card),
+            siblings=None
+        )
+        
+        if step is not None and step < len(self.relearn_steps):
+            self._steps[card.id] = step
+            self._sequence += 1
+            undo.requeued = (now + self.relearn_steps[step], self._sequence, card)
+            heapq.heappush(self._learning, undo.requeued)
+        else:
+            self._steps.pop(card.id, None)
+            self._queued.discard(card.id)
+        
+        if self.bury_siblings:
+            undo.siblings = self._siblings.pop(undo.sibling_key, None)
+            for sibling_id in undo.siblings or ():
+                if sibling_id != card.id and sibling_id in self._queued:
+                    self._queued.discard(sibling_id)
+                    undo.buried.append(sibling_id)
+            self.buried += len(undo.buried)
+        return undo
+    
+    def undo(self, undo: AnswerUndo) -> None:
+        """Put the queue back as it was before an answer.
+        
+        Undo answers in reverse order; the card is queued where it was.
+        """
+        card = undo.card
+        if undo.requeued is not None:
+            self._learning.remove(undo.requeued)
+            heapq.heapify(self._learning)
+        heapq.heappush(self._learning if undo.from_learning else self._pending, undo.entry)
+        
+        if undo.step is None:
+            self._steps.pop(card.id, None)
+        else:
+            self._steps[card.id] = undo.step
+        self._queued.add(card.id)
+        
+        if undo.siblings is not None:
+            self._siblings[undo.sibling_key] = undo.siblings
+        if undo.buried:
+            buried = set(undo.buried)
+            self._queued.update(buried)
+            self.buried -= len(buried)
+            # Buried entries may already have been dropped from the heap
+            present = {entry[1].id for entry in self._pending}
+            for sibling_id in buried - present:
+                heapq.heappush(self._pending, self._entries[sibling_id])
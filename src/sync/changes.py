@@ -0,0 +1,406 @@
+"""Change tracking shared by the sync client and server.
+
+Rows travel as JSON arrays ``[guid, usn, mtime, *columns, *references]``,
+where each reference is the guid of the referenced row, since row ids
+differ between collections. Deletions travel as ``[guid, usn, table]``.
+"""
+import gzip
+import json
+import sqlite3
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Bumped whenever the row format changes; client and server must agree
+SYNC_VERSION = 3
+
+# Rows per request
+BATCH_SIZE = 2000
+
+# gzip level of request and response bodies. Rows are repetitive, so fast
+# levels compress nearly as well as the slowest.
+COMPRESS_LEVEL = 6
+
+# usn of rows changed since the last sync
+DIRTY = -1
+
+# Pseudo-table name under which deletions are exchanged
+GRAVES = "graves"
+
+
+class SyncError(Exception):
+    """Raised when a sync cannot be completed.
+    
+    Attributes:
+        status: HTTP status the server answers with
+    """
+    
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass(frozen=True)
+class TableSpec:
+    """How the rows of one table are exchanged.
+    
+    Attributes:
+        name: Table name
+        columns: Columns copied as they are
+        references: (column, referenced table) pairs sent as guids
+    """
+    name: str
+    columns: Tuple[str, ...]
+    references: Tuple[Tuple[str, str], ...] = ()
+    
+    def select_list(self) -> str:
+        """Columns of a row in exchange order, for ``SELECT ... FROM table t``."""
+        references = [
+            f"(SELECT guid FROM {target} WHERE id = t.{column})"
+            for column, target in self.references
+        ]
+        columns = [f"t.{column}" for column in self.columns]
+        return ", ".join(["t.guid", "t.usn", "t.mtime", *columns, *references])
+
+
+# Exchanged tables, parents before children
+TABLES = (
+    TableSpec(
+        "decks",
+        ("name", "description", "created_at", "updated_at", "new_per_day", "reviews_per_day"),
+        (("parent_id", "decks"),)
+    ),
+    TableSpec(
+        "note_types",
+        ("name", "kind", "fields", "templates", "created_at", "updated_at"),
+    ),
+    TableSpec(
+        "notes",
+        ("fields", "tags", "created_at", "updated_at"),
+        (("note_type_id", "note_types"),)
+    ),
+    TableSpec(
+        "cards",
+        ("front", "back", "tags", "created_at", "updated_at", "ordinal", "content_hash"),
+        (("deck_id", "decks"), ("note_id", "notes"))
+    ),
+    TableSpec(
+        "reviews",
+        ("ease_factor", "interval", "repetitions", "due_date", "last_review", "lapses"),
+        (("card_id", "cards"),)
+    ),
+    TableSpec(
+        "study_sessions",
+        ("rating", "duration", "reveal_duration", "reviewed_at"),
+        (("card_id", "cards"),)
+    ),
+)
+TABLES_BY_NAME = {spec.name: spec for spec in TABLES}
+
+# Tables whose rows are also matched by name, the first column, so a row
+# created on both sides (such as the built-in note types) becomes one row
+NAMED_TABLES = ("decks", "note_types")
+
+
+def encode(payload: Any) -> bytes:
+    """Serialize a request or response body as gzip-compressed JSON."""
+    return gzip.compress(
+        json.dumps(payload, separators=(",", ":")).encode("utf-8"), compresslevel=COMPRESS_LEVEL
+    )
+
+
+def decode(data: bytes) -> Any:
+    """Parse a body produced by encode()."""
+    return json.loads(gzip.decompress(data))
+
+
+def get_meta(cursor: sqlite3.Cursor, key: str, default: Optional[str] = None) -> Optional[str]:
+    """Read a value from ``sync_meta``."""
+    row = cursor.execute("SELECT value FROM sync_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(cursor: sqlite3.Cursor, key: str, value: Any) -> None:
+    """Write a value to ``sync_meta``."""
+    cursor.execute(
+        "INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)", (key, str(value))
+    )
+
+
+def assign_guids(cursor: sqlite3.Cursor) -> None:
+    """Give rows that were never synced their guid."""
+    for spec in TABLES:
+        cursor.execute(
+            f"UPDATE {spec.name} SET guid = lower(hex(randomblob(16))) WHERE guid IS NULL"
+        )
+
+
+def read_changes(
+    cursor: sqlite3.Cursor,
+    table: str,
+    since: int,
+    until: int,
+    after: Optional[Sequence] = None,
+    limit: int = BATCH_SIZE,
+) -> Tuple[List[list], Optional[list]]:
+    """Read a page of rows with ``since < usn <= until``.
+    
+    Args:
+        table: Table name, or GRAVES for deletions
+        since: Exclusive lower usn bound
+        until: Inclusive upper usn bound
+        after: Position returned with the previous page, None for the first
+        limit: Maximum number of rows
+    
+    Returns:
+        The rows in exchange format and the position of the last one
+    """
+    if table == GRAVES:
+        select, key = "t.guid, t.usn, t.table_name", "t.guid"
+        source = "sync_graves t"
+    else:
+        select, key = TABLES_BY_NAME[table].select_list(), "t.id"
+        source = f"{table} t"
+    
+    def fetch(condition: str, params: tuple, count: int) -> List[list]:
+        cursor.execute(
+            f"""SELECT {select}, {key} FROM {source} WHERE {condition}
+                ORDER BY t.usn, {key} LIMIT ?""",
+            (*params, count)
+        )
+        return [list(row) for row in cursor.fetchall()]
+    
+    # Two range queries rather than one row-value comparison, which
+    # SQLite cannot use to seek the usn index
+    rows = []
+    if after is not None:
+        rows = fetch(f"t.usn = ? AND {key} > ?", tuple(after), limit)
+    if len(rows) < limit:
+        lower = after[0] if after is not None else since
+        rows += fetch("t.usn > ? AND t.usn <= ?", (lower, until), limit - len(rows))
+    if not rows:
+        return [], None
+    position = [rows[-1][1], rows[-1][-1]]
+    return [row[:-1] for row in rows], position
+
+
+def read_pending(
+    cursor: sqlite3.Cursor,
+    table: str,
+    after: Optional[Sequence] = None,
+    limit: int = BATCH_SIZE,
+) -> Tuple[List[list], Optional[list]]:
+    """Read a page of rows changed since the last sync, like read_changes()."""
+    return read_changes(cursor, table, DIRTY - 1, DIRTY, after, limit)
+
+
+def _lookup(cursor: sqlite3.Cursor, query: str, keys) -> Dict:
+    """Map the first column of ``query`` to the rest, for keys bound as a JSON array."""
+    cursor.execute(query, (json.dumps(list(keys)),))
+    return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+
+@dataclass
+class ApplyResult:
+    """Outcome of applying a page of rows."""
+    applied: int = 0
+    conflicts: int = 0
+    skipped: int = 0
+
+
+def apply_rows(
+    cursor: sqlite3.Cursor,
+    table: str,
+    rows: List[list],
+    usn: Optional[int] = None,
+) -> ApplyResult:
+    """Insert or update rows received from the other side.
+    
+    A row changed locally since the last sync is only overwritten by a
+    newer change (by mtime); otherwise the local change is kept and sent
+    back. Decks and note types are also matched by name, so a deck
+    created on both sides becomes one deck. Rows deleted here since the
+    last sync, or referencing such a row, are skipped, so deletions win
+    over edits.
+    
+    Args:
+        table: Table name
+        rows: Rows in exchange format
+        usn: usn to store, defaults to the one sent with each row
+    """
+    spec = TABLES_BY_NAME[table]
+    width = len(spec.columns)
+    result = ApplyResult()
+    if table == "decks":
+        # Parents first, so new subdecks can link to new parents
+        rows = sorted(rows, key=lambda row: row[3].count("::"))
+    
+    local = _lookup(
+        cursor,
+        f"SELECT guid, id, usn, mtime FROM {table} WHERE guid IN (SELECT value FROM json_each(?))",
+        (row[0] for row in rows)
+    )
+    graves = _lookup(
+        cursor,
+        "SELECT guid, usn FROM sync_graves WHERE guid IN (SELECT value FROM json_each(?))",
+        (row[0] for row in rows)
+    )
+    by_name = {}
+    if table in NAMED_TABLES:
+        by_name = _lookup(
+            cursor,
+            f"SELECT name, id, usn, mtime FROM {table} WHERE name IN (SELECT value FROM json_each(?))",
+            (row[3] for row in rows)
+        )
+    references = {}
+    for index, (column, target) in enumerate(spec.references):
+        references[target] = {
+            guid: ids[0] for guid, ids in _lookup(
+                cursor,
+                f"SELECT guid, id FROM {target} WHERE guid IN (SELECT value FROM json_each(?))",
+                {row[3 + width + index] for row in rows if row[3 + width + index]}
+            ).items()
+        }
+    
+    assignments = ", ".join(
+        f"{column} = ?" for column in ("guid", "usn", "mtime", *spec.columns)
+        + tuple(column for column, _ in spec.references)
+    )
+    insert_columns = ", ".join(
+        ("guid", "usn", "mtime", *spec.columns) + tuple(column for column, _ in spec.references)
+    )
+    placeholders = ", ".join("?" * (3 + width + len(spec.references)))
+    
+    for row in rows:
+        guid, row_usn, mtime = row[:3]
+        values = row[3:3 + width]
+        reference_ids = _resolve_references(cursor, spec, values, row[3 + width:], references)
+        if reference_ids is None or graves.get(guid) == (DIRTY,):
+            result.skipped += 1
+            continue
+        
+        existing = local.get(guid) or by_name.get(values[0])
+        params = (guid, row_usn if usn is None else usn, mtime, *values, *reference_ids)
+        if existing is not None:
+            local_id, local_usn, local_mtime = existing
+            if local_usn == DIRTY:
+                result.conflicts += 1
+            if local_usn == DIRTY and local_mtime >= mtime:
+                # The local change wins; a row matched by name still takes
+                # the guid the other side knows it by
+                if guid not in local:
+                    cursor.execute(f"UPDATE {table} SET guid = ? WHERE id = ?", (guid, local_id))
+            else:
+                cursor.execute(f"UPDATE {table} SET {assignments} WHERE id = ?", (*params, local_id))
+        else:
+            cursor.execute(f"INSERT INTO {table} ({insert_columns}) VALUES ({placeholders})", params)
+            local_id = cursor.lastrowid
+            if guid in graves:
+                # Deleted and then restored with undo
+                cursor.execute("DELETE FROM sync_graves WHERE guid = ?", (guid,))
+            if table == "study_sessions":
+                _add_to_review_stats(cursor, local_id)
+        
+        if table == "decks":
+            references["decks"][guid] = local_id
+        result.applied += 1
+    return result
+
+
+def _resolve_references(
+    cursor: sqlite3.Cursor,
+    spec: TableSpec,
+    values: Sequence,
+    guids: Sequence[Optional[str]],
+    references: Dict[str, Dict[str, int]],
+) -> Optional[list]:
+    """Translate the reference guids of a row to local ids.
+    
+    Returns None if a referenced row does not exist here, i.e. it was
+    deleted. A deck's parent falls back to the deck named by its name's
+    prefix, which determines the parent anyway.
+    """
+    ids = []
+    for (column, target), guid in zip(spec.references, guids):
+        reference_id = references[target].get(guid) if guid else None
+        if guid and reference_id is None:
+            if column != "parent_id":
+                return None
+            parent = cursor.execute(
+                "SELECT id FROM decks WHERE name = ?", (values[0].rsplit("::", 1)[0],)
+            ).fetchone()
+            reference_id = parent[0] if parent else None
+        ids.append(reference_id)
+    return ids
+
+
+def _add_to_review_stats(cursor: sqlite3.Cursor, session_id: int) -> None:
+    """Count a received study session in the daily per-deck aggregates.
+    
+    Whether the card was new is not part of a session, so received
+    reviews never count towards the new-card limit.
+    """
+    cursor.execute(
+        """INSERT INTO review_stats
+               (day, deck_id, reviews, again, hard, good, easy, total_duration)
+           SELECT substr(s.reviewed_at, 1, 10), c.deck_id, 1, s.rating <= 1, s.rating = 2,
+                  s.rating = 3, s.rating >= 4, COALESCE(s.duration, 0)
+           FROM study_sessions s JOIN cards c ON c.id = s.card_id
+           WHERE s.id = ?
+           ON CONFLICT (day, deck_id) DO UPDATE SET
+               reviews = reviews + 1,
+               again = again + excluded.again,
+               hard = hard + excluded.hard,
+               good = good + excluded.good,
+               easy = easy + excluded.easy,
+               total_duration = total_duration + excluded.total_duration""",
+        (session_id,)
+    )
+
+
+def _remove_from_review_stats(cursor: sqlite3.Cursor, guid: str) -> None:
+    """Take a study session deleted elsewhere, i.e. an undone rating, out of the daily aggregates."""
+    cursor.execute(
+        """UPDATE review_stats
+           SET reviews = reviews - 1,
+               again = again - (s.rating <= 1),
+               hard = hard - (s.rating = 2),
+               good = good - (s.rating = 3),
+               easy = easy - (s.rating >= 4),
+               total_duration = total_duration - COALESCE(s.duration, 0)
+           FROM study_sessions s JOIN cards c ON c.id = s.card_id
+           WHERE s.guid = ? AND review_stats.day = substr(s.reviewed_at, 1, 10)
+             AND review_stats.deck_id = c.deck_id""",
+        (guid,)
+    )
+
+
+def apply_graves(cursor: sqlite3.Cursor, rows: List[list], usn: Optional[int] = None) -> int:
+    """Delete the rows named by received deletions and record the deletions.
+    
+    Args:
+        rows: Deletions in exchange format
+        usn: usn to record, defaults to the one sent with each deletion
+    
+    Returns:
+        Number of rows deleted
+    """
+    deleted = 0
+    for guid, row_usn, table in rows:
+        if table not in TABLES_BY_NAME:
+            continue
+        if table == "study_sessions":
+            _remove_from_review_stats(cursor, guid)
+        cursor.execute(f"DELETE FROM {table} WHERE guid = ?", (guid,))
+        deleted += cursor.rowcount
+        cursor.execute(
+            """INSERT INTO sync_graves (guid, table_name, usn) VALUES (?, ?, ?)
+               ON CONFLICT (guid) DO UPDATE SET usn = excluded.usn""",
+            (guid, table, row_usn if usn is None else usn)
+        )
+    return deleted
+
+
+def mark_synced(cursor: sqlite3.Cursor, usn: int) -> None:
+    """Record every changed row and deletion as synced at ``usn``."""
+    for table in (*TABLES_BY_NAME, "sync_graves"):
+        cursor.execute(f"UPDATE {table} SET usn = ? WHERE usn = ?", (usn, DIRTY))
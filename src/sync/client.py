@@ -0,0 +1,175 @@
+"""Sync client for TextuAnki.
+
+A sync pulls the rows the server has received since the last sync,
+resolves them against local changes, then pushes the local changes that
+are left. Only changed rows are exchanged, in compressed pages. The
+local side runs in one write transaction that commits only once the
+server has committed, so a failed sync leaves both collections unchanged.
+"""
+import json
+import sqlite3
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.database.db import Database, get_db
+from src.database.oplog import COLLECTION, log_change, publish_changes
+from src.sync.changes import (
+    DIRTY, GRAVES, SYNC_VERSION, TABLES_BY_NAME, SyncError,
+    apply_graves, apply_rows, assign_guids, decode, encode, get_meta,
+    mark_synced, read_pending, set_meta,
+)
+
+# Seconds to wait for a server response
+REQUEST_TIMEOUT = 60.0
+
+
+@dataclass
+class SyncReport:
+    """Outcome of a sync."""
+    pulled: int = 0
+    pushed: int = 0
+    deleted: int = 0
+    conflicts: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    usn: int = 0
+    duration: float = 0.0
+    
+    def summary(self) -> str:
+        """One-line human readable summary."""
+        return (
+            f"Pulled {self.pulled} and pushed {self.pushed} changes, "
+            f"deleted {self.deleted} rows, resolved {self.conflicts} conflicts "
+            f"({self.bytes_sent / 1024:.1f} KiB sent, {self.bytes_received / 1024:.1f} KiB "
+            f"received) in {self.duration * 1000:.0f} ms"
+        )
+
+
+class _Remote:
+    """Posts requests to a sync server, counting transferred bytes."""
+    
+    def __init__(self, url: str, token: Optional[str], report: SyncReport):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.report = report
+    
+    def post(self, endpoint: str, payload: Dict) -> Dict:
+        body = encode(payload)
+        headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        if self.token is not None:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(f"{self.url}/{endpoint}", data=body, headers=headers)
+        
+        self.report.bytes_sent += len(body)
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                data = response.read()
+        except urllib.error.HTTPError as e:
+            data = e.read()
+            try:
+                message = decode(data)["error"]
+            except (OSError, ValueError, KeyError):
+                message = f"HTTP {e.code}"
+            raise SyncError(message, status=e.code) from e
+        except urllib.error.URLError as e:
+            raise SyncError(f"Cannot reach sync server {self.url}: {e.reason}") from e
+        self.report.bytes_received += len(data)
+        return decode(data)
+
+
+def sync(url: Optional[str] = None, token: Optional[str] = None, db: Optional[Database] = None) -> SyncReport:
+    """Exchange changes with a sync server.
+    
+    Args:
+        url: Server URL, e.g. http://127.0.0.1:27701. Defaults to the last one used.
+        token: Shared secret the server was started with
+        db: Collection to sync. Defaults to the global instance.
+    
+    Raises:
+        SyncError: If no server is given or the sync fails
+    """
+    db = db or get_db()
+    report = SyncReport()
+    start = time.perf_counter()
+    
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        url = url or get_meta(cursor, "server_url")
+        if url is None:
+            raise SyncError("No sync server given and none used before")
+        remote = _Remote(url, token, report)
+        
+        assign_guids(cursor)
+        started = remote.post("start", {"version": SYNC_VERSION})
+        session = started["session"]
+        try:
+            since = int(get_meta(cursor, "last_usn", "0"))
+            if get_meta(cursor, "server") != started["collection"]:
+                # A server we have not synced with: merge everything by guid
+                since = 0
+                for table in TABLES_BY_NAME:
+                    cursor.execute(f"UPDATE {table} SET usn = ? WHERE usn != ?", (DIRTY, DIRTY))
+            
+            _pull(cursor, remote, session, since, report)
+            _push(cursor, remote, session, report)
+            report.usn = remote.post("finish", {"session": session})["usn"]
+        except BaseException:
+            try:
+                remote.post("abort", {"session": session})
+            except SyncError:
+                pass
+            raise
+        
+        mark_synced(cursor, report.usn)
+        # Deletions are only kept until the server has them
+        cursor.execute("DELETE FROM sync_graves")
+        set_meta(cursor, "last_usn", report.usn)
+        set_meta(cursor, "server", started["collection"])
+        set_meta(cursor, "server_url", url)
+        if report.pulled or report.deleted:
+            log_change(cursor, COLLECTION, "sync", [], pulled=report.pulled, deleted=report.deleted)
+        conn.commit()
+    publish_changes(db)
+    
+    report.duration = time.perf_counter() - start
+    return report
+
+
+def _pull(cursor: sqlite3.Cursor, remote: _Remote, session: str, since: int, report: SyncReport) -> None:
+    """Apply the server's changes since ``since``, table by table."""
+    for table in (*TABLES_BY_NAME, GRAVES):
+        after = None
+        while True:
+            page = remote.post(
+                "pull", {"session": session, "table": table, "since": since, "after": after}
+            )
+            if not page["rows"]:
+                break
+            if table == GRAVES:
+                report.deleted += apply_graves(cursor, page["rows"])
+                # Already deleted on the server, so not sent back
+                cursor.execute(
+                    "DELETE FROM sync_graves WHERE guid IN (SELECT value FROM json_each(?))",
+                    (json.dumps([row[0] for row in page["rows"]]),)
+                )
+            else:
+                result = apply_rows(cursor, table, page["rows"])
+                report.pulled += result.applied
+                report.conflicts += result.conflicts
+            after = page["after"]
+
+
+def _push(cursor: sqlite3.Cursor, remote: _Remote, session: str, report: SyncReport) -> None:
+    """Send the local changes left after pulling, table by table."""
+    for table in (*TABLES_BY_NAME, GRAVES):
+        after = None
+        while True:
+            rows, after = read_pending(cursor, table, after)
+            if not rows:
+                break
+            remote.post("push", {"session": session, "table": table, "rows": rows})
+            report.pushed += len(rows)
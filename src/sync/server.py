@@ -0,0 +1,233 @@
+"""HTTP sync server for TextuAnki.
+
+The server holds one collection and its update sequence number (usn),
+which grows by one for every sync that sends changes. Clients pull the
+rows changed since the usn they last synced at and push their own
+changes, all inside one server transaction per sync, so concurrent
+clients are served one at a time and an interrupted sync changes nothing.
+
+Endpoints take and return gzip-compressed JSON via POST:
+
+- ``/start`` opens a sync session and returns the usn and collection id
+- ``/pull`` returns a page of rows of one table changed since a usn
+- ``/push`` applies a page of the client's changed rows
+- ``/finish`` commits the session and returns the new usn
+- ``/abort`` rolls the session back
+"""
+import hmac
+import secrets
+import sqlite3
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Optional, Tuple
+
+from src.database.db import Database
+from src.database.oplog import COLLECTION, log_change, publish_changes
+from src.sync.changes import (
+    DIRTY, GRAVES, SYNC_VERSION, TABLES_BY_NAME, SyncError,
+    apply_graves, apply_rows, assign_guids, decode, encode, get_meta,
+    mark_synced, read_changes, set_meta,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 27701
+
+# Seconds of client inactivity after which a session is rolled back
+SESSION_TIMEOUT = 60.0
+
+
+@dataclass
+class _Session:
+    """An open sync and the write transaction holding its changes."""
+    id: str
+    usn: int
+    stack: ExitStack
+    cursor: Any
+    pushed: bool = False
+    last_active: float = field(default_factory=time.monotonic)
+
+
+class SyncServer:
+    """Serves one collection to sync clients, one session at a time."""
+    
+    def __init__(self, db: Database, token: Optional[str] = None, session_timeout: float = SESSION_TIMEOUT):
+        """Create the server.
+        
+        Args:
+            db: Collection to serve
+            token: Shared secret clients must send, None to accept any client
+            session_timeout: Seconds of inactivity before a session is dropped
+        """
+        self.db = db
+        self.token = token
+        self.session_timeout = session_timeout
+        self._session: Optional[_Session] = None
+    
+    def authorized(self, header: Optional[str]) -> bool:
+        """Whether an Authorization header carries the server's token."""
+        if self.token is None:
+            return True
+        return header is not None and hmac.compare_digest(header, f"Bearer {self.token}")
+    
+    def handle(self, endpoint: str, request: Dict) -> Dict:
+        """Run one endpoint.
+        
+        A database error ends the session, rolling back everything it changed.
+        
+        Raises:
+            SyncError: If the request is invalid or another sync is running
+        """
+        try:
+            return self._dispatch(endpoint, request)
+        except sqlite3.Error as e:
+            if self._session is not None:
+                self._close(commit=False)
+            raise SyncError(f"Sync failed on the server: {e}", status=500) from e
+    
+    def _dispatch(self, endpoint: str, request: Dict) -> Dict:
+        """Route a request to its endpoint."""
+        if self._session is not None and (
+            time.monotonic() - self._session.last_active > self.session_timeout
+        ):
+            self._close(commit=False)
+        
+        if endpoint == "start":
+            return self._start(request)
+        
+        session = self._session
+        if session is None or request.get("session") != session.id:
+            raise SyncError("No such sync session", status=409)
+        session.last_active = time.monotonic()
+        
+        if endpoint == "pull":
+            table = request.get("table")
+            if table != GRAVES and table not in TABLES_BY_NAME:
+                raise SyncError(f"Unknown table: {table}")
+            rows, after = read_changes(
+                session.cursor, table, int(request["since"]), session.usn, request.get("after")
+            )
+            return {"rows": rows, "after": after}
+        if endpoint == "push":
+            return self._push(session, request)
+        if endpoint == "finish":
+            usn = session.usn + 1 if session.pushed else session.usn
+            if session.pushed:
+                set_meta(session.cursor, "usn", usn)
+                log_change(session.cursor, COLLECTION, "sync", [], usn=usn)
+            self._close(commit=True)
+            publish_changes(self.db)
+            return {"usn": usn}
+        if endpoint == "abort":
+            self._close(commit=False)
+            return {}
+        raise SyncError(f"Unknown endpoint: {endpoint}", status=404)
+    
+    def _start(self, request: Dict) -> Dict:
+        """Open a session, first numbering changes made on the server itself."""
+        if self._session is not None:
+            raise SyncError("Another sync is in progress", status=409)
+        if request.get("version") != SYNC_VERSION:
+            raise SyncError(f"Sync version mismatch: server speaks {SYNC_VERSION}")
+        
+        with ExitStack() as stack:
+            cursor = stack.enter_context(self.db.get_connection()).cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            usn, collection = self._number_local_changes(cursor)
+            self._session = _Session(
+                id=secrets.token_hex(16), usn=usn, stack=stack.pop_all(), cursor=cursor
+            )
+        return {"session": self._session.id, "usn": usn, "collection": collection}
+    
+    def _number_local_changes(self, cursor: sqlite3.Cursor) -> Tuple[int, str]:
+        """Return the usn and collection id, giving server-side edits the next usn."""
+        collection = get_meta(cursor, "collection")
+        if collection is None:
+            collection = secrets.token_hex(16)
+            set_meta(cursor, "collection", collection)
+        
+        # Edits made directly in the served collection become the next usn
+        assign_guids(cursor)
+        usn = int(get_meta(cursor, "usn", "0"))
+        pending = cursor.execute(
+            " UNION ALL ".join(
+                f"SELECT 1 FROM {table} WHERE usn = {DIRTY}"
+                for table in (*TABLES_BY_NAME, "sync_graves")
+            ) + " LIMIT 1"
+        ).fetchone()
+        if pending:
+            usn += 1
+            mark_synced(cursor, usn)
+            set_meta(cursor, "usn", usn)
+        return usn, collection
+    
+    def _push(self, session: _Session, request: Dict) -> Dict:
+        """Apply a page of client changes at the session's next usn."""
+        table = request.get("table")
+        rows = request.get("rows", [])
+        session.pushed = True
+        if table == GRAVES:
+            return {"applied": apply_graves(session.cursor, rows, session.usn + 1)}
+        if table not in TABLES_BY_NAME:
+            raise SyncError(f"Unknown table: {table}")
+        result = apply_rows(session.cursor, table, rows, session.usn + 1)
+        return {"applied": result.applied, "conflicts": result.conflicts}
+    
+    def _close(self, commit: bool) -> None:
+        """End the session, committing or rolling back its transaction."""
+        session, self._session = self._session, None
+        try:
+            if commit:
+                session.cursor.connection.commit()
+        finally:
+            session.stack.close()
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """Translates HTTP requests to SyncServer.handle() calls."""
+    
+    server_version = "TextuAnkiSync/1"
+    
+    def do_POST(self) -> None:
+        sync: SyncServer = self.server.sync
+        if not sync.authorized(self.headers.get("Authorization")):
+            self._reply(401, {"error": "Invalid sync token"})
+            return
+        
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = decode(self.rfile.read(length))
+            self._reply(200, sync.handle(self.path.strip("/"), request))
+        except SyncError as e:
+            self._reply(e.status, {"error": str(e)})
+        except (ValueError, KeyError, OSError) as e:
+            self._reply(400, {"error": f"Bad request: {e}"})
+    
+    def _reply(self, status: int, payload: Dict) -> None:
+        body = encode(payload)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format: str, *args) -> None:
+        """Keep request logging off the terminal."""
+
+
+def make_server(
+    db: Database,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    token: Optional[str] = None,
+) -> HTTPServer:
+    """Create an HTTP sync server for a collection; call serve_forever() to run it.
+    
+    Requests are handled on the thread running serve_forever(). Pass port 0
+    to pick a free port, e.g. in tests; it is available as server_port.
+    """
+    server = HTTPServer((host, port), SyncRequestHandler)
+    server.sync = SyncServer(db, token)
+    return server
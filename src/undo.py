@@ -0,0 +1,40 @@
+"""Bounded in-memory undo history for TextuAnki screens."""
+from collections import deque
+from typing import Callable, Deque, Optional, Tuple
+
+# Most recent actions kept per screen; older ones can no longer be undone
+UNDO_LIMIT = 50
+
+
+class UndoStack:
+    """Last-in, first-out list of revert callbacks with a fixed capacity."""
+    
+    def __init__(self, limit: int = UNDO_LIMIT):
+        self._entries: Deque[Tuple[str, Callable[[], None]]] = deque(maxlen=limit)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def push(self, label: str, revert: Callable[[], None]) -> None:
+        """Remember how to revert an action, dropping the oldest when full.
+        
+        Args:
+            label: Short description shown when the action is undone
+            revert: Callable that reverts the action
+        """
+        self._entries.append((label, revert))
+    
+    def undo(self) -> Optional[str]:
+        """Revert the most recent action and return its label.
+        
+        Returns None when there is nothing to undo.
+        """
+        if not self._entries:
+            return None
+        label, revert = self._entries.pop()
+        revert()
+        return label
+    
+    def clear(self) -> None:
+        """Forget all actions."""
+        self._entries.clear()
@@ -0,0 +1,166 @@
+"""Rendering of card sides for the study screen.
+
+Card text is never interpreted as Rich markup, so ``[`` in code cards is
+shown as typed. Text that looks like Markdown is rendered as Markdown,
+with fenced code blocks syntax highlighted; cloze deletions
+(``{{c1::answer::hint}}``) are hidden on the question and highlighted on
+the answer. Rendering Markdown and code is slow enough to notice on
+reveal, so sides are rendered to lines ahead of time and kept in an LRU
+cache keyed on the card and the width they were laid out for.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, Optional
+
+from rich.console import Console, Group, RenderableType
+from rich.markdown import Markdown
+from rich.segment import Segment, Segments
+from rich.text import Text
+
+from src.models.card import Card
+from src.models.media import placeholders
+from src.models.note import CLOZE
+
+# Rendered card sides kept, enough for a session's recent and upcoming cards
+RENDER_CACHE_SIZE = 256
+
+# Upcoming cards the study screen renders ahead of time
+PRERENDER_COUNT = 3
+
+CODE_THEME = "monokai"
+CLOZE_STYLE = "bold cyan"
+QUESTION_STYLE = "bold cyan"
+ANSWER_STYLE = "bold green"
+DIVIDER = "━" * 22
+
+# Headings, lists, quotes, fences, emphasis, inline code and links
+_MARKDOWN = re.compile(
+    r"^ {0,3}(#{1,6} |[-*+] |\d+\. |> |```)|\*\*[^*\n]+\*\*|`[^`\n]+`|\[[^\]\n]+\]\([^)\n]+\)",
+    re.MULTILINE
+)
+
+
+def has_cloze(text: str) -> bool:
+    """Whether a text contains cloze deletions."""
+    return "{{c" in text and CLOZE.search(text) is not None
+
+
+def _cloze_text(text: str, answer: bool, ordinal: Optional[int], markdown: bool) -> str:
+    """Replace the cloze deletions of ``ordinal`` (all if None) with blanks or answers.
+    
+    Other deletions show their text. In Markdown the replacement is bold;
+    plain text is highlighted by _body() instead, using the returned
+    ``\\x00`` delimiters.
+    """
+    def replace(match: re.Match) -> str:
+        number, content, hint = match.groups()
+        if ordinal is not None and int(number) != ordinal:
+            return content
+        shown = content if answer else f"[{hint or '...'}]"
+        return f"**{shown}**" if markdown else f"\x00{shown}\x00"
+    return CLOZE.sub(replace, text)
+
+
+def _body(text: str, answer: bool = False, ordinal: Optional[int] = None) -> RenderableType:
+    """Render one field of a card."""
+    text = placeholders(text)
+    markdown = _MARKDOWN.search(text) is not None
+    if has_cloze(text):
+        text = _cloze_text(text, answer, ordinal, markdown)
+    if markdown:
+        return Markdown(text, code_theme=CODE_THEME)
+    
+    body = Text(justify="center")
+    for index, part in enumerate(text.split("\x00")):
+        body.append(part, style=CLOZE_STYLE if index % 2 else None)
+    return body
+
+
+def format_card(card: Card, answer: bool, ordinal: Optional[int] = None) -> RenderableType:
+    """Build the question, or the question and answer, of a card.
+    
+    Args:
+        card: Card to show
+        answer: Include the answer
+        ordinal: Cloze number this card tests; None tests every deletion
+    """
+    parts: List[RenderableType] = [
+        Text("Question:", style=QUESTION_STYLE, justify="center"),
+        Text(""),
+        _body(card.front, ordinal=ordinal),
+    ]
+    if answer:
+        parts += [Text(""), Text(DIVIDER, justify="center"), Text("")]
+        parts += [Text("Answer:", style=ANSWER_STYLE, justify="center"), Text("")]
+        if has_cloze(card.front):
+            # The answer to a cloze is the question with the blanks filled in
+            parts.append(_body(card.front, answer=True, ordinal=ordinal))
+            if card.back.strip():
+                parts += [Text(""), _body(card.back, answer=True)]
+        else:
+            parts.append(_body(card.back, answer=True))
+    return Group(*parts)
+
+
+class CardRenderer:
+    """Renders card sides to lines of segments, caching the most recent ones.
+    
+    Thread-safe, so upcoming cards can be rendered by a worker thread while
+    the current one is on screen. Cache keys include the card's update
+    time, so edited cards are rendered again.
+    """
+    
+    def __init__(self, cache_size: int = RENDER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Hashable, Segments]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(card: Card, answer: bool, width: int, ordinal: Optional[int]) -> Hashable:
+        return (card.id, card.updated_at, answer, width, ordinal)
+    
+    def render(self, card: Card, answer: bool, width: int, ordinal: Optional[int] = None) -> RenderableType:
+        """A side of a card laid out for ``width`` columns.
+        
+        Widths below one (a widget not laid out yet) skip the cache and
+        return a renderable laid out at paint time.
+        """
+        if width < 1:
+            return format_card(card, answer, ordinal)
+        
+        key = self._key(card, answer, width, ordinal)
+        with self._lock:
+            rendered = self._cache.get(key)
+            if rendered is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return rendered
+            self.misses += 1
+        
+        rendered = self._render_lines(format_card(card, answer, ordinal), width)
+        with self._lock:
+            self._cache[key] = rendered
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rendered
+    
+    def prerender(self, cards: Iterable[Card], width: int) -> None:
+        """Render both sides of cards that are about to be shown."""
+        for card in cards:
+            for answer in (False, True):
+                self.render(card, answer, width)
+    
+    @staticmethod
+    def _render_lines(renderable: RenderableType, width: int) -> Segments:
+        """Lay a renderable out once, keeping the styled segments."""
+        console = Console(width=width, color_system="truecolor", force_terminal=True, legacy_windows=False)
+        lines = console.render_lines(renderable, console.options.update_width(width), pad=False)
+        segments: List[Segment] = []
+        for index, line in enumerate(lines):
+            if index:
+                segments.append(Segment.line())
+            segments.extend(line)
+        return Segments(segments)
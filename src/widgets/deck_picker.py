@@ -0,0 +1,235 @@
+"""Searchable deck picker.
+
+A text field that filters the collection's decks as you type, with the
+matching decks listed under it once you type, click it or press Down.
+Decks come from the shared DeckCache, and only the best MAX_SHOWN
+matches are put in the list, only while it is open, so a collection with
+thousands of decks costs nothing to show.
+"""
+import re
+from typing import List, Optional, Sequence, TypeVar
+
+from rich.text import Text
+from textual.actions import SkipAction
+from textual.app import ComposeResult
+from textual.binding import Binding
+from textual.containers import Vertical
+from textual.message import Message
+from textual.widgets import Input, OptionList
+from textual.widgets.option_list import Option
+
+from src.models.deck import DECK_SEPARATOR, get_deck_cache
+
+# Matching decks listed at once; typing more narrows the rest down
+MAX_SHOWN = 50
+
+# Option id of the "no deck" entry of pickers that allow a blank choice
+_BLANK_ID = "blank"
+
+_WORD = re.compile(r"\w+")
+
+# Decks, deck summaries or anything else with a ``name``
+Named = TypeVar("Named")
+
+
+def match_decks(decks: Sequence[Named], query: str) -> List[Named]:
+    """Decks whose name contains every word of ``query``, best matches first.
+    
+    Case is ignored. Decks whose last level starts with the query come
+    first, then decks where more of the query's words are whole words of
+    the name, then where more of them start a word, each group in the
+    order given.
+    """
+    query = query.strip().casefold()
+    if not query:
+        return list(decks)
+    
+    words = query.split()
+    ranked = []
+    for position, deck in enumerate(decks):
+        name = deck.name.casefold()
+        if not all(word in name for word in words):
+            continue
+        leaf = name.rsplit(DECK_SEPARATOR, 1)[-1]
+        name_words = set(_WORD.findall(name))
+        whole = sum(1 for word in words if word in name_words)
+        prefixes = sum(1 for word in words if any(other.startswith(word) for other in name_words))
+        ranked.append((not leaf.startswith(query), -whole, -prefixes, position, deck))
+    ranked.sort(key=lambda entry: entry[:4])
+    return [entry[4] for entry in ranked]
+
+
+class DeckPicker(Vertical):
+    """Pick a deck by typing part of its name.
+    
+    Use it like a Select: ``value`` is the chosen deck id, or None, and a
+    DeckPicker.Changed message is posted when the user picks a deck.
+    """
+    
+    DEFAULT_CSS = """
+    DeckPicker {
+        height: auto;
+    }
+    
+    DeckPicker > OptionList {
+        display: none;
+        height: auto;
+        max-height: 10;
+        margin: 0 0 1 0;
+        border: round $secondary;
+        background: $panel;
+    }
+    
+    DeckPicker.-open > OptionList {
+        display: block;
+    }
+    """
+    
+    BINDINGS = [
+        Binding("down", "cursor_down", "Next Deck", show=False),
+        Binding("up", "cursor_up", "Previous Deck", show=False),
+        Binding("escape", "close", "Close", show=False),
+    ]
+    
+    class Changed(Message):
+        """A deck was picked."""
+        
+        def __init__(self, picker: "DeckPicker", value: Optional[int]):
+            super().__init__()
+            self.picker = picker
+            self.value = value
+        
+        @property
+        def control(self) -> "DeckPicker":
+            return self.picker
+    
+    def __init__(
+        self,
+        value: Optional[int] = None,
+        prompt: str = "Type to search decks",
+        blank_label: Optional[str] = None,
+        id: Optional[str] = None,
+        classes: Optional[str] = None,
+    ):
+        """
+        Args:
+            value: Deck picked at first
+            prompt: Placeholder shown while no deck is picked
+            blank_label: Offer picking no deck under this label, e.g. "All decks"
+        """
+        super().__init__(id=id, classes=classes)
+        self.prompt = prompt
+        self.blank_label = blank_label
+        self._value = value
+        # The text the user typed, as opposed to the picked deck's name
+        self._searching = False
+    
+    def compose(self) -> ComposeResult:
+        yield Input(placeholder=self.prompt)
+        yield OptionList()
+    
+    def on_mount(self) -> None:
+        self._show_value()
+    
+    @property
+    def value(self) -> Optional[int]:
+        """The picked deck's id, None if no deck is picked."""
+        return self._value
+    
+    @value.setter
+    def value(self, deck_id: Optional[int]) -> None:
+        self._value = deck_id
+        if self.is_mounted:
+            self._show_value()
+    
+    def _show_value(self) -> None:
+        """Put the picked deck's name in the field."""
+        deck = get_deck_cache().get(self._value) if self._value is not None else None
+        if deck is None:
+            self._value = None
+        with self.prevent(Input.Changed):
+            self.query_one(Input).value = deck.name if deck else ""
+        self._searching = False
+    
+    def _open(self) -> None:
+        """List the decks matching the field, highlighting the picked one."""
+        query = self.query_one(Input).value if self._searching else ""
+        matches = match_decks(get_deck_cache().get_all(), query)
+        
+        options = []
+        if self.blank_label and not query:
+            options.append(Option(Text(self.blank_label, style="italic"), id=_BLANK_ID))
+        # Deck names are shown as typed, never as markup
+        options.extend(Option(Text(deck.name), id=str(deck.id)) for deck in matches[:MAX_SHOWN])
+        if len(matches) > MAX_SHOWN:
+            options.append(Option(f"... {len(matches) - MAX_SHOWN} more, keep typing to narrow", disabled=True))
+        if not options:
+            options.append(Option("No matching deck", disabled=True))
+        
+        option_list = self.query_one(OptionList)
+        option_list.set_options(options)
+        highlighted = 0
+        if not self._searching and self._value is not None:
+            ids = [str(deck.id) for deck in matches[:MAX_SHOWN]]
+            if str(self._value) in ids:
+                highlighted = ids.index(str(self._value)) + (1 if options[0].id == _BLANK_ID else 0)
+        option_list.highlighted = highlighted if not options[highlighted].disabled else None
+        self.add_class("-open")
+    
+    def _close(self) -> None:
+        self.remove_class("-open")
+        self._show_value()
+    
+    def _pick(self, option_id: Optional[str]) -> None:
+        """Make a listed deck the value."""
+        if option_id is None:
+            return
+        self._value = None if option_id == _BLANK_ID else int(option_id)
+        self._close()
+        self.post_message(self.Changed(self, self._value))
+    
+    def on_input_changed(self, event: Input.Changed) -> None:
+        event.stop()
+        self._searching = True
+        self._open()
+    
+    def on_input_submitted(self, event: Input.Submitted) -> None:
+        """Pick the highlighted deck."""
+        event.stop()
+        if self.has_class("-open"):
+            option = self.query_one(OptionList).highlighted_option
+            self._pick(option.id if option and not option.disabled else None)
+        else:
+            self._open()
+    
+    def on_option_list_option_selected(self, event: OptionList.OptionSelected) -> None:
+        event.stop()
+        self._pick(event.option.id)
+        self.query_one(Input).focus()
+    
+    def on_click(self) -> None:
+        if not self.has_class("-open"):
+            self._open()
+    
+    def on_descendant_blur(self) -> None:
+        # Focus may be moving between the field and the list
+        self.call_after_refresh(self._close_if_unfocused)
+    
+    def _close_if_unfocused(self) -> None:
+        if self.is_mounted and not self.has_focus_within and self.has_class("-open"):
+            self._close()
+    
+    def action_cursor_down(self) -> None:
+        if not self.has_class("-open"):
+            self._open()
+        else:
+            self.query_one(OptionList).action_cursor_down()
+    
+    def action_cursor_up(self) -> None:
+        self.query_one(OptionList).action_cursor_up()
+    
+    def action_close(self) -> None:
+        """Close the list, or let Escape through when it is closed."""
+        if not self.has_class("-open"):
+            raise SkipAction()
+        self._close()
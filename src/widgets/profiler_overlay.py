@@ -0,0 +1,30 @@
+"""Debug overlay showing live profiler timings."""
+from textual.widgets import Static
+
+from src.profiler import get_profiler
+
+
+class ProfilerOverlay(Static):
+    """Docked panel listing per-span timings in milliseconds."""
+    
+    DEFAULT_CSS = """
+    ProfilerOverlay {
+        dock: right;
+        width: 64;
+        height: auto;
+        max-height: 100%;
+        padding: 1 2;
+        border: round $accent;
+        background: $panel;
+        color: $text;
+    }
+    """
+    
+    def on_mount(self) -> None:
+        """Start refreshing the report."""
+        self.refresh_report()
+        self.set_interval(0.5, self.refresh_report)
+    
+    def refresh_report(self) -> None:
+        """Redraw the report from the global profiler."""
+        self.update(get_profiler().format_report())
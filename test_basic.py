@@ -44,7 +44,8 @@ try:
         deck_id=default_deck.id,
         front="What is 2+2?",
         back="4",
-        tags="math, test"
+        tags="math, test",
+        allow_duplicate=True
     )
     print(f"✓ Created test card (ID: {test_card.id})")
     
@@ -0,0 +1,14 @@
+"""Shared fixtures: every test gets a fresh collection."""
+import pytest
+
+from src.database import db as db_module
+from src.database.db import open_db, use_db
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A new collection made the active database for the test."""
+    previous = db_module._active_db
+    database = use_db(open_db(tmp_path / "cards.db"))
+    yield database
+    db_module._active_db = previous
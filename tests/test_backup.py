@@ -0,0 +1,98 @@
+"""Tests for compressed backups, their rotation and restoring from them."""
+import gzip
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database.backup import (
+    BackupError, backups_dir, create_backup, find_backup, list_backups, prune_backups, restore_backup,
+)
+from src.database.oplog import COLLECTION, changes_since, last_seq
+from src.models.card import Card
+from src.models.deck import Deck
+
+
+def _card_count(db):
+    with db.get_connection(read_only=True) as conn:
+        return conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+
+
+def test_backup_is_a_compressed_copy_and_skipped_when_unchanged(db, tmp_path):
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "hola", "hello")
+    
+    report = create_backup(db, compression="gzip")
+    assert report.path.name.endswith(".db.gz")
+    assert report.backup_size < report.database_size
+    
+    copy = tmp_path / "copy.db"
+    with gzip.open(report.path) as packed:
+        copy.write_bytes(packed.read())
+    with sqlite3.connect(copy) as conn:
+        assert conn.execute("SELECT front FROM cards").fetchall() == [("hola",)]
+    
+    assert create_backup(db, compression="gzip").skipped
+    forced = create_backup(db, force=True, compression="gzip")
+    assert not forced.skipped and forced.path.exists()
+
+
+def test_retention_keeps_recent_daily_and_weekly_backups(db):
+    directory = backups_dir(db)
+    directory.mkdir(parents=True)
+    now = datetime(2024, 5, 15, 12, 0, 0)
+    # Two backups a day for three weeks
+    for hours in range(0, 21 * 24, 12):
+        created = now - timedelta(hours=hours)
+        (directory / f"cards-{created.strftime('%Y%m%d-%H%M%S')}-{hours}.db.gz").write_bytes(b"")
+    backups = list_backups(db)
+    
+    removed = prune_backups(db, keep_last=3, keep_daily=4, keep_weekly=3)
+    
+    kept = list_backups(db)
+    assert len(kept) + len(removed) == len(backups)
+    assert [backup.path for backup in kept[:3]] == [backup.path for backup in backups[:3]]
+    # The newest of each of the last four days, and of each of the three weeks
+    kept_days = {backup.created.date() for backup in kept}
+    assert {(now - timedelta(days=days)).date() for days in range(4)} <= kept_days
+    assert len({backup.created.isocalendar()[:2] for backup in kept}) == 3
+    assert len(kept) < len(backups)
+
+
+def test_corrupt_backup_is_rejected_before_touching_the_collection(db):
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "hola", "hello")
+    directory = backups_dir(db)
+    directory.mkdir(parents=True)
+    corrupt = directory / "cards-20240101-000000-1.db.gz"
+    with gzip.open(corrupt, "wb") as packed:
+        packed.write(b"SQLite format 3\0" + b"\xff" * 8192)
+    
+    with pytest.raises(BackupError):
+        restore_backup(find_backup(corrupt.name, db), db)
+    
+    assert _card_count(db) == 1
+    assert [backup.path for backup in list_backups(db)] == [corrupt]
+
+
+def test_restore_takes_a_safety_backup_and_keeps_the_log_increasing(db):
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "hola", "hello")
+    backup = create_backup(db, compression="gzip")
+    Card.create(deck.id, "adios", "goodbye")
+    seq_before = last_seq(db)
+    
+    safety = restore_backup(find_backup(backup.path.name, db), db)
+    
+    assert _card_count(db) == 1
+    assert safety.path.exists() and safety.path != backup.path
+    assert find_backup(safety.path.name, db).seq >= seq_before
+    
+    changes = changes_since(seq_before, db=db)
+    assert [(change.entity, change.op) for change in changes] == [(COLLECTION, "restore")]
+    assert changes[0].seq > seq_before
+    
+    # Restoring the safety backup undoes the restore
+    restore_backup(find_backup(safety.path.name, db), db)
+    assert _card_count(db) == 2
+    assert last_seq(db) > changes[0].seq
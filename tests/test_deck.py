@@ -0,0 +1,43 @@
+"""Tests for deck hierarchy and renames."""
+import pytest
+
+from src.models.deck import Deck
+
+
+def test_rename_moves_subdecks(db):
+    spanish = Deck.create("Spanish")
+    verbs = Deck.create("Spanish::Verbs")
+    irregular = Deck.create("Spanish::Verbs::Irregular")
+    
+    spanish.name = "Languages::Spanish"
+    spanish.update()
+    
+    assert Deck.get_by_id(verbs.id).name == "Languages::Spanish::Verbs"
+    assert Deck.get_by_id(irregular.id).name == "Languages::Spanish::Verbs::Irregular"
+    assert Deck.get_by_id(spanish.id).parent_id == Deck.get_by_name("Languages").id
+    
+    # A later update keeps the subdeck under the same parent
+    irregular = Deck.get_by_id(irregular.id)
+    irregular.description = "Irregular verbs"
+    irregular.update()
+    assert Deck.get_by_id(irregular.id).parent_id == verbs.id
+
+
+def test_rename_into_own_subdeck_is_rejected(db):
+    spanish = Deck.create("Spanish")
+    spanish.name = "Spanish::Vocab"
+    
+    with pytest.raises(ValueError):
+        spanish.update()
+    assert Deck.get_by_id(spanish.id).name == "Spanish"
+    assert Deck.get_by_id(spanish.id).parent_id is None
+
+
+def test_tree_summaries_survive_a_parent_cycle(db):
+    spanish = Deck.create("Spanish")
+    with db.get_connection() as conn:
+        conn.execute("UPDATE decks SET parent_id = id WHERE id = ?", (spanish.id,))
+        conn.commit()
+    
+    summaries = Deck.get_summaries(include_subdecks=True)
+    assert "Spanish" in [summary.name for summary in summaries]
@@ -0,0 +1,49 @@
+"""Tests for exact and near duplicate detection."""
+import pytest
+
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.duplicates import DuplicateCardError, content_hash, find_near_duplicates
+
+
+def test_fronts_that_differ_only_in_case_spacing_or_unicode_form_are_duplicates():
+    assert content_hash("  Hola\tMundo ") == content_hash("hola mundo")
+    assert content_hash("Ｃａｆé") == content_hash("CAFÉ".casefold())
+    assert content_hash("hola") != content_hash("hola!")
+
+
+def test_create_rejects_duplicates_unless_allowed(db):
+    deck = Deck.create("Spanish")
+    original = Card.create(deck.id, "Hola  Mundo", "hello world")
+    
+    with pytest.raises(DuplicateCardError) as error:
+        Card.create(deck.id, "hola mundo\n", "hi")
+    assert error.value.card_id == original.id
+    
+    copy = Card.create(deck.id, "HOLA MUNDO", "hi", allow_duplicate=True)
+    assert copy.id != original.id
+    # Other decks may have the same card
+    Card.create(Deck.create("French").id, "hola mundo", "hello world")
+
+
+def test_bulk_create_skips_duplicates_unless_allowed(db):
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "perro", "dog")
+    rows = [("Perro", "dog", ""), ("gato", "cat", ""), ("ＧＡＴＯ ", "cat", "")]
+    
+    assert Card.bulk_create(deck.id, rows) == 1
+    assert Card.bulk_create(deck.id, rows, skip_duplicates=False) == 3
+
+
+def test_near_duplicates_with_a_typo_are_grouped(db):
+    deck = Deck.create("History")
+    text = "The Treaty of Westphalia ended the Thirty Years War in the Holy Roman Empire in 1648"
+    first = Card.create(deck.id, text, "1648")
+    typo = Card.create(deck.id, text.replace("Westphalia", "Westfalia"), "1648")
+    Card.create(deck.id, "The French Revolution began with the storming of the Bastille", "1789")
+    
+    report = find_near_duplicates(threshold=0.8)
+    
+    assert report.scanned == 3
+    assert [group.card_ids for group in report.groups] == [[first.id, typo.id]]
+    assert 0.8 <= report.groups[0].similarity < 1.0
@@ -0,0 +1,32 @@
+"""Tests for the rapid entry write-behind queue."""
+from src.database.db import open_db, use_db
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.entry_queue import EntryQueue
+
+
+def test_flush_writes_queued_cards(db):
+    deck = Deck.create("Spanish")
+    queue = EntryQueue()
+    queue.add(deck.id, "hola", "hello")
+    queue.add(deck.id, "hola", "hello again")
+    queue.add(deck.id, "{{c1::adiós}} means goodbye", "")
+    
+    assert queue.flush() == 2
+    counts = queue.counts()
+    assert (counts.pending, counts.saved, counts.duplicates) == (0, 2, 1)
+    assert len(Card.get_by_deck(deck.id)) == 2
+
+
+def test_flush_writes_to_the_collection_it_was_made_for(db, tmp_path):
+    deck = Deck.create("Spanish")
+    queue = EntryQueue()
+    queue.add(deck.id, "hola", "hello")
+    
+    # Another profile is activated before the queue is flushed
+    use_db(open_db(tmp_path / "other.db"))
+    queue.flush()
+    
+    assert [card.front for card in Card.get_by_deck(deck.id)] == []
+    use_db(db)
+    assert [card.front for card in Card.get_by_deck(deck.id)] == ["hola"]
@@ -0,0 +1,46 @@
+"""Tests for filtered deck searches and paging."""
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.filtered_deck import FilterDefinition, FilteredDeck
+from src.models.review import Review
+
+
+def _card_ids(filtered, page_size=200):
+    return [card.id for page in filtered.iter_pages(page_size) for card in page]
+
+
+def test_answered_cards_are_not_served_again(db):
+    deck = Deck.create("Spanish")
+    for i in range(10):
+        Card.create(deck.id, f"front {i}", f"back {i}")
+    filtered = FilteredDeck.create("Everything", FilterDefinition(deck_id=deck.id, due_within_days=None))
+    
+    served = []
+    for page in filtered.iter_pages(page_size=3):
+        for card in page:
+            served.append(card.id)
+            # Answering pushes the due date past the pages still to come
+            Review.get_by_card_id(card.id).record_review(4)
+    
+    assert len(served) == 10
+    assert len(set(served)) == 10
+
+
+def test_pages_follow_the_order_without_gaps(db):
+    deck = Deck.create("Spanish")
+    cards = [Card.create(deck.id, f"front {i}", "back") for i in range(7)]
+    filtered = FilteredDeck.create("Added", FilterDefinition(deck_id=deck.id, order="added"))
+    
+    assert _card_ids(filtered, page_size=2) == [card.id for card in cards]
+
+
+def test_text_and_tag_wildcards_match_literally(db):
+    deck = Deck.create("Shop")
+    discount = Card.create(deck.id, "50% off", "half price", tags="sale_item")
+    Card.create(deck.id, "500 off", "a lot", tags="saleXitem")
+    
+    by_text = FilteredDeck.create("Percent", FilterDefinition(text="50%", due_within_days=None))
+    by_tag = FilteredDeck.create("Tag", FilterDefinition(tags=("sale_item",), due_within_days=None))
+    
+    assert _card_ids(by_text) == [discount.id]
+    assert _card_ids(by_tag) == [discount.id]
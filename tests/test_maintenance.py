@@ -0,0 +1,52 @@
+"""Tests for database maintenance."""
+import pytest
+
+from src.database.db import AUTO_VACUUM_INCREMENTAL
+from src.database.maintenance import run_maintenance
+
+
+def _auto_vacuum(db):
+    with db.get_connection(read_only=True) as conn:
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+
+def _disable_auto_vacuum(db):
+    """Make the collection look like one created before incremental vacuuming."""
+    with db.get_connection() as conn:
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("VACUUM")
+
+
+def test_new_collections_use_incremental_vacuum(db):
+    assert _auto_vacuum(db) == AUTO_VACUUM_INCREMENTAL
+
+
+def test_full_maintenance_converts_old_collections(db):
+    _disable_auto_vacuum(db)
+    
+    run_maintenance(db, vacuum_pages=100, check_integrity=False)
+    assert _auto_vacuum(db) != AUTO_VACUUM_INCREMENTAL
+    
+    report = run_maintenance(db)
+    assert _auto_vacuum(db) == AUTO_VACUUM_INCREMENTAL
+    assert report.integrity_errors == []
+
+
+def test_zero_pages_is_rejected_rather_than_reclaiming_everything(db):
+    with db.get_connection() as conn:
+        conn.execute("CREATE TABLE filler (data BLOB)")
+        conn.executemany("INSERT INTO filler VALUES (zeroblob(4096))", [()] * 50)
+        conn.commit()
+        conn.execute("DROP TABLE filler")
+        conn.commit()
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    assert free_pages > 0
+    
+    with pytest.raises(ValueError):
+        run_maintenance(db, vacuum_pages=0, check_integrity=False)
+    
+    with db.get_connection(read_only=True) as conn:
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == free_pages
+    
+    report = run_maintenance(db, vacuum_pages=1, check_integrity=False)
+    assert report.free_pages_after == free_pages - 1
@@ -0,0 +1,30 @@
+"""Tests for storing media referenced by imported cards."""
+from src.models.media import Media, media_path
+
+
+def test_import_rewrites_only_the_matched_references(db, tmp_path):
+    base_dir = tmp_path / "deck"
+    base_dir.mkdir()
+    (base_dir / "a.png").write_bytes(b"a")
+    (base_dir / "aa.png").write_bytes(b"aa")
+    stored = {}
+    
+    text = Media.import_references('<img src="a.png"> <img src="aa.png"> [sound:a.png]', base_dir, stored)
+    
+    a_name = stored[(base_dir / "a.png").resolve()]
+    aa_name = stored[(base_dir / "aa.png").resolve()]
+    assert text == f'<img src="{a_name}"> <img src="{aa_name}"> [sound:{a_name}]'
+    assert media_path(aa_name).read_bytes() == b"aa"
+
+
+def test_import_ignores_files_outside_the_base_directory(db, tmp_path):
+    base_dir = tmp_path / "deck"
+    base_dir.mkdir()
+    secret = tmp_path / "secret.txt"
+    secret.write_text("key")
+    (base_dir / "link.png").symlink_to(secret)
+    text = f'<img src="../secret.txt"> <img src="{secret}"> <img src="link.png">'
+    
+    assert Media.import_references(text, base_dir, {}) == text
+    with db.get_connection(read_only=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM media").fetchone()[0] == 0
@@ -0,0 +1,31 @@
+"""Tests for schema migrations."""
+from src.database.db import MIGRATIONS, Database, _migrate_content_hash
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.note import BASIC_AND_REVERSED, CLOZE_TYPE, Note, NoteType
+
+
+def _hashes(db):
+    with db.get_connection(read_only=True) as conn:
+        return dict(conn.execute("SELECT id, content_hash FROM cards").fetchall())
+
+
+def test_content_hash_migration_matches_the_models(db):
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "  Hola\\tMundo ", "hello world")
+    Card.create(deck.id, "Ｃａｆé", "coffee")
+    Note.create(NoteType.get_by_name(BASIC_AND_REVERSED), deck.id, ["perro", "dog"])
+    Note.create(NoteType.get_by_name(CLOZE_TYPE), deck.id, ["{{c1::Madrid}} is the capital of {{c2::Spain}}", ""])
+    expected = _hashes(db)
+    
+    # Go back to the schema before the content hash migration and run it again
+    with db.get_connection() as conn:
+        conn.execute("DROP INDEX idx_cards_deck_hash")
+        conn.execute("DROP TRIGGER cards_sync_changed")
+        conn.execute("ALTER TABLE cards DROP COLUMN content_hash")
+        conn.execute(f"PRAGMA user_version = {MIGRATIONS.index(_migrate_content_hash)}")
+        conn.commit()
+    Database(db.db_path)
+    
+    assert None not in expected.values()
+    assert _hashes(db) == expected
@@ -0,0 +1,72 @@
+"""Tests for notes: card generation, rendering and incremental regeneration."""
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.note import BASIC_AND_REVERSED, CLOZE_TYPE, KIND_STANDARD, Note, NoteType, Template
+from src.models.review import Review
+
+
+def _cards(note):
+    """Ordinal -> card of a note."""
+    return {card.ordinal: card for card in Card.get_by_ids(note.card_ids())}
+
+
+def test_changing_cloze_numbers_adds_and_removes_only_those_cards(db):
+    deck = Deck.create("Geography")
+    note = Note.create(NoteType.get_by_name(CLOZE_TYPE), deck.id, ["{{c1::Madrid}} is in {{c2::Spain}}", ""])
+    before = _cards(note)
+    assert sorted(before) == [1, 2]
+    Review.get_by_card_id(before[1].id).record_review(4)
+    reviewed = Review.get_by_card_id(before[1].id)
+    
+    note.fields = ["{{c1::Madrid}} is in Spain, {{c3::Europe}}", ""]
+    note.update()
+    
+    after = _cards(note)
+    assert sorted(after) == [1, 3]
+    assert after[1].id == before[1].id
+    assert Card.get_by_id(before[2].id) is None
+    assert after[1].front == "{{c1::Madrid}} is in Spain, Europe"
+    assert after[3].front == "Madrid is in Spain, {{c3::Europe}}"
+    
+    kept = Review.get_by_card_id(after[1].id)
+    assert (kept.repetitions, kept.interval, kept.due_date) == (
+        reviewed.repetitions, reviewed.interval, reviewed.due_date
+    )
+    assert Review.get_by_card_id(after[3].id).last_review is None
+
+
+def test_each_template_renders_its_own_card(db):
+    deck = Deck.create("Vocabulary")
+    note_type = NoteType.create("Vocabulary", ["Word", "Meaning", "Example"], [
+        Template("Recognize", "{{Word}}", "{{FrontSide}} = {{Meaning}}"),
+        Template("Recall", "{{Meaning}}", "{{Word}}"),
+        Template("Use", "{{#Example}}Use {{Word}}{{/Example}}", "{{Example}}"),
+    ], kind=KIND_STANDARD)
+    
+    note = Note.create(note_type, deck.id, ["perro", "dog"])
+    cards = _cards(note)
+    assert sorted(cards) == [0, 1]
+    assert (cards[0].front, cards[0].back) == ("perro", "perro = dog")
+    assert (cards[1].front, cards[1].back) == ("dog", "perro")
+    
+    note.fields = ["perro", "dog", "El perro ladra"]
+    note.update()
+    cards = _cards(note)
+    assert (cards[2].front, cards[2].back) == ("Use perro", "El perro ladra")
+
+
+def test_bulk_create_skips_duplicate_notes_and_counts_cards(db):
+    deck = Deck.create("Spanish")
+    reversed_type = NoteType.get_by_name(BASIC_AND_REVERSED)
+    Note.create(reversed_type, deck.id, ["perro", "dog"])
+    
+    created = Note.bulk_create(reversed_type, deck.id, [
+        (["gato", "cat"], ""),
+        (["Perro ", "dog"], ""),  # already in the deck
+        (["GATO", "cat"], ""),    # earlier in the rows
+        (["casa", "house"], ""),
+    ])
+    assert created == 4
+    
+    assert Note.bulk_create(reversed_type, deck.id, [(["perro", "dog"], "")], skip_duplicates=False) == 2
+    assert len(Card.get_by_deck(deck.id)) == 8
@@ -0,0 +1,77 @@
+"""Tests for the change log and the in-process change bus."""
+from src.database.oplog import (
+    CARD, DECK, changes_since, get_bus, last_seq, log_change, prune_changes, publish_changes,
+)
+from src.models.card import Card
+from src.models.deck import Deck
+
+
+def _age_changes(db, days):
+    with db.get_connection() as conn:
+        conn.execute("UPDATE oplog SET created_at = datetime('now', ?)", (f"-{days} days",))
+        conn.commit()
+
+
+def test_cursors_keep_increasing_after_pruning(db):
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "hola", "hello")
+    seq = last_seq(db)
+    assert [change.seq for change in changes_since(0, db=db)][-1] == seq
+    
+    _age_changes(db, 30)
+    with db.get_connection() as conn:
+        assert prune_changes(conn.cursor(), keep_days=7) >= 2
+        conn.commit()
+    assert changes_since(0, db=db) == []
+    assert last_seq(db) == seq
+    
+    card = Card.create(deck.id, "adios", "goodbye")
+    changes = changes_since(seq, db=db)
+    assert [(change.entity, change.op, change.ids) for change in changes] == [(CARD, "create", (card.id,))]
+    # A reader that was further back sees a gap and knows to re-query
+    assert changes_since(0, db=db)[0].seq > seq
+
+
+def test_large_changes_record_only_the_count(db):
+    with db.get_connection() as conn:
+        log_change(conn.cursor(), CARD, "delete", range(5000))
+        conn.commit()
+    change = changes_since(0, db=db)[-1]
+    assert (change.ids, change.count) == ((), 5000)
+
+
+def test_subscribers_get_only_their_entities_until_they_unsubscribe(db):
+    cards, everything = [], []
+    unsubscribe_cards = get_bus(db).subscribe(cards.append, entities=[CARD])
+    unsubscribe_all = get_bus(db).subscribe(everything.append)
+    
+    deck = Deck.create("Spanish")
+    Card.create(deck.id, "hola", "hello")
+    assert [change.entity for change in cards] == [CARD]
+    assert [change.entity for change in everything] == [DECK, CARD]
+    
+    unsubscribe_cards()
+    Card.create(deck.id, "adios", "goodbye")
+    assert len(cards) == 1
+    assert len(everything) == 3
+    unsubscribe_all()
+
+
+def test_publish_delivers_each_change_once(db):
+    received = []
+    unsubscribe = get_bus(db).subscribe(received.append)
+    
+    # Written without publishing, as another process would
+    with db.get_connection() as conn:
+        log_change(conn.cursor(), DECK, "update", [1])
+        conn.commit()
+    assert received == []
+    
+    publish_changes(db)
+    publish_changes(db)
+    assert [(change.entity, change.op) for change in received] == [(DECK, "update")]
+    
+    Deck.create("Spanish")
+    assert [change.seq for change in received] == sorted({change.seq for change in received})
+    assert len(received) == 2
+    unsubscribe()
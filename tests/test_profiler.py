@@ -0,0 +1,45 @@
+"""Tests for span timing and database time attribution."""
+import asyncio
+
+from src.profiler import Profiler
+
+
+def test_nested_spans_pass_db_time_to_their_parent():
+    profiler = Profiler(enabled=True)
+    with profiler.span("outer"):
+        profiler.add_db_time(0.1)
+        with profiler.span("inner"):
+            profiler.add_db_time(0.2)
+    profiler.add_db_time(0.4)
+    
+    assert abs(profiler.stats["inner"].db_last - 0.2) < 1e-9
+    assert abs(profiler.stats["outer"].db_last - 0.3) < 1e-9
+    assert abs(profiler.unattributed_db - 0.4) < 1e-9
+
+
+def test_interleaved_async_spans_keep_their_own_db_time():
+    profiler = Profiler(enabled=True)
+    
+    async def handler(name, db_time, first_done, second_started):
+        with profiler.span(name):
+            if name == "first":
+                await second_started.wait()
+                profiler.add_db_time(db_time)
+            else:
+                second_started.set()
+                profiler.add_db_time(db_time)
+                await first_done.wait()
+        if name == "first":
+            first_done.set()
+    
+    async def main():
+        first_done, second_started = asyncio.Event(), asyncio.Event()
+        # The first span ends while the second is still open
+        await asyncio.gather(
+            handler("first", 0.1, first_done, second_started),
+            handler("second", 0.2, first_done, second_started),
+        )
+    
+    asyncio.run(main())
+    assert abs(profiler.stats["first"].db_last - 0.1) < 1e-9
+    assert abs(profiler.stats["second"].db_last - 0.2) < 1e-9
@@ -0,0 +1,63 @@
+"""Tests for in-session relearning."""
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.review import Review
+from src.study_queue import StudyQueue
+
+
+def _answer(queue, card, rating, now):
+    """Answer a card the way the study screen does."""
+    if not queue.is_relearning(card):
+        Review.get_by_card_id(card.id).record_review(rating)
+    queue.answer(card, rating, now)
+
+
+def test_relearning_steps_do_not_reschedule(db):
+    deck = Deck.create("Spanish")
+    card = Card.create(deck.id, "hola", "hello")
+    review = Review.get_by_card_id(card.id)
+    review.record_review(4)
+    review.record_review(4)
+    before = Review.get_by_card_id(card.id)
+    
+    queue = StudyQueue([card], relearn_steps=(60, 600))
+    _answer(queue, card, 1, now=0)
+    lapsed = Review.get_by_card_id(card.id)
+    assert lapsed.lapses == before.lapses + 1
+    
+    assert queue.current(now=60) is card
+    _answer(queue, card, 3, now=60)
+    assert queue.current(now=660) is card
+    _answer(queue, card, 3, now=660)
+    
+    after = Review.get_by_card_id(card.id)
+    assert (after.interval, after.ease_factor, after.lapses) == (
+        lapsed.interval, lapsed.ease_factor, lapsed.lapses
+    )
+    assert len(queue) == 0
+
+
+def test_hard_is_a_lapse_and_relearned(db):
+    deck = Deck.create("Spanish")
+    card = Card.create(deck.id, "hola", "hello")
+    queue = StudyQueue([card], relearn_steps=(60,))
+    
+    queue.answer(card, 2, now=0)
+    assert queue.is_relearning(card)
+    assert queue.learning_count == 1
+    
+    # Hard on a relearning step repeats it; Good graduates
+    queue.answer(card, 2, now=60)
+    assert queue.learning_count == 1
+    queue.answer(card, 3, now=120)
+    assert len(queue) == 0
+
+
+def test_good_first_answer_is_not_relearned(db):
+    deck = Deck.create("Spanish")
+    card = Card.create(deck.id, "hola", "hello")
+    queue = StudyQueue([card])
+    
+    queue.answer(card, 3, now=0)
+    assert not queue.is_relearning(card)
+    assert len(queue) == 0
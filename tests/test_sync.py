@@ -0,0 +1,142 @@
+"""Tests for syncing two collections through a sync server."""
+import threading
+import time
+
+import pytest
+
+from src.database.db import open_db, use_db
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.review import Review
+from src.sync.client import sync
+from src.sync.server import make_server
+
+
+@pytest.fixture
+def server(db, tmp_path):
+    """A sync server for a collection of its own, on a free port."""
+    httpd = make_server(open_db(tmp_path / "server.db"), port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def clients(db, tmp_path):
+    """Two more collections; the test switches between them with use_db."""
+    return open_db(tmp_path / "a.db"), open_db(tmp_path / "b.db")
+
+
+def _fronts(deck_name):
+    deck = Deck.get_by_name(deck_name)
+    return sorted(card.front for card in Card.get_by_deck(deck.id)) if deck else None
+
+
+def _edit(card_id, back):
+    card = Card.get_by_id(card_id)
+    card.back = back
+    card.update()
+
+
+def test_round_trip_converges(server, clients):
+    a, b = clients
+    use_db(a)
+    deck = Deck.create("Spanish::Verbs")
+    card = Card.create(deck.id, "hablar", "to speak")
+    sync(server, db=a)
+    
+    use_db(b)
+    report = sync(server, db=b)
+    assert report.pulled > 0
+    assert _fronts("Spanish::Verbs") == ["hablar"]
+    b_card = Card.get_by_deck(Deck.get_by_name("Spanish::Verbs").id)[0]
+    assert Deck.get_by_name("Spanish::Verbs").parent_id == Deck.get_by_name("Spanish").id
+    _edit(b_card.id, "to talk")
+    Card.create(b_card.deck_id, "comer", "to eat")
+    sync(server, db=b)
+    
+    use_db(a)
+    sync(server, db=a)
+    assert Card.get_by_id(card.id).back == "to talk"
+    assert _fronts("Spanish::Verbs") == ["comer", "hablar"]
+    
+    # Nothing left to exchange
+    assert sync(server, db=a).pushed == 0
+
+
+def test_newer_edit_wins_a_conflict(server, clients):
+    a, b = clients
+    use_db(a)
+    card = Card.create(Deck.create("Spanish").id, "hablar", "to speak")
+    sync(server, db=a)
+    use_db(b)
+    sync(server, db=b)
+    b_card_id = Card.get_by_deck(Deck.get_by_name("Spanish").id)[0].id
+    
+    use_db(a)
+    _edit(card.id, "edited on a")
+    time.sleep(0.01)
+    use_db(b)
+    _edit(b_card_id, "edited on b")
+    
+    sync(server, db=a)
+    report = sync(server, db=b)
+    assert report.conflicts >= 1
+    assert Card.get_by_id(b_card_id).back == "edited on b"
+    
+    use_db(a)
+    sync(server, db=a)
+    assert Card.get_by_id(card.id).back == "edited on b"
+
+
+def test_deletions_reach_the_other_side_and_win_over_edits(server, clients):
+    a, b = clients
+    use_db(a)
+    deck = Deck.create("Spanish")
+    kept = Card.create(deck.id, "comer", "to eat")
+    deleted = Card.create(deck.id, "hablar", "to speak")
+    sync(server, db=a)
+    use_db(b)
+    sync(server, db=b)
+    b_deleted_id = next(
+        card.id for card in Card.get_by_deck(Deck.get_by_name("Spanish").id) if card.front == "hablar"
+    )
+    
+    use_db(a)
+    Card.get_by_id(deleted.id).delete()
+    sync(server, db=a)
+    
+    use_db(b)
+    _edit(b_deleted_id, "edited after the delete")
+    report = sync(server, db=b)
+    assert report.deleted == 1
+    assert _fronts("Spanish") == ["comer"]
+    
+    use_db(a)
+    sync(server, db=a)
+    assert _fronts("Spanish") == ["comer"]
+    assert Card.get_by_id(kept.id) is not None
+
+
+def test_undone_ratings_are_removed_on_the_other_side(server, clients):
+    a, b = clients
+    use_db(a)
+    card = Card.create(Deck.create("Spanish").id, "hablar", "to speak")
+    undo = Review.get_by_card_id(card.id).record_review(4)
+    sync(server, db=a)
+    use_db(b)
+    sync(server, db=b)
+    
+    use_db(a)
+    Review.undo(undo)
+    sync(server, db=a)
+    use_db(b)
+    sync(server, db=b)
+    
+    with b.get_connection(read_only=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM study_sessions").fetchone()[0] == 0
+        assert conn.execute("SELECT SUM(reviews) FROM review_stats").fetchone()[0] == 0
+    b_card = Card.get_by_deck(Deck.get_by_name("Spanish").id)[0]
+    assert Review.get_by_card_id(b_card.id).last_review is None
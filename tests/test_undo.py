@@ -0,0 +1,77 @@
+"""Tests for undoing ratings and card deletions."""
+from src.models.card import Card
+from src.models.deck import Deck
+from src.models.review import Review
+
+
+def _row(db, query, *params):
+    with db.get_connection(read_only=True) as conn:
+        row = conn.execute(query, params).fetchone()
+        return tuple(row) if row else None
+
+
+def _state(db, card_id):
+    return _row(
+        db,
+        "SELECT ease_factor, interval, repetitions, due_date, last_review, lapses FROM reviews WHERE card_id = ?",
+        card_id
+    )
+
+
+def _stats(db, deck_id):
+    return _row(
+        db,
+        "SELECT reviews, new_cards, again, hard, good, easy, total_duration FROM review_stats WHERE deck_id = ?",
+        deck_id
+    )
+
+
+def test_undoing_a_rating_restores_scheduling_and_stats(db):
+    deck = Deck.create("Spanish")
+    card = Card.create(deck.id, "hola", "hello")
+    Review.get_by_card_id(card.id).record_review(4, duration_ms=1000)
+    before = _state(db, card.id)
+    stats_before = _stats(db, deck.id)
+    
+    undo = Review.get_by_card_id(card.id).record_review(1, duration_ms=3000)
+    assert _state(db, card.id) != before
+    Review.undo(undo)
+    
+    assert _state(db, card.id) == before
+    assert _stats(db, deck.id) == stats_before
+    assert _row(db, "SELECT COUNT(*) FROM study_sessions") == (1,)
+
+
+def test_undoing_a_synced_rating_records_its_deletion(db):
+    deck = Deck.create("Spanish")
+    card = Card.create(deck.id, "hola", "hello")
+    first = Review.get_by_card_id(card.id).record_review(4)
+    second = Review.get_by_card_id(card.id).record_review(4)
+    with db.get_connection() as conn:
+        conn.execute("UPDATE study_sessions SET guid = 'synced', usn = 1 WHERE id = ?", (second.session_id,))
+        conn.commit()
+    
+    Review.undo(second)
+    Review.undo(first)
+    
+    assert _row(db, "SELECT table_name, usn FROM sync_graves WHERE guid = 'synced'") == ("study_sessions", -1)
+    assert _row(db, "SELECT COUNT(*) FROM sync_graves") == (1,)
+
+
+def test_restore_brings_back_deleted_cards_with_their_history(db):
+    deck = Deck.create("Spanish")
+    kept = Card.create(deck.id, "adios", "goodbye")
+    card = Card.create(deck.id, "hola", "hello")
+    Review.get_by_card_id(card.id).record_review(4)
+    state = _state(db, card.id)
+    
+    deleted = Card.delete_for_undo([card.id, kept.id])
+    assert deleted.count == 2
+    assert Card.get_by_deck(deck.id) == []
+    assert _row(db, "SELECT COUNT(*) FROM study_sessions") == (0,)
+    
+    assert Card.restore(deleted) == 2
+    assert Card.get_by_id(card.id).front == "hola"
+    assert Card.get_by_id(kept.id).front == "adios"
+    assert _state(db, card.id) == state
+    assert _row(db, "SELECT COUNT(*) FROM study_sessions WHERE card_id = ?", card.id) == (1,)